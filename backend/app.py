@@ -1,35 +1,27 @@
 from flask import Flask, request, jsonify, send_file, session, redirect, url_for
 from flask_cors import CORS
-import markdown2
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch, cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image as RLImage, Table, TableStyle, HRFlowable, Preformatted
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT, TA_JUSTIFY
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from svglib.svglib import svg2rlg
-from reportlab.graphics import renderPDF
-from reportlab.platypus.flowables import Flowable
-from reportlab.platypus import PageTemplate, Frame, BaseDocTemplate
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-import reportlab.rl_config
-reportlab.rl_config.warnOnMissingFontGlyphs = 0
 import io
 import os
-import tempfile
+import time
 from datetime import datetime
-import base64
-from html.parser import HTMLParser
 import re
-from PIL import Image as PILImage
 import logging
-import os
 from logging.handlers import RotatingFileHandler
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from docusign_client import DocuSignClient
+from pdf_cache import PDFCache
+import pdf_spool
+from block_cache import SessionBlockCaches
+from logo_cache import InvalidLogo, LogoCache
+import font_metrics
+import parallel_sections
+from pdf_optimize import PDF_OPTIMIZE, PROFILES
+from render_pool import RENDER_INLINE_CHARS, RENDER_TIMEOUT, RenderPool, RenderPoolFull, RenderTimeout
+from jobs import JobRunner, JobStore, check_callback_url
+from batch import BATCH_MAX_DOCUMENTS, file_name, render_all, stream_zip, unique_names
+from mail_merge import MERGE_MAX_RECORDS, MergeTemplate, render_merge, render_records
+from renderer import brand_assets, convert_config, create_pdf, default_logo, render_pdf
 
 app = Flask(__name__)
 
@@ -43,7 +35,7 @@ app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-producti
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000,http://localhost:3001').split(',')
 CORS(app,
      origins=FRONTEND_URL,
-     expose_headers=['Content-Disposition'],
+     expose_headers=['Content-Disposition', 'ETag'],
      allow_headers=['Content-Type', 'Authorization'],
      methods=['GET', 'POST', 'OPTIONS'],
      supports_credentials=True)
@@ -109,18 +101,25 @@ limiter = Limiter(
 # Initialize DocuSign client
 docusign_client = DocuSignClient()
 
-# Register NotoSans fonts for Unicode support
-try:
-    font_dir = os.path.join(os.path.dirname(__file__), 'assets', 'fonts')
-    pdfmetrics.registerFont(TTFont('NotoSans', os.path.join(font_dir, 'NotoSans-Regular.ttf')))
-    pdfmetrics.registerFont(TTFont('NotoSans-Bold', os.path.join(font_dir, 'NotoSans-Bold.ttf')))
-    # Register italic variants if available, or just map to regular for now to prevent crashes
-    # Ideally we would download Italic too, but Regular/Bold covers 99% of use cases
-except Exception as e:
-    # CRITICAL: Fonts are required for PDF generation. Log generic error if they fail.
-    app.logger.error(f"CRITICAL: Failed to load NotoSans fonts: {e}. PDF generation may fail or look incorrect.")
-    # Fallback map if load fails (though we downloaded them)
-    pass
+# Cache of rendered PDFs keyed by markdown + effective config
+pdf_cache = PDFCache(max_bytes=int(os.environ.get('PDF_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+
+# Uploaded logos, normalized to the header size and shared across requests
+logo_cache = LogoCache(max_entries=int(os.environ.get('LOGO_CACHE_ENTRIES', 256)))
+
+# Compiled markdown blocks for live preview, per editing session and document
+preview_caches = SessionBlockCaches(max_sessions=int(os.environ.get('PREVIEW_CACHE_SESSIONS', 64)))
+
+# Worker processes for renders, so long documents do not tie up request threads
+render_pool = RenderPool(cleanup=parallel_sections.shutdown, preload=['renderer', 'mail_merge'])
+
+# Spooled PDFs left behind by renders that were stopped before they were sent
+pdf_spool.remove_stale(RENDER_TIMEOUT + 60)
+
+# Conversions queued through /api/jobs; a job not updated for longer than a
+# render may take, waiting for a worker and then running, each up to
+# RENDER_TIMEOUT, was left behind by a process that died
+job_store = JobStore(stale_after=2 * RENDER_TIMEOUT + 60)
 
 # Check if authentication is required
 REQUIRE_AUTH = os.environ.get('REQUIRE_AUTH', 'false').lower() == 'true'
@@ -128,6 +127,7 @@ REQUIRE_AUTH = os.environ.get('REQUIRE_AUTH', 'false').lower() == 'true'
 # Test API key for automated testing and health checks
 TEST_API_KEY = os.environ.get('TEST_API_KEY', None)
 
+
 def is_authenticated_request():
     """Check if request is authenticated via API key or Azure AD session"""
     # Check for test API key in header
@@ -155,902 +155,454 @@ try:
     if not app.logger.handlers:
         app.logger.addHandler(handler)
     app.logger.setLevel(logging.INFO)
+    # Markdown compiler fallbacks and mismatches are logged by the renderer
+    renderer_logger = logging.getLogger('renderer')
+    if handler not in renderer_logger.handlers:
+        renderer_logger.addHandler(handler)
+    renderer_logger.setLevel(logging.INFO)
 except Exception:
     # Fallback to default logger if filesystem not writable
     pass
 
-class NumberedCanvas(canvas.Canvas):
-    def __init__(self, *args, **kwargs):
-        # Extract custom parameters before passing to Canvas
-        self.logo_path = kwargs.pop('logo_path', None)
-        self.letterhead = kwargs.pop('letterhead', None)
-        self.disclaimer = kwargs.pop('disclaimer', None)
-        self.has_title_page = kwargs.pop('has_title_page', False)
-
-        canvas.Canvas.__init__(self, *args, **kwargs)
-        self._saved_page_states = []
-        self.current_page_number = 1
-        self.total_pages = 0
-
-    def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
-        self._startPage()
-
-    def save(self):
-        # Count total pages (raw page count)
-        num_pages = len(self._saved_page_states)
-
-        # Calculate total numbered pages (exclude title page if present)
-        total_numbered_pages = num_pages - 1 if self.has_title_page else num_pages
-
-        # Draw on each saved page
-        for page_index, state in enumerate(self._saved_page_states):
-            self.__dict__.update(state)
-
-            # Skip numbering/header/footer for title page
-            if self.has_title_page and page_index == 0:
-                # Title page - no numbering, header, or footer
-                canvas.Canvas.showPage(self)
-                continue
-
-            # Calculate page number for content pages
-            # If title page exists, first content page is index 1 but numbered as "Page 1"
-            if self.has_title_page:
-                self.current_page_number = page_index  # index 1 becomes page 1
-            else:
-                self.current_page_number = page_index + 1  # index 0 becomes page 1
-
-            self.total_pages = total_numbered_pages
-            self.draw_page_number()
-            self.draw_header()
-            self.draw_footer()
-            canvas.Canvas.showPage(self)
-        canvas.Canvas.save(self)
-
-    def draw_page_number(self):
-        self.saveState()
-        self.setFont("NotoSans", 9)
-        self.setFillColor(colors.HexColor('#494949'))  # Davinci Grey
-        self.drawRightString(
-            letter[0] - inch * 0.75, 
-            inch * 0.5,
-            f"Page {self.current_page_number} of {self.total_pages}"
-        )
-        self.restoreState()
+def render_document(markdown_text, config, logo=None, progress=None, spool=False):
+    """render_pdf in the render pool, or in this thread for a short document"""
+    if len(markdown_text) < RENDER_INLINE_CHARS:
+        return render_pdf(markdown_text, config, logo, progress, spool)
+    return render_pool.run(render_pdf, markdown_text, config, logo, progress, spool)
+
+def send_pdf(pdf, download_name, etag):
+    """
+    Response for a SpooledPDF download, with its length and byte ranges
+
+    A spooled PDF is sent from its file, which is deleted at once: the open
+    copy lasts until the response is closed, and a server with sendfile
+    (gunicorn) sends it without reading it into memory.
+    """
+    if pdf.path is None:
+        return send_file(io.BytesIO(pdf.data), mimetype='application/pdf', as_attachment=True,
+                         download_name=download_name, etag=etag)
+    try:
+        return send_file(pdf.path, mimetype='application/pdf', as_attachment=True,
+                         download_name=download_name, etag=etag)
+    finally:
+        pdf.discard()
+
+def render_busy(error):
+    """503 for a full render queue, telling the client when to retry"""
+    app.logger.warning('Render queue full, retry after %ds', error.retry_after)
+    response = jsonify({"error": "Too many documents are being rendered, please retry shortly"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def download_title(markdown_text):
+    """File name stem from the first H1, e.g. 'quarterly-report', or 'document'"""
+    for line in markdown_text.split('\n'):
+        if line.startswith('# '):
+            title = line[2:].strip()
+            title = ''.join(c if c.isalnum() or c in (' ', '-', '_') else '' for c in title)
+            return title.replace(' ', '-').lower()
+    return 'document'
 
-    def draw_header(self):
-        self.saveState()
-        
-        # Logo on top right per branding guidelines (horizontal version, size S: 3.5cm x 1.05cm)
-        if self.logo_path and os.path.exists(self.logo_path):
-            try:
-                self.drawImage(
-                    self.logo_path,
-                    letter[0] - (3.5 * cm) - inch * 0.75,  # Right aligned with margin
-                    letter[1] - (1.05 * cm) - inch * 0.5,  # Top aligned with space
-                    width=3.5 * cm,  # Size S from branding guidelines
-                    height=1.05 * cm,
-                    preserveAspectRatio=True,
-                    mask='auto'
-                )
-            except:
-                pass
-        
-        # Letterhead on top left - using Davinci Blue color
-        if self.letterhead:
-            self.setFont("NotoSans-Bold", 12)
-            self.setFillColor(colors.HexColor('#0B98CE'))  # Davinci Blue
-            self.drawString(inch * 0.75, letter[1] - inch * 0.75, self.letterhead['company'])
-            self.setFont("NotoSans", 9)
-            self.setFillColor(colors.HexColor('#494949'))  # Davinci Grey
-            self.drawString(inch * 0.75, letter[1] - inch * 0.95, self.letterhead.get('address', ''))
-            self.drawString(inch * 0.75, letter[1] - inch * 1.1, self.letterhead.get('phone', ''))
-            if self.letterhead.get('email'):
-                self.drawString(inch * 0.75, letter[1] - inch * 1.25, self.letterhead.get('email', ''))
-        
-        self.restoreState()
+def decode_logo_upload(logo_b64):
+    """Decode, validate and normalize an uploaded logo; returns (logo, error_message)"""
+    try:
+        return logo_cache.get(logo_b64), None
+    except InvalidLogo as e:
+        app.logger.warning(f"Invalid logo upload: {e}")
+        return None, str(e)
+
+def conversion_inputs(data):
+    """
+    Config, uploaded logo and logo digest for a convert-style request body
+
+    Returns (config, logo, logo_digest, error); logo is None when the default
+    logo is used, and error is set if the uploaded logo is invalid.
+    """
+    config = convert_config(data)
+    if config['optimize'] is not None and config['optimize'] not in PROFILES:
+        return config, None, None, f"optimize must be one of: {', '.join(PROFILES)}"
+    logo_b64 = data.get('logo_base64') or data.get('logoBase64')
+    if logo_b64:
+        logo, error = decode_logo_upload(logo_b64)
+        if error:
+            return config, None, None, error
+        return config, logo, logo.digest, None
+    config['logo_path'], logo_digest = default_logo()
+    return config, None, logo_digest, None
+
+def render_job(job, progress):
+    """PDF bytes, or a SpooledPDF, for a queued /api/jobs conversion"""
+    data = job['payload']
+    config, logo, logo_digest, error = conversion_inputs(data)
+    if error:
+        raise ValueError(error)
+    cache_key = pdf_cache.make_key(data['markdown'], config, logo_digest)
+    cached = pdf_cache.get(cache_key)
+    if cached:
+        return cached[0]
+    pdf = render_document(data['markdown'], config, logo, progress, spool=True)
+    if pdf.path is None:
+        pdf_cache.put(cache_key, pdf.data)
+    return pdf
+
+job_runner = JobRunner(job_store, render_job).start()
 
-    def draw_footer(self):
-        self.saveState()
+@app.route('/api/convert', methods=['POST'])
+def convert_markdown():
+    # Check authentication
+    if not is_authenticated_request():
+        app.logger.warning('Unauthorized convert request')
+        return jsonify({"error": "Authentication required"}), 401
+
+    try:
+        data = request.json
+        markdown_text = data.get('markdown', '')
+
+        if not isinstance(markdown_text, str) or not markdown_text.strip():
+            return jsonify({"error": "'markdown' is required and cannot be empty"}), 400
         
-        # Disclaimer in bottom center
-        if self.disclaimer:
-            self.setFont("NotoSans", 8)
-            self.setFillColor(colors.HexColor('#7A879C'))  # Davinci Stone (light grey for disclaimer)
-            text_width = self.stringWidth(self.disclaimer, "NotoSans", 8)
-            self.drawString(
-                (letter[0] - text_width) / 2,
-                inch * 0.3,
-                self.disclaimer
+        title = download_title(markdown_text)
+
+        config, logo, logo_digest, error = conversion_inputs(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        download_name = f'{title}-{datetime.now().strftime("%Y-%m-%d-%H%M%S")}.pdf'
+
+        # Serve repeats straight from the cache, or with a 304 if the client has it
+        cache_key = pdf_cache.make_key(markdown_text, config, logo_digest)
+        cached = pdf_cache.get(cache_key)
+        if cached:
+            pdf_bytes, etag = cached
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+            app.logger.info('Conversion cache hit: title=%s size_bytes=%d', title, len(pdf_bytes))
+            return send_file(
+                io.BytesIO(pdf_bytes),
+                mimetype='application/pdf',
+                as_attachment=True,
+                download_name=download_name,
+                etag=etag
             )
-        
-        self.restoreState()
-
-class HTMLToReportLab(HTMLParser):
-    """Convert HTML to ReportLab flowables"""
-    def __init__(self, styles):
-        super().__init__()
-        self.story = []
-        self.styles = styles
-        self.current_text = []
-        self.current_style = 'CustomBody'
-        self.list_depth = 0
-        self.list_type_stack = [] # Stack to track 'ul' or 'ol'
-        self.list_counters = []   # Stack to track counters for 'ol'
-        
-        self.in_table = False
-        self.table_data = []
-        self.table_row = []
-        self.in_cell = False
-        
-        self.in_pre = False
-        
-        self.in_bold = False
-        self.in_italic = False
-        self.in_link = False
-        self.link_href = None
-        self.in_blockquote = False
-        self.last_was_metadata = False
-        
-    def handle_starttag(self, tag, attrs):
-        # Flush any accumulated text before handling new tag
-        if self.current_text and tag not in ['strong', 'em', 'b', 'i', 'code', 'a', 'td', 'th', 'br'] and not self.in_cell and not self.in_pre:
-            self._flush_text()
-
-        if tag == 'h1':
-            self.current_style = 'CustomHeading1'
-        elif tag == 'h2':
-            self.current_style = 'CustomHeading2'
-        elif tag == 'h3':
-            self.current_style = 'CustomHeading3'
-        elif tag == 'p':
-            if not self.in_table: # Don't reset style inside tables
-                self.current_style = 'CustomBody'
-        elif tag == 'ul':
-            self.list_depth += 1
-            self.list_type_stack.append('ul')
-            self.list_counters.append(0)
-        elif tag == 'ol':
-            self.list_depth += 1
-            self.list_type_stack.append('ol')
-            self.list_counters.append(0)
-        elif tag == 'li':
-            # Determine list type and increment counter if needed
-            if self.list_type_stack:
-                list_type = self.list_type_stack[-1]
-                if list_type == 'ol':
-                    self.list_counters[-1] += 1
-                    number = f"{self.list_counters[-1]}."
-                    self.current_text.append(f'{number} ')
+
+        app.logger.info('Starting conversion request')
+        pdf = render_document(markdown_text, config, logo, spool=True)
+        # Spooled PDFs are too big for the cache
+        if pdf.path is None:
+            pdf_cache.put(cache_key, pdf.data)
+        app.logger.info('Conversion success: title=%s size_bytes=%d spooled=%s', title, pdf.size, pdf.path is not None)
+
+        return send_pdf(pdf, download_name, pdf.etag)
+    
+    except RenderPoolFull as e:
+        return render_busy(e)
+    except RenderTimeout as e:
+        app.logger.error('Conversion timed out: %s', str(e))
+        return jsonify({"error": f"PDF generation timed out: {str(e)}"}), 504
+    except ValueError as e:
+        app.logger.error('Invalid input: %s', str(e))
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    except IOError as e:
+        app.logger.error('File I/O error: %s', str(e))
+        return jsonify({"error": f"File error: {str(e)}"}), 500
+    except Exception as e:
+        app.logger.exception('PDF conversion failed: %s', str(e))
+        return jsonify({"error": f"PDF generation failed: {str(e)}"}), 500
+
+def render_in_pool(function, *args):
+    """function(*args) in the render pool whatever the document's length, waiting while the queue is full"""
+    while True:
+        try:
+            return render_pool.run(function, *args)
+        except RenderPoolFull as e:
+            time.sleep(e.retry_after)
+
+def merged_pdfs(template_text, records, config, logo=None):
+    """
+    Yield (index, pdf_bytes, error) for each record, in the render pool as chunks finish
+
+    io.BytesIO(pdf_bytes) is ready to pass to the DocuSign client.
+    """
+    def render_chunk(chunk):
+        return render_in_pool(render_merge, template_text, chunk, config, logo)
+    return render_records(records, render_chunk, render_pool.workers)
+
+@app.route('/api/convert/batch', methods=['POST'])
+def convert_batch():
+    """
+    Convert a list of documents and stream back a ZIP of the PDFs as they finish
+
+    The body holds 'documents', each with 'markdown' and an optional file
+    'name', and the /api/convert settings shared by all of them; a document
+    may also override any of those settings. The ZIP ends with manifest.json,
+    listing each document's file or the error that stopped it.
+    """
+    if not is_authenticated_request():
+        app.logger.warning('Unauthorized batch convert request')
+        return jsonify({"error": "Authentication required"}), 401
+
+    try:
+        data = request.json
+        documents = data.get('documents')
+        if not isinstance(documents, list) or not documents or not all(isinstance(d, dict) for d in documents):
+            return jsonify({"error": "'documents' must be a non-empty list of objects"}), 400
+        if len(documents) > BATCH_MAX_DOCUMENTS:
+            return jsonify({"error": f"At most {BATCH_MAX_DOCUMENTS} documents per batch"}), 400
+
+        # The shared letterhead and logo are resolved once for the whole batch
+        shared = {key: value for key, value in data.items() if key != 'documents'}
+        config, logo, logo_digest, error = conversion_inputs(shared)
+        if error:
+            return jsonify({"error": error}), 400
+
+        names = unique_names([
+            file_name(document.get('name'), download_title(str(document.get('markdown') or '')))
+            for document in documents
+        ])
+
+        def render(document):
+            markdown_text = document.get('markdown')
+            if not isinstance(markdown_text, str) or not markdown_text.strip():
+                raise ValueError("'markdown' is required and cannot be empty")
+            inputs = config, logo, logo_digest
+            if set(document) - {'markdown', 'name'}:
+                *inputs, error = conversion_inputs(dict(shared, **document))
+                if error:
+                    raise ValueError(error)
+            document_config, document_logo, document_digest = inputs
+
+            cache_key = pdf_cache.make_key(markdown_text, document_config, document_digest)
+            cached = pdf_cache.get(cache_key)
+            if cached:
+                return cached[0]
+            pdf_bytes = render_in_pool(render_pdf, markdown_text, document_config, document_logo)
+            pdf_cache.put(cache_key, pdf_bytes)
+            return pdf_bytes
+
+        app.logger.info('Starting batch conversion: documents=%d', len(documents))
+        results = render_all(documents, render, render_pool.workers)
+        response = app.response_class(stream_zip(names, results), mimetype='application/zip')
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename=documents-{datetime.now().strftime("%Y-%m-%d-%H%M%S")}.zip'
+        )
+        return response
+
+    except ValueError as e:
+        app.logger.error('Invalid input: %s', str(e))
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.exception('Batch conversion failed: %s', str(e))
+        return jsonify({"error": f"Batch conversion failed: {str(e)}"}), 500
+
+@app.route('/api/convert/merge', methods=['POST'])
+def convert_merge():
+    """
+    Fill a markdown template from each of a list of records and stream back a ZIP of the PDFs
+
+    The body is an /api/convert body whose markdown holds {{placeholders}},
+    plus 'records', each an object of values, and an optional 'nameTemplate'
+    for the file names. The ZIP ends with manifest.json, as for batches.
+    """
+    if not is_authenticated_request():
+        app.logger.warning('Unauthorized merge request')
+        return jsonify({"error": "Authentication required"}), 401
+
+    try:
+        data = request.json
+        template_text = data.get('markdown', '')
+        records = data.get('records')
+
+        if not isinstance(template_text, str) or not template_text.strip():
+            return jsonify({"error": "'markdown' is required and cannot be empty"}), 400
+        if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+            return jsonify({"error": "'records' must be a non-empty list of objects"}), 400
+        if len(records) > MERGE_MAX_RECORDS:
+            return jsonify({"error": f"At most {MERGE_MAX_RECORDS} records per merge"}), 400
+
+        config, logo, _, error = conversion_inputs(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        template = MergeTemplate(template_text)
+        name_template = MergeTemplate(str(data.get('nameTemplate') or ''))
+        names = []
+        for index, record in enumerate(records):
+            try:
+                if name_template.markdown_text:
+                    name = name_template.fill(record, escape=False)
                 else:
-                    self.current_text.append('• ')
-            else:
-                self.current_text.append('• ') # Fallback
-            
-            # Set style to BulletText but we'll manually adjust indent in _flush_text or by creating a custom style on the fly
-            self.current_style = 'BulletText'
-            
-        elif tag == 'hr':
-            self.story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#CCCCCC'), spaceBefore=16, spaceAfter=4))
-        elif tag == 'table':
-            self.in_table = True
-            self.table_data = []
-        elif tag == 'tr' and self.in_table:
-            self.table_row = []
-        elif tag in ['td', 'th'] and self.in_table:
-            self.in_cell = True
-            self.current_text = []
-        elif tag == 'a':
-            if not self.in_link:
-                self.in_link = True
-                href = None
-                for attr_name, attr_value in attrs:
-                    if attr_name == 'href':
-                        href = attr_value
-                        break
-                if href:
-                    self.link_href = href
-                    self.current_text.append(f'<link href="{href}" color="blue"><u>')
-        elif tag in ['strong', 'b']:
-            if not self.in_bold:
-                self.in_bold = True
-                self.current_text.append('<b>')
-        elif tag in ['em', 'i']:
-            if not self.in_italic:
-                self.in_italic = True
-                self.current_text.append('<i>')
-        elif tag == 'pre':
-            self.in_pre = True
-            self._flush_text() # Ensure previous text is saved
-        elif tag == 'code':
-            if not self.in_pre:
-                # Inline code
-                self.current_text.append('<font name="Courier" backColor="#F5F5F5">')
-        elif tag == 'br':
-            self.current_text.append('<br/>')
-        elif tag == 'blockquote':
-            self.in_blockquote = True
-            self.current_style = 'BlockQuote'
-            
-        # Image handling (same as before)
-        elif tag == 'img':
-            src = None
-            alt = ''
-            width = None
-            height = None
-            for attr_name, attr_value in attrs:
-                if attr_name == 'src': src = attr_value
-                elif attr_name == 'alt': alt = attr_value
-                elif attr_name == 'width':
-                    try: width = float(attr_value)
-                    except: pass
-                elif attr_name == 'height':
-                    try: height = float(attr_value)
-                    except: pass
-            
-            if src:
-                if self.current_text: self._flush_text()
-                try:
-                    if src.startswith('data:image'):
-                        if ',' in src:
-                            base64_data = src.split(',', 1)[1]
-                            image_data = base64.b64decode(base64_data)
-                            img_buffer = io.BytesIO(image_data)
-                            img = RLImage(img_buffer, width=width or 4*inch, height=height)
-                            self.story.append(img)
-                            self.story.append(Spacer(1, 12))
-                    elif os.path.exists(src):
-                        img = RLImage(src, width=width or 4*inch, height=height)
-                        self.story.append(img)
-                        self.story.append(Spacer(1, 12))
-                except Exception:
-                     if alt: self.story.append(Paragraph(f'[Image: {alt}]', self.styles['CustomBody']))
-
-    def handle_endtag(self, tag):
-        if tag in ['h1', 'h2', 'h3', 'p']:
-            self._flush_text()
-            self.current_style = 'CustomBody'
-        elif tag == 'li':
-            self._flush_text()
-            # Don't reset style yet, might be in nested list
-        elif tag == 'blockquote':
-            self._flush_text()
-            self.in_blockquote = False
-            self.current_style = 'CustomBody'
-        elif tag == 'a':
-            if self.in_link:
-                self.in_link = False
-                self.current_text.append('</u></link>')
-        elif tag == 'ul' or tag == 'ol':
-            if self.list_depth > 0:
-                self.list_depth -= 1
-                if self.list_type_stack: self.list_type_stack.pop()
-                if self.list_counters: self.list_counters.pop()
-        elif tag == 'table':
-            self.in_table = False
-            if self.table_data:
-                self._process_table()
-        elif tag == 'tr':
-            if self.table_row:
-                self.table_data.append(self.table_row)
-                self.table_row = []
-        elif tag in ['td', 'th']:
-            text = ''.join(self.current_text).strip()
-            # Remove empty formatting tags
-            text = text.replace('<b></b>', '').replace('<i></i>', '')
-            self.table_row.append(text)
-            self.current_text = []
-            self.in_cell = False
-        elif tag in ['strong', 'b']:
-            if self.in_bold:
-                self.in_bold = False
-                self.current_text.append('</b>')
-        elif tag in ['em', 'i']:
-            if self.in_italic:
-                self.in_italic = False
-                self.current_text.append('</i>')
-        elif tag == 'pre':
-            self.in_pre = False
-            text = ''.join(self.current_text) # Preserve whitespace
-            self.current_text = []
-            if text.strip():
-                # Create a Preformatted flowable for code blocks
-                style = self.styles['CodeBlock']
-                self.story.append(Preformatted(text, style))
-                self.story.append(Spacer(1, 12))
-        elif tag == 'code':
-            if not self.in_pre:
-                self.current_text.append('</font>')
-
-    def handle_data(self, data):
-        if self.in_pre:
-            self.current_text.append(data) # Preserve exact characters including newlines
-        elif self.in_cell:
-            self.current_text.append(data)
-        elif self.in_table:
-            pass # Skip whitespace between tr/td
-        elif data.strip() or self.current_text: # Add if content or if we already have content (space)
-             # Collapse whitespace for normal text
-             if not self.in_pre:
-                 self.current_text.append(data)
-
-    def _process_table(self):
-        # Robust table creation using Paragraphs for all cells
-        cell_style = ParagraphStyle(
-            'TableCell',
-            parent=self.styles['CustomBody'],
-            fontSize=9,
-            leading=11,
-            fontName='NotoSans'
+                    name = download_title(template.fill(record, escape=False))
+            except ValueError:
+                name = ''
+            names.append(file_name(name, f'record-{index + 1}'))
+
+        app.logger.info('Starting merge: records=%d fields=%s', len(records), ','.join(template.fields))
+        results = merged_pdfs(template_text, records, config, logo)
+        response = app.response_class(stream_zip(unique_names(names), results), mimetype='application/zip')
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename=merge-{datetime.now().strftime("%Y-%m-%d-%H%M%S")}.zip'
         )
-        
-        # Convert all data to Paragraphs
-        cleaned_data = []
-        for row in self.table_data:
-            cleaned_row = []
-            for cell_text in row:
-                if not cell_text: cell_text = ""
-                cleaned_row.append(Paragraph(cell_text, cell_style))
-            cleaned_data.append(cleaned_row)
-            
-        if not cleaned_data: return
-
-        # Calculate widths - distributed evenly for robustness
-        num_cols = len(cleaned_data[0])
-        avail_width = 6.5 * inch
-        col_widths = [avail_width / num_cols] * num_cols
-        
-        table = Table(cleaned_data, colWidths=col_widths)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#F0F0F0')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CCCCCC')),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('PADDING', (0, 0), (-1, -1), 6),
-        ]))
-        self.story.append(table)
-        self.story.append(Spacer(1, 12))
-
-    def _flush_text(self):
-        if self.current_text:
-            text = ''.join(self.current_text).strip()
-            if text:
-                # Auto-close open tags to prevent ReportLab crashes
-                if self.in_bold: text += '</b>'
-                if self.in_italic: text += '</i>'
-                if self.in_link: text += '</u></link>'
-                
-                text = text.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
-                
-                # Dynamic indentation for nested lists
-                style = self.styles[self.current_style]
-                
-                if self.current_style == 'BulletText':
-                    # Create a temp style with correct indentation
-                    # Base indent 24, plus 12 for each extra level
-                    indent = 24 + (max(0, self.list_depth - 1) * 12)
-                    style = ParagraphStyle(
-                        f'BulletLevel{self.list_depth}',
-                        parent=self.styles['BulletText'],
-                        leftIndent=indent,
-                        firstLineIndent=0
-                    )
-                
-                try:
-                    self.story.append(Paragraph(text, style))
-                except:
-                    # Fallback
-                    self.story.append(Paragraph(text, self.styles['CustomBody']))
-        
-        # Reset open tag state since we've flushed the paragraph
-        self.in_bold = False
-        self.in_italic = False
-        self.in_link = False
-        self.current_text = []
-        
-    def get_story(self):
-        self._flush_text()
-        return self.story
-
-class SVGFlowable(Flowable):
-    """Custom flowable to render SVG graphics in ReportLab PDFs"""
-    def __init__(self, svg_path, width=None, height=None):
-        Flowable.__init__(self)
-        self.svg_path = svg_path
-        self.drawing = svg2rlg(svg_path)
-
-        if self.drawing:
-            # Get original dimensions
-            orig_width = self.drawing.width
-            orig_height = self.drawing.height
-            aspect_ratio = orig_height / orig_width
-
-            # Calculate dimensions
-            if width and not height:
-                self.width = width
-                self.height = width * aspect_ratio
-            elif height and not width:
-                self.height = height
-                self.width = height / aspect_ratio
-            elif width and height:
-                self.width = width
-                self.height = height
-            else:
-                self.width = orig_width
-                self.height = orig_height
-
-            # Scale the drawing
-            scale_x = self.width / orig_width
-            scale_y = self.height / orig_height
-            self.drawing.width = self.width
-            self.drawing.height = self.height
-            self.drawing.scale(scale_x, scale_y)
-        else:
-            self.width = 0
-            self.height = 0
-
-    def draw(self):
-        if self.drawing:
-            renderPDF.draw(self.drawing, self.canv, 0, 0)
-
-def create_title_page(config, styles, document_title):
-    """Create a professional title page with company logo and document info"""
-    story = []
-
-    # Add large vertical spacer to center content
-    story.append(Spacer(1, 2.5 * inch))
-
-    # Company logo handling (unchanged)
-    logo_path = None
-    use_svg = False
-
-    sidebyside_svg = os.path.join(os.path.dirname(__file__), 'assets', 'logos', 'davinci_logo_sidebyside.svg')
-    sidebyside_svg_parent = os.path.join(os.path.dirname(__file__), '..', 'assets', 'logos', 'davinci_logo_sidebyside.svg')
-    sidebyside_png = os.path.join(os.path.dirname(__file__), 'assets', 'logos', 'davinci_logo_sidebyside.png')
-    sidebyside_png_parent = os.path.join(os.path.dirname(__file__), '..', 'assets', 'logos', 'davinci_logo_sidebyside.png')
-
-    if os.path.exists(sidebyside_svg):
-        logo_path = sidebyside_svg
-        use_svg = True
-    elif os.path.exists(sidebyside_svg_parent):
-        logo_path = sidebyside_svg_parent
-        use_svg = True
-    elif os.path.exists(sidebyside_png):
-        logo_path = sidebyside_png
-    elif os.path.exists(sidebyside_png_parent):
-        logo_path = sidebyside_png_parent
-
-    if logo_path and os.path.exists(logo_path):
-        try:
-            if use_svg or logo_path.endswith('.svg'):
-                logo = SVGFlowable(logo_path, width=12*cm)
-                logo.hAlign = 'CENTER'
-                story.append(logo)
-            else:
-                logo = RLImage(logo_path, width=12*cm, height=3.6*cm, kind='proportional')
-                logo.hAlign = 'CENTER'
-                story.append(logo)
-            story.append(Spacer(1, 0.75 * inch))
-        except Exception:
-            pass
-
-    title_style = ParagraphStyle(
-        name='TitlePageTitle',
-        parent=styles['Heading1'],
-        fontSize=28,
-        textColor=colors.HexColor('#0B98CE'),
-        alignment=TA_CENTER,
-        spaceAfter=24,
-        fontName='NotoSans-Bold',
-        leading=34
-    )
-    story.append(Paragraph(document_title or 'Document', title_style))
-
-    story.append(Spacer(1, 0.5 * inch))
-
-    company_style = ParagraphStyle(
-        name='TitlePageCompany',
-        parent=styles['Heading2'],
-        fontSize=18,
-        textColor=colors.HexColor('#316EA8'),
-        alignment=TA_CENTER,
-        spaceAfter=12,
-        fontName='NotoSans-Bold'
-    )
-    letterhead = config.get('letterhead', {})
-    company_name = letterhead.get('company', 'Davinci AI Solutions')
-    story.append(Paragraph(company_name, company_style))
-
-    story.append(Spacer(1, 0.3 * inch))
-
-    date_style = ParagraphStyle(
-        name='TitlePageDate',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#494949'),
-        alignment=TA_CENTER,
-        fontName='NotoSans'
-    )
-    current_date = datetime.now().strftime('%B %d, %Y')
-    story.append(Paragraph(current_date, date_style))
-
-    story.append(PageBreak())
-
-    return story
-
-def create_signature_page(config, styles):
-    story = []
-    story.append(PageBreak())
-
-    signature_title_style = ParagraphStyle(
-        name='SignatureTitle',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#0B98CE'),
-        alignment=TA_LEFT,
-        spaceAfter=12,
-        spaceBefore=0,
-        fontName='NotoSans-Bold'
-    )
-    story.append(Paragraph('Approval & Signatures', signature_title_style))
-
-    preamble_style = ParagraphStyle(
-        name='SignaturePreamble',
-        parent=styles['BodyText'],
-        fontSize=11,
-        textColor=colors.HexColor('#494949'),
-        alignment=TA_LEFT,
-        leading=16,
-        spaceBefore=8,
-        spaceAfter=24,
-        fontName='NotoSans'
-    )
-
-    preamble_text = (
-        "By signing below, you acknowledge that you have reviewed this document "
-        "and agree with its contents, recommendations, and proposed course of action. "
-        "Your signature confirms your approval to proceed as outlined in this document."
-    )
-
-    story.append(Paragraph(preamble_text, preamble_style))
-
-    anchor_style = ParagraphStyle(
-        name='Anchor',
-        parent=styles['BodyText'],
-        fontSize=1,
-        textColor=colors.white,
-        fontName='NotoSans'
-    )
-
-    signature_data = [
-        ['Davinci AI Solutions', '', '', ''],
-        ['Name:', Paragraph('/ds_davinci_name/', anchor_style), 'Date:', Paragraph('/ds_davinci_date/', anchor_style)],
-        ['Title/Role:', Paragraph('/ds_davinci_title/', anchor_style), '', ''],
-        ['Signature:', Paragraph('/ds_davinci_signature/', anchor_style), '', ''],
-        ['', '', '', ''],
-        ['Approved by:', '', '', ''],
-        ['Name:', Paragraph('/ds_recipient_name/', anchor_style), 'Date:', Paragraph('/ds_recipient_date/', anchor_style)],
-        ['Title/Role:', Paragraph('/ds_recipient_title/', anchor_style), '', ''],
-        ['Signature:', Paragraph('/ds_recipient_signature/', anchor_style), '', '']
-    ]
-
-    signature_table = Table(signature_data, colWidths=[1.2*inch, 2.3*inch, 0.8*inch, 1.7*inch])
-    signature_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'NotoSans'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#494949')),
-        ('FONTNAME', (0, 0), (0, 0), 'NotoSans-Bold'),
-        ('FONTSIZE', (0, 0), (0, 0), 12),
-        ('SPAN', (0, 0), (-1, 0)),
-        ('FONTNAME', (0, 5), (0, 5), 'NotoSans-Bold'),
-        ('FONTSIZE', (0, 5), (0, 5), 12),
-        ('SPAN', (0, 5), (-1, 5)),
-        ('SPAN', (0, 4), (-1, 4)),
-        ('LINEBELOW', (0, 4), (-1, 4), 0, colors.white),
-        ('LINEABOVE', (0, 4), (-1, 4), 0, colors.white),
-        ('SPAN', (1, 2), (3, 2)),
-        ('SPAN', (1, 3), (3, 3)),
-        ('SPAN', (1, 7), (3, 7)),
-        ('SPAN', (1, 8), (3, 8)),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
-        ('LINEABOVE', (0, 0), (-1, 0), 1, colors.HexColor('#0B98CE')),
-        ('LINEABOVE', (0, 5), (-1, 5), 1, colors.HexColor('#0B98CE')),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#F0F8FF')),
-        ('BACKGROUND', (0, 5), (-1, 5), colors.HexColor('#F0F8FF')),
-    ]))
-    story.append(signature_table)
-
-    return story
-
-def create_pdf(markdown_text, config):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=inch * 1.0,
-        leftMargin=inch * 1.0,
-        topMargin=inch * 1.6,
-        bottomMargin=inch * 1.3
-    )
-    
-    styles = getSampleStyleSheet()
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading1',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#0B98CE'),
-        spaceAfter=14,
-        spaceBefore=16,
-        fontName='NotoSans-Bold'
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading2',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#316EA8'),
-        spaceAfter=14,
-        spaceBefore=10,
-        fontName='NotoSans-Bold'
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading3',
-        parent=styles['Heading3'],
-        fontSize=12,
-        textColor=colors.HexColor('#494949'),
-        spaceAfter=8,
-        spaceBefore=10,
-        fontName='NotoSans-Bold'
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomBody',
-        parent=styles['BodyText'],
-        fontSize=11,
-        textColor=colors.HexColor('#494949'),
-        alignment=TA_JUSTIFY,
-        leading=15,
-        spaceBefore=2,
-        spaceAfter=6,
-        fontName='NotoSans'
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='BulletText',
-        parent=styles['BodyText'],
-        fontSize=11,
-        textColor=colors.HexColor('#494949'),
-        leftIndent=24,
-        bulletIndent=10,
-        leading=15,
-        spaceBefore=5,
-        spaceAfter=4,
-        fontName='NotoSans'
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='MetadataText',
-        parent=styles['BodyText'],
-        fontSize=11,
-        textColor=colors.HexColor('#494949'),
-        leading=13,
-        spaceBefore=0,
-        spaceAfter=4,
-        fontName='NotoSans'
-    ))
-
-    styles.add(ParagraphStyle(
-        name='BlockQuote',
-        parent=styles['BodyText'],
-        fontSize=11,
-        textColor=colors.HexColor('#666666'),
-        leftIndent=24,
-        rightIndent=24,
-        leading=15,
-        spaceBefore=12,
-        spaceAfter=12,
-        fontName='NotoSans', # Regular, but could be Italic if we had it
-        borderColor=colors.HexColor('#CCCCCC'),
-        borderWidth=0,
-        borderPadding=8,
-        backColor=colors.HexColor('#FAFAFA')
-    ))
-
-    # New style for Code Blocks
-    styles.add(ParagraphStyle(
-        name='CodeBlock',
-        parent=styles['BodyText'],
-        fontSize=9,
-        textColor=colors.HexColor('#333333'),
-        fontName='Courier',
-        leading=11,
-        leftIndent=12,
-        rightIndent=12,
-        spaceBefore=12,
-        spaceAfter=12,
-        backColor=colors.HexColor('#F5F5F5'),
-        borderPadding=8,
-    ))
-    
-    # Preprocessing (No more regex for lists!)
-    lines = markdown_text.split('\n')
-    processed_lines = []
-    in_table = False
-
-    for i, line in enumerate(lines):
-        stripped = line.strip()
-        is_table_line = stripped.startswith('|') and '|' in stripped[1:]
-        is_table_separator = is_table_line and '-' in stripped
-
-        if is_table_line:
-            if not in_table and len(processed_lines) > 0:
-                if processed_lines[-1].strip():
-                    processed_lines.append('')
-            in_table = True
-        elif in_table and not is_table_line:
-            in_table = False
-
-        if (len(stripped) >= 3 and all(c in '=-_■' for c in stripped) and not is_table_separator):
-            processed_lines.append('---')
-        else:
-            processed_lines.append(line)
+        return response
 
-    markdown_text = '\n'.join(processed_lines)
+    except ValueError as e:
+        app.logger.error('Invalid input: %s', str(e))
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.exception('Merge failed: %s', str(e))
+        return jsonify({"error": f"Merge failed: {str(e)}"}), 500
 
-    document_title = None
-    for line in lines:
-        if line.startswith('# '):
-            document_title = line[2:].strip()
-            break
-
-    html = markdown2.markdown(
-        markdown_text,
-        extras=[
-            'fenced-code-blocks',
-            'tables',
-            'break-on-newline',
-            'header-ids',
-            'strike',
-            'task_list'
-        ]
-    )
-
-    # Removed dangerous regex post-processing
-
-    parser = HTMLToReportLab(styles)
-    parser.feed(html)
-    content_story = parser.get_story()
-
-    if not content_story:
-        content_story.append(Paragraph("No content to display", styles['CustomBody']))
-
-    story = []
-    include_title_page = config.get('include_title_page', False)
-    include_signature_page = config.get('include_signature_page', False)
-
-    if include_title_page:
-        story.extend(create_title_page(config, styles, document_title))
-
-    story.extend(content_story)
-
-    if include_signature_page:
-        story.extend(create_signature_page(config, styles))
-
-    doc.build(
-        story,
-        canvasmaker=lambda *args, **kwargs: NumberedCanvas(
-            *args,
-            **kwargs,
-            logo_path=config.get('logo_path'),
-            letterhead=config.get('letterhead'),
-            disclaimer=config.get('disclaimer'),
-            has_title_page=include_title_page
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a conversion and return its job id at once
+
+    Takes the same body as /api/convert plus an optional callbackUrl, which
+    is sent the job's status once it finishes.
+    """
+    if not is_authenticated_request():
+        app.logger.warning('Unauthorized job request')
+        return jsonify({"error": "Authentication required"}), 401
+
+    try:
+        data = request.json
+        markdown_text = data.get('markdown', '')
+
+        if not isinstance(markdown_text, str) or not markdown_text.strip():
+            return jsonify({"error": "'markdown' is required and cannot be empty"}), 400
+
+        callback_url = data.get('callbackUrl')
+        if callback_url:
+            check_callback_url(callback_url)
+
+        # Rejects a bad logo now rather than when the job runs
+        _, _, _, error = conversion_inputs(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        download_name = f'{download_title(markdown_text)}-{datetime.now().strftime("%Y-%m-%d-%H%M%S")}.pdf'
+        job_id = job_store.submit(
+            data, download_name, callback_url,
+            result_url=url_for('job_result', job_id='JOB', _external=True).replace('JOB', '{id}')
         )
-    )
-    
-    buffer.seek(0)
-    return buffer
+        job_runner.wake()
+        app.logger.info('Job queued: id=%s chars=%d', job_id, len(markdown_text))
 
-@app.route('/api/convert', methods=['POST'])
-def convert_markdown():
-    # Check authentication
+        response = jsonify(dict(job_store.describe(job_store.get(job_id)),
+                                status_url=url_for('job_status', job_id=job_id, _external=True)))
+        response.status_code = 202
+        response.headers['Location'] = url_for('job_status', job_id=job_id)
+        return response
+
+    except ValueError as e:
+        app.logger.error('Invalid input: %s', str(e))
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.exception('Job submission failed: %s', str(e))
+        return jsonify({"error": f"Job submission failed: {str(e)}"}), 500
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
     if not is_authenticated_request():
-        app.logger.warning('Unauthorized convert request')
+        return jsonify({"error": "Authentication required"}), 401
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job_store.describe(job))
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    if not is_authenticated_request():
+        return jsonify({"error": "Authentication required"}), 401
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    if job['status'] != 'done':
+        response = jsonify(dict(job_store.describe(job), error=job['error'] or f"Job is {job['status']}"))
+        response.status_code = 409
+        return response
+    try:
+        return send_file(
+            job_store.result_path(job),
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=job['download_name']
+        )
+    except FileNotFoundError:
+        # Expired between the lookup and opening the file
+        return jsonify({"error": "Job not found or expired"}), 404
+
+@app.route('/api/preview', methods=['POST'])
+@limiter.limit("60 per minute")
+def preview_markdown():
+    """
+    Render a preview PDF, recompiling only the blocks edited since the last call
+
+    Takes the same body as /api/convert plus an optional documentId; compiled
+    blocks are kept per session and document.
+    """
+    if not is_authenticated_request():
+        app.logger.warning('Unauthorized preview request')
         return jsonify({"error": "Authentication required"}), 401
 
-    temp_logo_file = None
     try:
         data = request.json
         markdown_text = data.get('markdown', '')
 
         if not isinstance(markdown_text, str) or not markdown_text.strip():
             return jsonify({"error": "'markdown' is required and cannot be empty"}), 400
-        
-        title = 'document'
-        lines = markdown_text.split('\n')
-        for line in lines:
-            if line.startswith('# '):
-                title = line[2:].strip()
-                title = ''.join(c if c.isalnum() or c in (' ', '-', '_') else '' for c in title)
-                title = title.replace(' ', '-').lower()
-                break
-        
-        config = {
-            'letterhead': {
-                'company': data.get('company', 'Davinci AI Solutions'),
-                'address': data.get('address', '11-6320 11 Street SE, Calgary, AB T2H 2L7'),
-                'phone': data.get('phone', '+1 (403) 245-9429'),
-                'email': data.get('email', 'info@davincisolutions.ai')
-            },
-            'disclaimer': data.get('disclaimer', 'This document contains confidential and proprietary information of Davinci AI Solutions. © 2025 All Rights Reserved.'),
-            'logo_path': None,
-            'include_title_page': data.get('includeTitlePage', False),
-            'include_signature_page': data.get('includeSignaturePage', False)
-        }
-        
+
+        # Previews are shown as they render, not downloaded
+        config = dict(convert_config(data), optimize=None)
+
         logo_b64 = data.get('logo_base64') or data.get('logoBase64')
         if logo_b64:
-            try:
-                logo_data = base64.b64decode(logo_b64)
-            except Exception:
-                return jsonify({"error": "Invalid base64 for logo"}), 400
+            logo, error = decode_logo_upload(logo_b64)
+            if error:
+                return jsonify({"error": error}), 400
+            config['logo_image'] = logo.reader()
+        else:
+            config['logo_path'], _ = default_logo()
 
-            if len(logo_data) > 5 * 1024 * 1024:
-                return jsonify({"error": "Logo image exceeds 5MB limit"}), 400
+        user = session.get('user') or {}
+        session_id = user.get('oid') or session.get('preview_id')
+        if not session_id:
+            session_id = session['preview_id'] = SessionBlockCaches.new_session_id()
+        block_cache = preview_caches.get(session_id, data.get('documentId'))
 
-            try:
-                img = PILImage.open(io.BytesIO(logo_data))
-                img.verify()
-            except Exception as e:
-                app.logger.warning(f"Invalid logo upload: {e}")
-                return jsonify({"error": f"Uploaded logo is not a valid image: {str(e)}"}), 400
-
-            temp_logo_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-            temp_logo_file.write(logo_data)
-            temp_logo_file.close()
-            config['logo_path'] = temp_logo_file.name
-        else:
-            default_logo_png = os.path.join(os.path.dirname(__file__), 'assets', 'logos', 'davinci_logo.png')
-            default_logo_png_parent = os.path.join(os.path.dirname(__file__), '..', 'assets', 'logos', 'davinci_logo.png')
+        # Cached flowables are shared, so one preview per document renders at a time
+        with block_cache.lock:
+            pdf_buffer = create_pdf(markdown_text, config, block_cache=block_cache)
 
-            if os.path.exists(default_logo_png):
-                config['logo_path'] = default_logo_png
-            elif os.path.exists(default_logo_png_parent):
-                config['logo_path'] = default_logo_png_parent
-        
-        app.logger.info('Starting conversion request')
-        pdf_buffer = create_pdf(markdown_text, config)
-        size_bytes = pdf_buffer.getbuffer().nbytes
-        app.logger.info('Conversion success: title=%s size_bytes=%d', title, size_bytes)
-        
         return send_file(
             pdf_buffer,
             mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'{title}-{datetime.now().strftime("%Y-%m-%d-%H%M%S")}.pdf'
+            as_attachment=False,
+            download_name='preview.pdf'
         )
-    
+
     except ValueError as e:
         app.logger.error('Invalid input: %s', str(e))
         return jsonify({"error": f"Invalid input: {str(e)}"}), 400
-    except IOError as e:
-        app.logger.error('File I/O error: %s', str(e))
-        return jsonify({"error": f"File error: {str(e)}"}), 500
     except Exception as e:
-        app.logger.exception('PDF conversion failed: %s', str(e))
+        app.logger.exception('Preview failed: %s', str(e))
         return jsonify({"error": f"PDF generation failed: {str(e)}"}), 500
-    finally:
-        if temp_logo_file and os.path.exists(temp_logo_file.name):
-            try:
-                os.unlink(temp_logo_file.name)
-            except Exception as e:
-                app.logger.warning(f"Failed to delete temp logo file: {e}")
+
+@app.route('/api/stats')
+def render_stats():
+    if not is_authenticated_request():
+        return jsonify({"error": "Authentication required"}), 401
+    return jsonify({
+        'pdf_cache': pdf_cache.stats(),
+        'preview_cache': preview_caches.stats(),
+        'brand_assets': brand_assets.stats(),
+        'logo_cache': logo_cache.stats(),
+        'font_metrics': font_metrics.stats(),
+        'render_pool': render_pool.stats(),
+        'jobs': job_store.stats(),
+    })
 
 @app.route('/api/docusign/send-for-signature', methods=['POST'])
 @limiter.limit("10 per hour")
@@ -1059,7 +611,6 @@ def send_for_signature():
         app.logger.warning('Unauthorized DocuSign send request')
         return jsonify({"error": "Authentication required"}), 401
 
-    temp_logo_file = None
     try:
         data = request.json
 
@@ -1068,6 +619,15 @@ def send_for_signature():
         recipient_email = data.get('recipient_email', '').strip()
 
         if not markdown_text.strip(): return jsonify({"error": "markdown is required"}), 400
+        variables = data.get('variables')
+        # The document name is plain text, so it is taken from the values unescaped
+        title_text = markdown_text
+        if variables is not None:
+            if not isinstance(variables, dict):
+                return jsonify({"error": "variables must be an object"}), 400
+            template = MergeTemplate(markdown_text)
+            markdown_text = template.fill(variables)
+            title_text = template.fill(variables, escape=False)
         if not recipient_name: return jsonify({"error": "recipient_name is required"}), 400
         if not recipient_email: return jsonify({"error": "recipient_email is required"}), 400
 
@@ -1077,7 +637,7 @@ def send_for_signature():
 
         document_name = data.get('document_name', 'Document')
         if not document_name or document_name == 'Document':
-            lines = markdown_text.split('\n')
+            lines = title_text.split('\n')
             for line in lines:
                 if line.startswith('# '):
                     document_name = line[2:].strip()
@@ -1093,36 +653,24 @@ def send_for_signature():
             'disclaimer': data.get('disclaimer', 'This document contains confidential and proprietary information of Davinci AI Solutions. © 2025 All Rights Reserved.'),
             'logo_path': None,
             'include_title_page': data.get('includeTitlePage', False),
-            'include_signature_page': data.get('includeSignaturePage', True)
+            'include_signature_page': data.get('includeSignaturePage', True),
+            'section_page_breaks': data.get('sectionPageBreaks', False),
+            'optimize': data.get('optimize', PDF_OPTIMIZE) or None
         }
+        if config['optimize'] is not None and config['optimize'] not in PROFILES:
+            return jsonify({"error": f"optimize must be one of: {', '.join(PROFILES)}"}), 400
 
         logo_b64 = data.get('logo_base64') or data.get('logoBase64')
+        logo = None
         if logo_b64:
-            try:
-                logo_data = base64.b64decode(logo_b64)
-                if len(logo_data) > 5 * 1024 * 1024:
-                    return jsonify({"error": "Logo image exceeds 5MB limit"}), 400
-
-                img = PILImage.open(io.BytesIO(logo_data))
-                img.verify()
-
-                temp_logo_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-                temp_logo_file.write(logo_data)
-                temp_logo_file.close()
-                config['logo_path'] = temp_logo_file.name
-            except Exception as e:
-                app.logger.warning(f"Invalid logo upload for DocuSign: {e}")
-                return jsonify({"error": f"Invalid logo: {str(e)}"}), 400
+            logo, error = decode_logo_upload(logo_b64)
+            if error:
+                return jsonify({"error": f"Invalid logo: {error}"}), 400
         else:
-            default_logo_png = os.path.join(os.path.dirname(__file__), 'assets', 'logos', 'davinci_logo.png')
-            default_logo_png_parent = os.path.join(os.path.dirname(__file__), '..', 'assets', 'logos', 'davinci_logo.png')
-            if os.path.exists(default_logo_png):
-                config['logo_path'] = default_logo_png
-            elif os.path.exists(default_logo_png_parent):
-                config['logo_path'] = default_logo_png_parent
+            config['logo_path'], _ = default_logo()
 
         app.logger.info(f'Generating PDF for DocuSign: {document_name}')
-        pdf_buffer = create_pdf(markdown_text, config)
+        pdf_buffer = io.BytesIO(render_document(markdown_text, config, logo))
 
         app.logger.info(f'Sending to DocuSign: recipient={recipient_email}')
         result = docusign_client.send_envelope_for_signature(
@@ -1145,17 +693,16 @@ def send_for_signature():
             'message': 'Document sent for signature successfully'
         }), 200
 
+    except RenderPoolFull as e:
+        return render_busy(e)
+    except RenderTimeout as e:
+        app.logger.error(f'DocuSign PDF generation timed out: {e}')
+        return jsonify({"error": f"PDF generation timed out: {e}"}), 504
     except ValueError as e:
         app.logger.error(f'DocuSign validation error: {e}')
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         app.logger.exception(f'DocuSign send failed: {e}')
         return jsonify({"error": f"Failed to send document for signature: {str(e)}"}), 500
-    finally:
-        if temp_logo_file and os.path.exists(temp_logo_file.name):
-            try:
-                os.unlink(temp_logo_file.name)
-            except Exception as e:
-                app.logger.warning(f"Failed to delete temp logo file: {e}")
 
 # ... rest of docusign routes (get status, webhook) are unchanged
\ No newline at end of file
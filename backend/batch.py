@@ -0,0 +1,101 @@
+"""
+Batch conversion for Davinci Document Creator
+Renders many documents concurrently and streams them back as one ZIP
+"""
+
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# Most documents accepted in one /api/convert/batch request
+BATCH_MAX_DOCUMENTS = int(os.environ.get('BATCH_MAX_DOCUMENTS', 100))
+
+
+def file_name(name, default):
+    """A safe .pdf file name for a ZIP entry from a client-supplied name"""
+    name = os.path.basename(str(name or '').replace('\\', '/')).strip() or default
+    return name if name.lower().endswith('.pdf') else f'{name}.pdf'
+
+
+def unique_names(names):
+    """The names with ' (2)', ' (3)'... added before the extension to repeats"""
+    taken = set()
+    unique = []
+    for name in names:
+        stem, extension = os.path.splitext(name)
+        candidate, count = name, 1
+        while candidate.lower() in taken:
+            count += 1
+            candidate = f'{stem} ({count}){extension}'
+        taken.add(candidate.lower())
+        unique.append(candidate)
+    return unique
+
+
+def render_all(documents, render, workers):
+    """
+    Yield (index, pdf_bytes, error) for each document as its render finishes
+
+    render(document) returns the PDF bytes; an exception it raises is
+    reported as the error. Renders not yet started are cancelled if the
+    caller stops early, e.g. when the client disconnects.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='batch')
+    try:
+        futures = {executor.submit(render, document): index for index, document in enumerate(documents)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, str(e) or type(e).__name__
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Chunks:
+    """A write-only file that collects what zipfile writes until it is taken"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(names, results):
+    """
+    Yield a ZIP archive in pieces, adding each PDF as it arrives
+
+    results yields (index, pdf_bytes, error) as from render_all. The PDFs
+    are stored uncompressed, as they are compressed already, and the last
+    entry is manifest.json listing every document with its file or error.
+    """
+    output = _Chunks()
+    manifest = [None] * len(names)
+    # Unseekable output: zipfile writes sizes after each entry instead
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for index, pdf_bytes, error in results:
+            if error is None:
+                archive.writestr(zipfile.ZipInfo(names[index], datetime.now().timetuple()[:6]), pdf_bytes)
+                manifest[index] = {'file': names[index], 'status': 'done', 'size_bytes': len(pdf_bytes)}
+            else:
+                manifest[index] = {'file': names[index], 'status': 'failed', 'error': error}
+            yield output.take()
+
+        failed = sum(1 for entry in manifest if entry['status'] == 'failed')
+        archive.writestr(
+            zipfile.ZipInfo('manifest.json', datetime.now().timetuple()[:6]),
+            json.dumps({'documents': manifest, 'failed': failed}, indent=2)
+        )
+    yield output.take()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: month-end run of 24 reports, one /api/convert call each vs one /api/convert/batch call
+
+Each report is the complex fixture repeated to about four pages, with its
+own title, and all share one uploaded logo and the letterhead. The
+requests go over HTTP to a local threaded server. The one-by-one run posts
+the reports in sequence, as a client script would; the batch posts them
+together and reads the ZIP. Renders use two worker processes, started
+beforehand, and the PDF cache is cleared before each run.
+"""
+import base64
+import io
+import logging
+import os
+import sys
+import threading
+import time
+import zipfile
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from werkzeug.serving import make_server
+
+import app
+from render_pool import RenderPool
+from tests.fixtures import FIXTURES
+
+REPORTS = 24
+
+
+def logo_base64():
+    with open(app.default_logo()[0], 'rb') as f:
+        return base64.b64encode(f.read()).decode()
+
+
+def reports():
+    body = "\n\n".join([FIXTURES['complex']] * 4)
+    return [f"# Branch Report {i}\n\n{body}" for i in range(REPORTS)]
+
+
+def one_by_one(url, settings, documents):
+    sizes = []
+    for markdown_text in documents:
+        response = requests.post(f'{url}/api/convert', json=dict(settings, markdown=markdown_text))
+        assert response.status_code == 200, response.status_code
+        sizes.append(len(response.content))
+    return sizes
+
+
+def batch(url, settings, documents):
+    response = requests.post(f'{url}/api/convert/batch',
+                             json=dict(settings, documents=[{'markdown': d} for d in documents]))
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    return [info.file_size for info in archive.infolist() if info.filename.endswith('.pdf')]
+
+
+def main():
+    # The per-client rate limits would stop the one-by-one run
+    app.limiter.enabled = False
+    settings = {'company': 'Davinci AI Solutions', 'logo_base64': logo_base64()}
+    documents = reports()
+    print(f"{REPORTS} reports of {len(documents[0]) // 1024} KB markdown, "
+          f"{len(settings['logo_base64']) * 3 // 4 // 1024} KB logo, {os.cpu_count()} CPUs\n")
+    print(f"{'run':<14}{'total':>9}{'per report':>12}{'PDFs':>6}")
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+
+    app.render_pool = RenderPool(workers=2)
+    warm_up = [threading.Thread(target=app.render_pool.run, args=(time.sleep, 0.2)) for _ in range(2)]
+    for thread in warm_up:
+        thread.start()
+    for thread in warm_up:
+        thread.join()
+
+    for name, run in (('one by one', one_by_one), ('batch', batch)):
+        app.pdf_cache.clear()
+        start = time.perf_counter()
+        sizes = run(url, settings, documents)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14}{elapsed:>8.2f}s{elapsed / REPORTS * 1000:>10.0f}ms{len(sizes):>6}")
+    server.shutdown()
+    app.render_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pages and layout time of wide tables, even vs content-aware columns
+
+Renders tables with a narrow ID column, short status and amount columns and
+a long description, with the columns split evenly as before and sized from
+their content. Also times the width estimate on its own.
+"""
+import os
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib.units import inch
+
+import markdown_compiler
+from renderer import create_pdf
+from column_widths import column_widths
+from themes import get_theme
+from tests.fixtures import DEFAULT_CONFIG
+
+WORDS = "the inspection found minor wear on the bearing housing and recommended replacement at next service".split()
+
+
+def wide_table(rows):
+    data = [["ID", "Status", "Amount", "Description"]]
+    for r in range(rows):
+        description = " ".join(WORDS[(r + i) % len(WORDS)] for i in range(8 + r % 12))
+        data.append([f"WO-{r:05d}", "Open" if r % 3 else "Closed", f"{r * 37 % 10000}.00", description])
+    return data
+
+
+def table_markdown(data):
+    lines = ["| " + " | ".join(data[0]) + " |", "|" + "---|" * len(data[0])]
+    lines += ["| " + " | ".join(row) + " |" for row in data[1:]]
+    return "# Work Orders\n\n" + "\n".join(lines) + "\n"
+
+
+def even_widths(rows, style, avail_width):
+    return [avail_width / len(rows[0])] * len(rows[0])
+
+
+def main(sizes=(100, 1000, 10000)):
+    style = get_theme()['TableCell']
+    print(f"{'rows':>6}  {'columns':<10}{'estimate':>10}{'render':>10}{'pages':>8}")
+    for rows in sizes:
+        data = wide_table(rows)
+        markdown_text = table_markdown(data)
+        for name, widths in (('even', even_widths), ('content', column_widths)):
+            start = time.perf_counter()
+            widths(data, style, 6.5 * inch)
+            estimate_ms = (time.perf_counter() - start) * 1000
+
+            markdown_compiler.column_widths = widths
+            try:
+                start = time.perf_counter()
+                pdf = create_pdf(markdown_text, dict(DEFAULT_CONFIG, markdown_frontend='ast'))
+                render_s = time.perf_counter() - start
+            finally:
+                markdown_compiler.column_widths = column_widths
+            pages = pdf.getvalue().count(b'/Type /Page\n')
+            print(f"{rows:>6}  {name:<10}{estimate_ms:>8.2f}ms{render_s:>9.2f}s{pages:>8}")
+
+
+if __name__ == '__main__':
+    main()
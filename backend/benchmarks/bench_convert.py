@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a nightly build of 24 reports, a script importing app.py vs the convert command
+
+Startup is the time to import app (Flask, CORS, Azure AD auth, the
+limiter, the DocuSign client and logging) vs renderer alone. The builds
+run as fresh processes, as a scheduled job would, and write every report
+to a directory: a script rendering through app.create_pdf, as
+create_baselines.py did, then python -m convert with no worker processes
+and with 2, and an --incremental rerun after one report changed. Best of
+three runs each.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add backend directory to path
+sys.path.insert(0, BACKEND_DIR)
+
+from tests.fixtures import FIXTURES
+
+REPORTS = 24
+RUNS = 3
+
+APP_SCRIPT = """
+import glob, os, sys
+from app import create_pdf, convert_config, default_logo
+config = dict(convert_config({}), logo_path=default_logo()[0])
+for source in sorted(glob.glob(os.path.join(sys.argv[1], '*.md'))):
+    with open(source) as f, open(os.path.join(sys.argv[2], os.path.basename(source)[:-3] + '.pdf'), 'wb') as out:
+        create_pdf(f.read(), config, output=out)
+"""
+
+
+def timed(command, runs=RUNS, before=None):
+    times = []
+    for _ in range(runs):
+        if before:
+            before()
+        start = time.perf_counter()
+        subprocess.run(command, cwd=BACKEND_DIR, check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    docs, output = os.path.join(directory, 'docs'), os.path.join(directory, 'pdfs')
+    os.makedirs(docs)
+    body = "\n\n".join([FIXTURES['complex']] * 4)
+    for i in range(REPORTS):
+        with open(os.path.join(docs, f'report-{i:02}.md'), 'w') as f:
+            f.write(f"# Branch Report {i}\n\n{body}")
+
+    def clean():
+        shutil.rmtree(output, ignore_errors=True)
+        os.makedirs(output)
+
+    def touch_one():
+        with open(os.path.join(docs, 'report-00.md'), 'a') as f:
+            f.write("\n\nRevised")
+
+    print(f"{REPORTS} reports of about four pages, {os.cpu_count()} CPUs\n")
+    print(f"{'startup':<24}{'time':>8}")
+    for module in ('app', 'renderer'):
+        print(f"{'import ' + module:<24}{timed([sys.executable, '-c', f'import {module}']) * 1000:>6.0f}ms")
+
+    convert = [sys.executable, '-m', 'convert', docs, '-o', output]
+    print(f"\n{'build':<24}{'time':>8}")
+    for name, command, before in (
+        ('app.create_pdf script', [sys.executable, '-c', APP_SCRIPT, docs, output], clean),
+        ('convert, 0 workers', convert + ['--workers', '0'], clean),
+        ('convert, 2 workers', convert + ['--workers', '2'], clean),
+        ('convert --incremental', convert + ['--incremental'], touch_one),
+    ):
+        print(f"{name:<24}{timed(command, before=before):>7.2f}s")
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark: markdown parse time vs the size of an embedded data URI image
+
+Parses a short report holding one base64 image of growing size, with the
+data URI inline and after extracting it to a side table. The payload is not a
+decodable image: the html front end's failed decode (after extraction, a
+lookup and a b64decode) is all the image work included.
+"""
+import base64
+import os
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renderer import render_html_story
+from embedded_images import DocumentImages
+from markdown_compiler import get_backend
+from themes import get_theme
+from tests.fixtures import FIXTURES
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def report(image_bytes):
+    payload = base64.b64encode(os.urandom(image_bytes)).decode()
+    return f"{FIXTURES['complex']}\n\n![screenshot](data:image/png;base64,{payload})\n\nClosing remarks."
+
+
+def main(sizes=(64 * 1024, 512 * 1024, 2 * 1024 * 1024, 8 * 1024 * 1024), repeat=3):
+    styles = get_theme()
+    parser = get_backend()
+
+    print(f"{'image':>8}{'html inline':>14}{'ast inline':>13}{'extract':>10}{'html after':>13}{'ast after':>12}")
+    for size in sizes:
+        markdown_text = report(size)
+        images = DocumentImages()
+        extracted = images.extract(markdown_text)
+
+        html_inline = timed(lambda: render_html_story(markdown_text, styles), repeat)
+        ast_inline = timed(lambda: parser.parse(markdown_text), repeat)
+        extract = timed(lambda: DocumentImages().extract(markdown_text), repeat)
+        html_after = timed(lambda: render_html_story(extracted, styles, images), repeat)
+        ast_after = timed(lambda: parser.parse(extracted), repeat)
+
+        print(f"{size // 1024:>6}KB{html_inline:>12.1f}ms{ast_inline:>11.1f}ms{extract:>8.1f}ms"
+              f"{html_after:>11.1f}ms{ast_after:>10.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
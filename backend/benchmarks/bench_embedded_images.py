@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a screenshot-heavy report, as embedded images vs the image pipeline
+
+The report holds full-HD screenshots, some shown more than once, plus a few
+camera photos. "full size" embeds every occurrence at source resolution like
+the previous implementation did (at the same drawn size); "pipeline" decodes
+each picture once and embeds it at IMAGE_DPI.
+"""
+import base64
+import io
+import os
+import random
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image as PILImage, ImageDraw, ImageFilter
+from reportlab.platypus import Image as RLImage, Spacer
+
+import markdown_compiler
+from renderer import create_pdf
+from embedded_images import DEFAULT_IMAGE_WIDTH, IMAGE_DPI
+from tests.fixtures import DEFAULT_CONFIG
+
+
+def screenshot(seed, size=(1920, 1080)):
+    """A UI-like screenshot: panels, text lines, a chart and a photo thumbnail"""
+    rng = random.Random(seed)
+    img = PILImage.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, size[0], 60], fill=(11, 152, 206))
+    draw.rectangle([0, 60, 260, size[1]], fill=(240, 244, 248))
+    for row in range(40):
+        y = 90 + row * 24
+        draw.text((300, y), f"Row {row}: value {rng.randint(0, 99999)} status ok", fill=(73, 73, 73))
+    for bar in range(12):
+        height = rng.randint(50, 400)
+        draw.rectangle([1000 + bar * 50, 900 - height, 1030 + bar * 50, 900], fill=(49, 110, 168))
+    photo = PILImage.effect_noise((480, 320), 60).convert('RGB').filter(ImageFilter.GaussianBlur(2))
+    img.paste(photo, (1350, 120))
+    output = io.BytesIO()
+    img.save(output, 'PNG')
+    return output.getvalue()
+
+
+def photo(seed, size=(3000, 2000)):
+    rng = random.Random(seed)
+    img = PILImage.effect_noise(size, rng.randint(30, 60)).convert('RGB').filter(ImageFilter.GaussianBlur(3))
+    output = io.BytesIO()
+    img.save(output, 'JPEG', quality=90)
+    return output.getvalue()
+
+
+def screenshot_report(distinct=12, repeats=3, photos=3):
+    """Markdown for the benchmark report: each screenshot appears `repeats` times"""
+    images = [('png', screenshot(seed)) for seed in range(distinct)]
+    images += [('jpeg', photo(seed)) for seed in range(photos)]
+    sections = []
+    for repeat in range(repeats):
+        for index, (kind, data) in enumerate(images):
+            if kind == 'jpeg' and repeat:
+                continue
+            uri = f"data:image/{kind};base64,{base64.b64encode(data).decode()}"
+            sections.append(f"## Figure {repeat}.{index}\n\nSome commentary on this figure.\n\n![figure]({uri})")
+    return "# Screenshot Report\n\n" + "\n\n".join(sections)
+
+
+def full_size_image_flowables(src, alt, styles, width=None, height=None, images=None):
+    """The previous behavior: decode and embed every occurrence at source resolution"""
+    data = base64.b64decode(src.split(',', 1)[1])
+    image = RLImage(io.BytesIO(data))
+    width = width or DEFAULT_IMAGE_WIDTH
+    height = height or width * image.imageHeight / image.imageWidth
+    return [RLImage(io.BytesIO(data), width=width, height=height), Spacer(1, 12)]
+
+
+def main():
+    markdown_text = report = screenshot_report()
+    print(f"Report: {len(report) / 1024 / 1024:.1f} MiB of markdown, IMAGE_DPI={IMAGE_DPI}\n")
+
+    pipeline = markdown_compiler.image_flowables
+    results = {}
+    for name, image_flowables in (('full size', full_size_image_flowables), ('pipeline', pipeline)):
+        markdown_compiler.image_flowables = image_flowables
+        try:
+            start = time.perf_counter()
+            pdf = create_pdf(markdown_text, dict(DEFAULT_CONFIG, markdown_frontend='ast'))
+            results[name] = ((time.perf_counter() - start) * 1000, len(pdf.getvalue()))
+        finally:
+            markdown_compiler.image_flowables = pipeline
+
+    print(f"{'':<12}{'time':>12}{'PDF size':>12}")
+    for name, (elapsed_ms, size) in results.items():
+        print(f"{name:<12}{elapsed_ms:>10.0f}ms{size / 1024 / 1024:>10.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
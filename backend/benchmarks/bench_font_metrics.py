@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: string width measurement on the complex fixture scaled up 100x
+
+Renders the document with the fonts registered as plain TTFonts and as
+MemoizedTTFonts, each in its own process since fonts are registered once per
+process. Reports wall time of a cold and the best of three warm renders, and
+from a profile of one more render, the time spent in pdfmetrics.stringWidth.
+"""
+import cProfile
+import json
+import os
+import pstats
+import subprocess
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(variant, copies):
+    import brand_assets
+    if variant == 'ttfont':
+        from reportlab.pdfbase.ttfonts import TTFont
+        brand_assets.MemoizedTTFont = TTFont
+
+    from renderer import create_pdf
+    from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+    markdown_text = "\n\n".join([FIXTURES['complex']] * copies)
+
+    start = time.perf_counter()
+    create_pdf(markdown_text, DEFAULT_CONFIG)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    warm_ms = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        create_pdf(markdown_text, DEFAULT_CONFIG)
+        warm_ms = min(warm_ms, (time.perf_counter() - start) * 1000)
+
+    profile = cProfile.Profile()
+    profile.runcall(create_pdf, markdown_text, DEFAULT_CONFIG)
+    stats = pstats.Stats(profile).stats
+    width_calls, width_s, total_s = 0, 0.0, 0.0
+    for (filename, _, function), (_, calls, _, cumulative, _) in stats.items():
+        # pdfmetrics also has a Font.stringWidth; the module function is the busy one
+        if function == 'stringWidth' and filename.endswith('pdfmetrics.py') and calls > width_calls:
+            width_calls, width_s = calls, cumulative
+        if function == 'create_pdf':
+            total_s = cumulative
+
+    print(json.dumps({
+        'cold_ms': cold_ms,
+        'warm_ms': warm_ms,
+        'width_calls': width_calls,
+        'width_ms': width_s * 1000,
+        'profiled_ms': total_s * 1000,
+    }))
+
+
+def main(copies=100):
+    print(f"Document: complex fixture x{copies}\n")
+    print(f"{'font':<16}{'cold':>10}{'warm':>10}{'widths (profiled)':>22}{'calls':>9}")
+    for variant in ('ttfont', 'memoized'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), variant, str(copies)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        share = result['width_ms'] / result['profiled_ms'] * 100
+        print(f"{variant:<16}{result['cold_ms']:>8.0f}ms{result['warm_ms']:>8.0f}ms"
+              f"{result['width_ms']:>12.0f}ms ({share:>4.1f}%){result['width_calls']:>9}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1], int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: time and memory of data appendix tables of 1k, 10k and 50k rows
+
+Compares one Table split page by page, as every table used to be built, with
+the LargeTable layout. Each run is a separate process so peak RSS is
+measured independently; runs that exceed the time limit are reported as such.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markdown_compiler
+from renderer import create_pdf
+from tests.fixtures import DEFAULT_CONFIG
+
+TIME_LIMIT = 600
+
+
+def appendix(rows, cols=6):
+    lines = ["# Data Appendix", "", "| " + " | ".join(f"Field {c}" for c in range(cols)) + " |", "|" + "---|" * cols]
+    for r in range(rows):
+        lines.append("| " + " | ".join(
+            f"REC-{r:06d}" if c == 0 else f"value {r * cols + c} measured at site {c}" for c in range(cols)
+        ) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def run(variant, rows):
+    if variant == 'table':
+        markdown_compiler.LARGE_TABLE_ROWS = float('inf')
+    markdown_text = appendix(rows)
+
+    start = time.perf_counter()
+    pdf = create_pdf(markdown_text, dict(DEFAULT_CONFIG, markdown_frontend='ast'))
+    total_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        'pages': pdf.getvalue().count(b'/Type /Page\n'),
+        'total_ms': total_ms,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main(sizes=(1000, 10000, 50000)):
+    print(f"{'rows':>7}  {'layout':<12}{'time':>12}{'peak RSS':>12}{'pages':>8}")
+    for rows in sizes:
+        for variant in ('table', 'large'):
+            try:
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), variant, str(rows)],
+                    check=True, capture_output=True, text=True, timeout=TIME_LIMIT
+                ).stdout
+            except subprocess.TimeoutExpired:
+                print(f"{rows:>7}  {variant:<12}{'> ' + str(TIME_LIMIT) + 's':>12}")
+                continue
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{rows:>7}  {variant:<12}{result['total_ms'] / 1000:>11.2f}s"
+                  f"{result['peak_rss_mb']:>10.1f}MB{result['pages']:>8}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1], int(sys.argv[2]))
+    else:
+        main()
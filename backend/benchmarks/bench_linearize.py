@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: time to first page of a 36-page report with diagrams, plain vs linearized PDF
+
+A viewer can only draw a plain PDF once the whole file has arrived, since
+its cross-reference table is at the end; a linearized one can draw page 1
+once the first /E bytes have. Time to first page is taken as render time
+(plus linearizing) and the time to download those bytes at each bandwidth.
+The diagrams are lossless noise, so they do not shrink; each chapter has
+one, after its text.
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from pdf_linearize import linearize
+import renderer
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+CHAPTERS = 12
+RUNS = 3
+# Link speeds in Mbit/s: mobile, home broadband, office
+BANDWIDTHS = (2, 10, 50)
+
+
+def document(directory):
+    chapters = []
+    for i in range(CHAPTERS):
+        path = os.path.join(directory, f'diagram-{i}.png')
+        pixels = bytes(value & 0xF8 for value in os.urandom(600 * 420 * 3))
+        Image.frombytes('RGB', (600, 420), pixels).save(path)
+        chapters.append(f"# Chapter {i}\n\n" + FIXTURES['complex'] + f"\n\n![diagram {i}]({path})")
+    return "\n\n".join(chapters)
+
+
+def best(function):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    markdown_text = document(directory)
+    config = dict(DEFAULT_CONFIG, section_page_breaks=True)
+
+    render_time, pdf = best(lambda: renderer.create_pdf(markdown_text, config).getvalue())
+    linearize_time, linearized = best(lambda: linearize(pdf).getvalue())
+    first_page_end = int(re.search(rb'/E (\d+)', linearized[:1024]).group(1))
+    pages = len(re.findall(rb'/Type /Page\b', pdf))
+    shutil.rmtree(directory)
+
+    print(f"{pages} pages, {len(pdf) / 1024 / 1024:.1f} MB plain, {len(linearized) / 1024 / 1024:.1f} MB linearized, "
+          f"page 1 in the first {first_page_end / 1024:.0f} KB\n")
+    print(f"{'run':<12}{'render':>9}{'needed':>10}" + "".join(f"{f'{mbit} Mbit/s':>13}" for mbit in BANDWIDTHS))
+    for name, elapsed, needed in (('plain', render_time, len(pdf)),
+                                  ('linearized', render_time + linearize_time, first_page_end)):
+        first_page = [elapsed + needed * 8 / (mbit * 1000 * 1000) for mbit in BANDWIDTHS]
+        print(f"{name:<12}{elapsed * 1000:>7.0f}ms{needed / 1024:>8.0f}KB"
+              + "".join(f"{seconds:>12.2f}s" for seconds in first_page))
+
+
+if __name__ == '__main__':
+    main()
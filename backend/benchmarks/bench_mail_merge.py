@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: one proposal sent to 48 clients, one /api/convert call each vs one /api/convert/merge call
+
+The proposal is the complex fixture repeated to about three pages, with
+the client, contact, fee and date filled in. The one-by-one run fills the
+template on the client side and posts each proposal in sequence, as a
+client script would; the merge posts the template and the records together
+and reads the ZIP. Requests go over HTTP to a local threaded server, renders
+use two worker processes, started beforehand, and the PDF cache is cleared
+before each run.
+"""
+import io
+import logging
+import os
+import sys
+import threading
+import time
+import zipfile
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from werkzeug.serving import make_server
+
+import app
+from mail_merge import MergeTemplate
+from render_pool import RenderPool
+from tests.fixtures import FIXTURES
+
+RECORDS = 48
+
+TEMPLATE = (
+    "# Proposal for {{client}}\n\n"
+    "Dear {{contact}},\n\n"
+    "Thank you for the opportunity to quote. Our fee is **{{fee}}**, valid until {{date}}.\n\n"
+    + "\n\n".join([FIXTURES['complex']] * 3)
+)
+
+
+def records():
+    return [
+        {'client': f'Client {i} Ltd', 'contact': f'Person {i}', 'fee': f'${1000 + i * 25:,}',
+         'date': f'2026-11-{i % 28 + 1:02d}'}
+        for i in range(RECORDS)
+    ]
+
+
+def one_by_one(url, settings, values):
+    template = MergeTemplate(TEMPLATE)
+    sizes = []
+    for record in values:
+        response = requests.post(f'{url}/api/convert', json=dict(settings, markdown=template.fill(record)))
+        assert response.status_code == 200, response.status_code
+        sizes.append(len(response.content))
+    return sizes
+
+
+def merge(url, settings, values):
+    response = requests.post(f'{url}/api/convert/merge', json=dict(settings, markdown=TEMPLATE, records=values))
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    return [info.file_size for info in archive.infolist() if info.filename.endswith('.pdf')]
+
+
+def main():
+    # The per-client rate limits would stop the one-by-one run
+    app.limiter.enabled = False
+    settings = {'company': 'Davinci AI Solutions'}
+    values = records()
+    print(f"{RECORDS} records into a {len(TEMPLATE) // 1024} KB template, {os.cpu_count()} CPUs\n")
+    print(f"{'run':<14}{'total':>9}{'per record':>12}{'PDFs':>6}")
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.app.logger.setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+
+    app.render_pool = RenderPool(workers=2)
+    warm_up = [threading.Thread(target=app.render_pool.run, args=(time.sleep, 0.2)) for _ in range(2)]
+    for thread in warm_up:
+        thread.start()
+    for thread in warm_up:
+        thread.join()
+
+    for name, run in (('one by one', one_by_one), ('merge', merge)):
+        app.pdf_cache.clear()
+        start = time.perf_counter()
+        sizes = run(url, settings, values)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14}{elapsed:>8.2f}s{elapsed / RECORDS * 1000:>10.0f}ms{len(sizes):>6}")
+    server.shutdown()
+    app.render_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark: markdown2 + HTMLToReportLab vs the markdown compiler
+
+Times only the markdown-to-flowables step on a long document made of the test
+fixtures, then renders it once to report the page count.
+"""
+import io
+import os
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+
+from renderer import create_pdf, render_html_story
+from markdown_compiler import compile_markdown, compare_stories
+from themes import get_theme
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(copies=30, repeat=3):
+    styles = get_theme()
+    markdown_text = "\n\n".join(list(FIXTURES.values()) * copies)
+
+    html_story = render_html_story(markdown_text, styles)
+    ast_story = compile_markdown(markdown_text, styles)
+    if compare_stories(html_story, ast_story):
+        print("WARNING: front ends disagree on this document")
+
+    pdf = create_pdf(markdown_text, dict(DEFAULT_CONFIG, markdown_frontend='ast'))
+    pages = len(PdfReader(io.BytesIO(pdf.getvalue())).pages)
+    print(f"Document: {len(markdown_text) / 1024:.0f} KiB markdown, "
+          f"{len(ast_story)} flowables, {pages} pages\n")
+
+    html_ms = timed(lambda: render_html_story(markdown_text, styles), repeat)
+    ast_ms = timed(lambda: compile_markdown(markdown_text, styles), repeat)
+
+    print(f"{'front end':<12}{'parse':>12}")
+    print(f"{'html':<12}{html_ms:>10.1f}ms")
+    print(f"{'ast':<12}{ast_ms:>10.1f}ms")
+    print(f"\nSpeedup: {html_ms / ast_ms:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
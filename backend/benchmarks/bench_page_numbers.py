@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory, save time and size of page decoration on a 500-page document
+
+Compares NumberedCanvas with the old approach of snapshotting every page's
+canvas state and replaying it in save(), drawing the letterhead and footer
+into each page. Each variant runs in its own process so peak RSS is
+measured independently.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import renderer
+from renderer import NumberedCanvas, create_pdf
+from reportlab.pdfgen import canvas
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+class SnapshotCanvas(NumberedCanvas):
+    """The previous implementation: keep every page until save()"""
+
+    def __init__(self, *args, **kwargs):
+        NumberedCanvas.__init__(self, *args, **kwargs)
+        self._saved_page_states = []
+
+    def showPage(self):
+        self._saved_page_states.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        num_pages = len(self._saved_page_states)
+        total_numbered_pages = num_pages - 1 if self.has_title_page else num_pages
+        for page_index, state in enumerate(self._saved_page_states):
+            self.__dict__.update(state)
+            if self.has_title_page and page_index == 0:
+                canvas.Canvas.showPage(self)
+                continue
+            self.current_page_number = page_index if self.has_title_page else page_index + 1
+            self.total_pages = total_numbered_pages
+            self.draw_page_number()
+            self.draw_header()
+            self.draw_footer()
+            canvas.Canvas.showPage(self)
+        canvas.Canvas.save(self)
+
+
+def timed_save(canvas_class):
+    """Wrap save() to record how long it takes"""
+    timings = []
+    original = canvas_class.save
+
+    def save(self):
+        start = time.perf_counter()
+        original(self)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    canvas_class.save = save
+    return timings
+
+
+def run(variant, copies):
+    canvas_class = SnapshotCanvas if variant == 'snapshot' else NumberedCanvas
+    timings = timed_save(canvas_class)
+    renderer.NumberedCanvas = canvas_class
+
+    markdown_text = "\n\n".join(list(FIXTURES.values()) * copies)
+    config = dict(DEFAULT_CONFIG, include_title_page=True)
+
+    start = time.perf_counter()
+    pdf = create_pdf(markdown_text, config)
+    total_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        'pages': pdf.getvalue().count(b'/Type /Page\n'),
+        'bytes': len(pdf.getvalue()),
+        'total_ms': total_ms,
+        'save_ms': timings[0],
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main(copies=125):
+    results = {}
+    for variant in ('snapshot', 'deferred'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), variant, str(copies)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[variant] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"Document: {results['deferred']['pages']} pages\n")
+    print(f"{'canvas':<10}{'peak RSS':>12}{'save()':>12}{'create_pdf':>14}{'size':>12}")
+    for variant, result in results.items():
+        print(f"{variant:<10}{result['peak_rss_mb']:>10.1f}MB{result['save_ms']:>10.1f}ms"
+              f"{result['total_ms']:>12.1f}ms{result['bytes'] / 1024:>10.0f}KB")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1], int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: wall time of a 300+ page document with section page breaks, serial vs sections in worker processes
+
+Forty chapters of the complex fixture, with the title and signature pages.
+Renders serially and with 2 and 4 section workers, and one per CPU. Also
+reports the page count, PDF size and the time of the final merge, which runs
+in the request's process, and checks that every page's text matches the
+serial render.
+"""
+import io
+import os
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+
+import parallel_sections
+from renderer import create_pdf
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+CONFIG = dict(DEFAULT_CONFIG, section_page_breaks=True, include_title_page=True, include_signature_page=True)
+
+
+def chapters(count, copies):
+    body = "\n\n".join(FIXTURES['complex'].split('\n\n')[1:])
+    return "\n\n".join(f"# Chapter {i}\n\n" + "\n\n".join([body] * copies) for i in range(count))
+
+
+def timed_merge():
+    """Wrap parallel_sections.merge to record how long it takes"""
+    timings = []
+    merge = parallel_sections.merge
+
+    def timed(*args):
+        start = time.perf_counter()
+        result = merge(*args)
+        timings.append(time.perf_counter() - start)
+        return result
+
+    parallel_sections.merge = timed
+    return timings
+
+
+def render(markdown_text, workers):
+    parallel_sections.SECTION_WORKERS = workers
+    parallel_sections.shutdown()
+    if workers:
+        # Start the pool outside the timing, as a long-running server would
+        parallel_sections.get_pool().submit(int).result()
+    start = time.perf_counter()
+    pdf = create_pdf(markdown_text, CONFIG).getvalue()
+    return time.perf_counter() - start, pdf
+
+
+def main(count=40, copies=6):
+    markdown_text = chapters(count, copies)
+    merge_timings = timed_merge()
+    parallel_sections.SECTION_MIN_CHARS = 0
+    print(f"Document: {count} chapters, {len(markdown_text) // 1024} KB markdown, {os.cpu_count()} CPUs\n")
+    print(f"{'workers':<10}{'time':>9}{'pages':>8}{'size':>10}{'speedup':>9}{'merge':>9}  pages match")
+
+    render(markdown_text, 0)  # warm the theme, templates and width caches
+    serial_s, serial_pdf = render(markdown_text, 0)
+    serial_text = [page.extract_text() for page in PdfReader(io.BytesIO(serial_pdf)).pages]
+    print(f"{'serial':<10}{serial_s:>8.2f}s{len(serial_text):>8}{len(serial_pdf) // 1024:>8}KB{1:>8.2f}x")
+
+    for workers in sorted({2, 4, os.cpu_count() or 1} - {1}):
+        elapsed, pdf = render(markdown_text, workers)
+        text = [page.extract_text() for page in PdfReader(io.BytesIO(pdf)).pages]
+        print(f"{workers:<10}{elapsed:>8.2f}s{len(text):>8}{len(pdf) // 1024:>8}KB"
+              f"{serial_s / elapsed:>8.2f}x{merge_timings[-1]:>8.2f}s  {text == serial_text}")
+    parallel_sections.shutdown()
+
+
+if __name__ == '__main__':
+    main()
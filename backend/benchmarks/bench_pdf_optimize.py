@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: size and time of the "fast" and "small" optimizer profiles on three documents
+
+A two-page letter (the complex fixture), a 36-page report with section page
+breaks, and a 24-page report with a drawn diagram in each of its chapters.
+Optimizing time is the best of three runs; the base64 column is the size a
+DocuSign envelope carries the PDF at.
+"""
+import base64
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from pdf_optimize import PROFILES, optimize
+import renderer
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+RUNS = 3
+
+
+def diagram(path, seed):
+    """A flowchart-like drawing: boxes, lines and labels on white"""
+    image = Image.new('RGB', (1200, 800), 'white')
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        x, y = 60 + (i % 4) * 280, 80 + (i // 4) * 240
+        draw.rectangle([x, y, x + 200, y + 120], outline=(11, 152, 206), width=4, fill=(236, 246, 252))
+        draw.text((x + 20, y + 50), f'Step {seed}.{i}', fill=(49, 110, 168))
+        if i % 4:
+            draw.line([x - 80, y + 60, x, y + 60], fill=(73, 73, 73), width=3)
+    image.save(path)
+
+
+def documents(directory):
+    chapters = []
+    for i in range(12):
+        path = os.path.join(directory, f'diagram-{i}.png')
+        diagram(path, i)
+        chapters.append(f"# Chapter {i}\n\n" + FIXTURES['complex'].split('\n\n', 1)[1] + f"\n\n![diagram {i}]({path})")
+    report = "\n\n".join(f"# Chapter {i}\n\n" + FIXTURES['complex'] for i in range(12))
+    return {
+        'letter': (FIXTURES['complex'], DEFAULT_CONFIG),
+        'report': (report, dict(DEFAULT_CONFIG, section_page_breaks=True)),
+        'diagrams': ("\n\n".join(chapters), dict(DEFAULT_CONFIG, section_page_breaks=True)),
+    }
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    print(f"{'document':<10}{'profile':<9}{'time':>8}{'size':>10}{'saved':>8}{'base64':>10}")
+    for name, (markdown_text, config) in documents(directory).items():
+        pdf = renderer.create_pdf(markdown_text, config).getvalue()
+        print(f"{name:<10}{'none':<9}{'':>8}{len(pdf) / 1024:>8.0f}KB{'':>8}"
+              f"{len(base64.b64encode(pdf)) / 1024:>8.0f}KB")
+        for profile in PROFILES:
+            times = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                optimized = optimize(pdf, profile).getvalue()
+                times.append(time.perf_counter() - start)
+            print(f"{'':<10}{profile:<9}{min(times) * 1000:>6.0f}ms{len(optimized) / 1024:>8.0f}KB"
+                  f"{(1 - len(optimized) / len(pdf)) * 100:>7.1f}%{len(base64.b64encode(optimized)) / 1024:>8.0f}KB")
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
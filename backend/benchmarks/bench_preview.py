@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: live preview after editing one paragraph of a 200-page document
+
+Compares a full create_pdf against the block-cached preview path, both for
+the whole PDF and for the markdown-to-flowables step alone.
+"""
+import io
+import os
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+
+from renderer import create_pdf
+from block_cache import BlockCache
+from markdown_compiler import compile_markdown
+from themes import get_theme
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def numbered(markdown_text, number):
+    """Tag each text line with a section number so no two sections share blocks"""
+    lines = []
+    for line in markdown_text.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith('|') and not set(stripped) <= set('|-: '):
+            line = line.replace('|', f'| {number}', 1)
+        elif stripped and not stripped.startswith('```') and not set(stripped) <= set('-=_* '):
+            line = f'{line} {number}'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(copies=50):
+    styles = get_theme()
+    sections = [numbered(markdown_text, copy * len(FIXTURES) + index)
+                for copy in range(copies)
+                for index, markdown_text in enumerate(FIXTURES.values())]
+    original = "\n\n".join(sections)
+
+    # Edit one paragraph in the middle of the document
+    middle = len(sections) // 2
+    edited_sections = list(sections)
+    edited_sections[middle] = edited_sections[middle].replace('\n\n', '\n\nAn edited paragraph.\n\n', 1)
+    edited = "\n\n".join(edited_sections)
+
+    pdf, _ = timed(lambda: create_pdf(original, DEFAULT_CONFIG))
+    pages = len(PdfReader(io.BytesIO(pdf.getvalue())).pages)
+    print(f"Document: {len(original) / 1024:.0f} KiB markdown, {pages} pages\n")
+
+    cache = BlockCache()
+    create_pdf(original, DEFAULT_CONFIG, block_cache=cache)
+    misses = cache.misses
+
+    _, full_compile_ms = timed(lambda: compile_markdown(edited, styles))
+    _, full_pdf_ms = timed(lambda: create_pdf(edited, DEFAULT_CONFIG))
+
+    _, cached_pdf_ms = timed(lambda: create_pdf(edited, DEFAULT_CONFIG, block_cache=cache))
+    recompiled = cache.misses - misses
+    _, cached_compile_ms = timed(lambda: cache.compile(edited, styles))
+
+    print(f"Blocks recompiled after the edit: {recompiled}\n")
+    print(f"{'':<14}{'flowables':>12}{'PDF':>12}")
+    print(f"{'full render':<14}{full_compile_ms:>10.1f}ms{full_pdf_ms:>10.1f}ms")
+    print(f"{'preview':<14}{cached_compile_ms:>10.1f}ms{cached_pdf_ms:>10.1f}ms")
+    print(f"\nTime to new PDF: {full_pdf_ms / cached_pdf_ms:.2f}x faster")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency of light requests while heavy documents render, inline vs the render pool
+
+Six threads post a 100-page document to /api/convert at the same time, as
+gunicorn request threads would, while the main thread polls /api/health and
+converts a one-page document. Renders run in the request threads
+(RENDER_WORKERS=0) or in two worker processes with a queue of two, where
+the surplus heavy requests get a 503. The one-page document is short enough
+to render in the request thread either way.
+"""
+import os
+import statistics
+import sys
+import threading
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from render_pool import RenderPool
+from tests.fixtures import FIXTURES
+
+HEAVY_REQUESTS = 6
+
+
+def heavy(client, index, statuses):
+    # A different title per request, so none is served from the PDF cache
+    markdown_text = f"# Report {index}\n\n" + "\n\n".join([FIXTURES['complex']] * 50)
+    statuses.append(client.post('/api/convert', json={'markdown': markdown_text}).status_code)
+
+
+def run(pool):
+    app.render_pool = pool
+    app.pdf_cache.clear()
+    client = app.app.test_client()
+    statuses = []
+    threads = [threading.Thread(target=heavy, args=(client, i, statuses)) for i in range(HEAVY_REQUESTS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    health_ms, light_ms, light_statuses = [], [], []
+    light = 0
+    while any(thread.is_alive() for thread in threads):
+        t = time.perf_counter()
+        client.get('/api/health')
+        health_ms.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        light_statuses.append(client.post('/api/convert', json={'markdown': f"# Note {light}\n\nShort."}).status_code)
+        light_ms.append((time.perf_counter() - t) * 1000)
+        light += 1
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    assert set(light_statuses) == {200}, light_statuses
+    return elapsed, statuses, health_ms, light_ms
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    # The per-client rate limits would cut the polling short
+    app.limiter.enabled = False
+    print(f"{HEAVY_REQUESTS} concurrent 100-page conversions, {os.cpu_count()} CPUs\n")
+    print(f"{'renders':<14}{'total':>8}{'200':>5}{'503':>5}{'health p50/p95':>18}{'1-page p50/p95':>18}")
+    for name, pool in (('inline', RenderPool(workers=0)), ('pool 2+2', RenderPool(workers=2, queue_size=2))):
+        elapsed, statuses, health_ms, light_ms = run(pool)
+        print(f"{name:<14}{elapsed:>7.1f}s{statuses.count(200):>5}{statuses.count(503):>5}"
+              f"{statistics.median(health_ms):>9.1f}/{percentile(health_ms, 0.95):<6.0f}ms"
+              f"{statistics.median(light_ms):>9.0f}/{percentile(light_ms, 0.95):<6.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: server memory during concurrent downloads of large PDFs, in memory vs spooled to temp files
+
+Each document draws eight noisy diagrams from local files, which barely
+compress, so the markdown is tiny and each PDF is about 9 MB; every request
+gets a different title, so none is served from the cache. The server runs
+in its own process, rendering everything in two render workers, as it does
+long documents, and its RSS is sampled while six clients convert and
+download at once. The in-memory run sets PDF_SPOOL_BYTES above the PDF size.
+The server here is werkzeug's, which sends a spooled file in chunks;
+gunicorn would use sendfile instead.
+"""
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from PIL import Image
+
+CLIENTS = 6
+IMAGES = 8
+
+
+def diagrams(directory):
+    """Paths of IMAGES PNGs of noise in 32 levels per channel, so they stay lossless"""
+    paths = []
+    for i in range(IMAGES):
+        pixels = bytes(value & 0xF8 for value in os.urandom(800 * 560 * 3))
+        paths.append(os.path.join(directory, f'diagram-{i}.png'))
+        Image.frombytes('RGB', (800, 560), pixels).save(paths[-1])
+    return paths
+
+
+def document(number, paths):
+    return f"# Site Survey {number}\n\n" + "\n\n".join(
+        f"## Diagram {i}\n\n![diagram {i}]({path})" for i, path in enumerate(paths)
+    )
+
+
+def serve():
+    """Run the app on a free port and print it, until terminated"""
+    import logging
+    from werkzeug.serving import make_server
+    import app
+    from render_pool import RenderPool
+
+    app.limiter.enabled = False
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.app.logger.setLevel(logging.WARNING)
+    app.render_pool = RenderPool(workers=2)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(server.server_port, flush=True)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        threading.Event().wait()
+    finally:
+        app.render_pool.shutdown()
+
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+
+def run(spool_bytes, documents):
+    env = dict(os.environ, PDF_SPOOL_BYTES=str(spool_bytes), RENDER_INLINE_CHARS='0')
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve'], env=env,
+                              stdout=subprocess.PIPE, text=True)
+    url = f'http://127.0.0.1:{server.stdout.readline().strip()}'
+    # Warm up the render workers and the request path
+    requests.post(f'{url}/api/convert', json={'markdown': documents[-1]})
+
+    baseline = rss_mb(server.pid)
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], rss_mb(server.pid))
+            time.sleep(0.005)
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+
+    sizes = [None] * CLIENTS
+
+    def download(index):
+        response = requests.post(f'{url}/api/convert', json={'markdown': documents[index]}, stream=True)
+        sizes[index] = sum(len(chunk) for chunk in response.iter_content(64 * 1024))
+    clients = [threading.Thread(target=download, args=(i,)) for i in range(CLIENTS)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    done.set()
+    sampler.join()
+    server.terminate()
+    server.wait()
+    return elapsed, baseline, peak[0], sizes
+
+
+def main():
+    if '--serve' in sys.argv:
+        serve()
+        return
+
+    directory = tempfile.mkdtemp()
+    paths = diagrams(directory)
+    print(f"{CLIENTS} concurrent downloads, {os.cpu_count()} CPUs\n")
+    print(f"{'run':<12}{'total':>9}{'PDF':>10}{'server RSS':>12}{'growth':>10}")
+    documents = [document(i, paths) for i in range(CLIENTS + 1)]
+    for name, spool_bytes in (('in memory', 1 << 40), ('spooled', 8 * 1024 * 1024)):
+        elapsed, baseline, peak, sizes = run(spool_bytes, documents)
+        print(f"{name:<12}{elapsed:>8.2f}s{max(sizes) / 1024 / 1024:>8.1f}MB"
+              f"{peak:>10.0f}MB{peak - baseline:>8.0f}MB")
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request style setup vs the shared theme registry
+
+Compiling a theme is what every request used to pay before rendering. On
+small documents that setup is a large share of create_pdf time.
+"""
+import os
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renderer import create_pdf
+from themes import compile_theme, get_theme
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(repeat=200):
+    compile_ms = timed(lambda: compile_theme('davinci'), repeat)
+    lookup_ms = timed(lambda: get_theme('davinci'), repeat)
+
+    print(f"Theme compile (old per-request cost): {compile_ms:.3f} ms")
+    print(f"Registry lookup (new per-request cost): {lookup_ms * 1000:.3f} us\n")
+
+    print(f"{'fixture':<14}{'create_pdf':>12}{'style share':>14}")
+    for name in ('simple', 'lists', 'formatting', 'table', 'metadata'):
+        render_ms = timed(lambda: create_pdf(FIXTURES[name], DEFAULT_CONFIG), repeat // 10)
+        share = compile_ms / (render_ms + compile_ms) * 100
+        print(f"{name:<14}{render_ms:>10.2f}ms{share:>13.1f}%")
+
+
+if __name__ == '__main__':
+    main()
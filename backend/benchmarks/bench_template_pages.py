@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of the title and signature pages on top of a one-page document
+
+"rebuilt" clears the shared templates before every render, so each document
+builds the pages from scratch as it did before they were precompiled.
+"""
+import os
+import sys
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renderer import create_pdf, create_signature_page, create_title_page
+from page_templates import templates
+from themes import get_theme
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+def timed(fn, repeat, rebuild):
+    fn()
+    total = 0
+    for _ in range(repeat):
+        if rebuild:
+            templates.clear()
+        start = time.perf_counter()
+        fn()
+        total += time.perf_counter() - start
+    return total / repeat * 1000
+
+
+def main(repeat=50):
+    styles = get_theme()
+    markdown_text = FIXTURES['simple']
+    variants = {
+        'title page': dict(DEFAULT_CONFIG, include_title_page=True),
+        'signature page': dict(DEFAULT_CONFIG, include_signature_page=True),
+    }
+    builders = {
+        'title page': lambda: create_title_page(DEFAULT_CONFIG, styles, 'Title'),
+        'signature page': lambda: create_signature_page(DEFAULT_CONFIG, styles),
+    }
+
+    print(f"{'':<16}{'':<10}{'build':>10}{'overhead':>12}")
+    for rebuild in (True, False):
+        base_ms = timed(lambda: create_pdf(markdown_text, DEFAULT_CONFIG), repeat, rebuild)
+        label = 'rebuilt' if rebuild else 'shared'
+        for name, config in variants.items():
+            build_ms = timed(builders[name], repeat, rebuild)
+            total_ms = timed(lambda: create_pdf(markdown_text, config), repeat, rebuild)
+            print(f"{name:<16}{label:<10}{build_ms:>8.2f}ms{total_ms - base_ms:>10.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
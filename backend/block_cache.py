@@ -0,0 +1,128 @@
+"""
+Block-level flowable cache for Davinci Document Creator
+Lets live previews recompile only the top-level markdown blocks that changed
+"""
+
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+
+from markdown_compiler import FlowableCompiler, get_backend, split_blocks
+
+
+class BlockCache:
+    """
+    LRU of compiled flowables for top-level markdown blocks
+
+    Entries are keyed by the block's source hash and the compiler state it
+    starts from, so a block is only reused where it would compile the same
+    way: an edit that changes how the next block starts (say, an unclosed h4
+    that leaves text pending) misses the cache for that block too.
+    """
+
+    def __init__(self, max_blocks=20000):
+        self.max_blocks = max_blocks
+        self._entries = OrderedDict()
+        # Cached flowables are shared between builds, so builds that use
+        # this cache take turns
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, markdown_text, styles, backend=None, images=None):
+        """
+        Markdown to flowables, reusing cached output for unchanged blocks
+
+        Raises UnsupportedMarkdown like compile_markdown; blocks compiled
+        before the error stay cached.
+        """
+        parser = get_backend(backend)
+        compiler = FlowableCompiler(styles, images)
+        theme_id = getattr(styles, 'theme_id', id(styles))
+
+        # A flowable can only appear once in a story, so repeats of a block
+        # within one document are compiled afresh
+        used = set()
+
+        with self.lock:
+            for chunk in split_blocks(markdown_text):
+                digest = hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+                key = (theme_id, backend, digest, compiler.state())
+                if key in used:
+                    compiler.feed(parser.parse(chunk))
+                    continue
+                used.add(key)
+
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    flowables, state = entry
+                    for flowable in flowables:
+                        # ReportLab marks flowables it pushed to the next page
+                        # and treats a second push as a layout error
+                        flowable.__dict__.pop('_postponed', None)
+                    compiler.story.extend(flowables)
+                    compiler.restore(state)
+                    continue
+
+                self.misses += 1
+                start = len(compiler.story)
+                compiler.feed(parser.parse(chunk))
+                self._entries[key] = (compiler.story[start:], compiler.state())
+                while len(self._entries) > self.max_blocks:
+                    self._entries.popitem(last=False)
+
+        return compiler.finish()
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'blocks': len(self._entries),
+            }
+
+
+class SessionBlockCaches:
+    """One BlockCache per editing session and document, least recently used evicted first"""
+
+    def __init__(self, max_sessions=64, max_blocks=20000):
+        self.max_sessions = max_sessions
+        self.max_blocks = max_blocks
+        self._caches = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_session_id():
+        return uuid.uuid4().hex
+
+    def get(self, session_id, document_id=None):
+        key = (session_id, document_id or 'default')
+        with self._lock:
+            cache = self._caches.get(key)
+            if cache is None:
+                cache = BlockCache(self.max_blocks)
+                self._caches[key] = cache
+                while len(self._caches) > self.max_sessions:
+                    self._caches.popitem(last=False)
+            else:
+                self._caches.move_to_end(key)
+            return cache
+
+    def stats(self):
+        with self._lock:
+            caches = list(self._caches.values())
+        hits = sum(cache.hits for cache in caches)
+        misses = sum(cache.misses for cache in caches)
+        return {
+            'sessions': len(caches),
+            'hits': hits,
+            'misses': misses,
+        }
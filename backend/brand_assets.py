@@ -0,0 +1,186 @@
+"""
+Brand asset manager for Davinci Document Creator
+Resolves logos and fonts once at startup and keeps their bytes in memory
+"""
+
+import copy
+import hashlib
+import io
+import os
+import threading
+import time
+
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from svglib.svglib import svg2rlg
+
+from font_metrics import MemoizedTTFont
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Asset directories in lookup order: the backend's own, then the repo root's
+ASSET_ROOTS = (
+    os.path.join(BACKEND_DIR, 'assets'),
+    os.path.join(BACKEND_DIR, '..', 'assets'),
+)
+
+# Logos by name; the first candidate found in any root wins
+LOGOS = {
+    'logo': ('logos/davinci_logo.png',),
+    'title_logo': ('logos/davinci_logo_sidebyside.svg', 'logos/davinci_logo_sidebyside.png'),
+}
+
+# Fonts by the name they are registered under with ReportLab
+FONTS = {
+    'NotoSans': ('fonts/NotoSans-Regular.ttf',),
+    'NotoSans-Bold': ('fonts/NotoSans-Bold.ttf',),
+}
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class BrandAsset:
+    """One resolved asset file with its bytes, content hash and decoded forms"""
+
+    def __init__(self, name, path, data, stat_key):
+        self.name = name
+        self.path = path
+        self.data = data
+        self.digest = hashlib.sha256(data).hexdigest()
+        self.is_svg = path.lower().endswith('.svg')
+        self.stat_key = stat_key
+
+        self._reader = None
+        self._drawing = None
+        self._lock = threading.Lock()
+
+    def image_reader(self):
+        """Decoded raster image, shared by every document that draws it"""
+        with self._lock:
+            if self._reader is None:
+                self._reader = ImageReader(io.BytesIO(self.data))
+            return self._reader
+
+    def drawing(self):
+        """A copy of the parsed SVG that the caller is free to scale"""
+        with self._lock:
+            if self._drawing is None:
+                self._drawing = svg2rlg(io.BytesIO(self.data))
+            drawing = self._drawing
+        return copy.deepcopy(drawing) if drawing is not None else None
+
+
+class BrandAssets:
+    """
+    Logos and fonts resolved once, served from memory
+
+    Lookups never touch the filesystem except for a stat of the already
+    resolved logo files at most every check_interval seconds, so a logo
+    replaced on disk is picked up without a restart. Fonts are registered
+    with ReportLab once and not reloaded.
+    """
+
+    def __init__(self, roots=ASSET_ROOTS, logos=LOGOS, fonts=FONTS, check_interval=30):
+        self.roots = roots
+        self.logos = logos
+        self.fonts = fonts
+        self.check_interval = check_interval
+
+        self._assets = {}
+        self._by_path = {}
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+        self.reloads = 0
+
+    def _resolve(self, name, candidates):
+        for candidate in candidates:
+            for root in self.roots:
+                path = os.path.join(root, candidate)
+                try:
+                    stat_key = _stat_key(path)
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                return BrandAsset(name, path, data, stat_key)
+        return None
+
+    def _publish(self, assets):
+        self._assets = assets
+        self._by_path = {asset.path: asset for asset in assets.values()}
+        self._checked_at = time.monotonic()
+
+    def load(self):
+        """Resolve and read every logo and font"""
+        assets = {}
+        for name, candidates in list(self.logos.items()) + list(self.fonts.items()):
+            asset = self._resolve(name, candidates)
+            if asset is not None:
+                assets[name] = asset
+        with self._lock:
+            self._publish(assets)
+        return self
+
+    def register_fonts(self):
+        """Register the resolved fonts with ReportLab; returns the names registered"""
+        registered = []
+        for name in self.fonts:
+            asset = self._assets.get(name)
+            if asset is None:
+                raise FileNotFoundError(f"Font {name} not found in {', '.join(self.roots)}")
+            pdfmetrics.registerFont(MemoizedTTFont(name, io.BytesIO(asset.data)))
+            registered.append(name)
+        return registered
+
+    def reload_changed(self):
+        """Re-read logos that changed or appeared on disk; returns their names"""
+        with self._lock:
+            assets = dict(self._assets)
+            changed = []
+            for name, candidates in self.logos.items():
+                asset = assets.get(name)
+                if asset is not None:
+                    try:
+                        if _stat_key(asset.path) == asset.stat_key:
+                            continue
+                    except OSError:
+                        pass
+                fresh = self._resolve(name, candidates)
+                if fresh is None and asset is None:
+                    continue
+                if fresh is None:
+                    del assets[name]
+                else:
+                    assets[name] = fresh
+                changed.append(name)
+
+            self._publish(assets)
+            if changed:
+                self.reloads += 1
+            return changed
+
+    def _maybe_reload(self):
+        if self.check_interval is None:
+            return
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload_changed()
+
+    def get(self, name):
+        """The BrandAsset called name, or None if it was not found"""
+        self._maybe_reload()
+        return self._assets.get(name)
+
+    def for_path(self, path):
+        """The BrandAsset loaded from path, or None for files it does not manage"""
+        return self._by_path.get(path) if path else None
+
+    def stats(self):
+        assets = self._assets
+        return {
+            'assets': {name: asset.digest[:12] for name, asset in assets.items()},
+            'reloads': self.reloads,
+        }
@@ -0,0 +1,97 @@
+"""
+Code regions of markdown for Davinci Document Creator
+Finds the code blocks and code spans whose text renders as written
+"""
+
+import bisect
+import re
+
+# As markdown2's fenced-code-blocks: backtick fences only, closed by the same fence
+_FENCE_RE = re.compile(r'^[ \t]*(`{3,})')
+_LIST_ITEM_RE = re.compile(r'^[ \t]*([*+-]|\d+\.)[ \t]+')
+_CODE_SPAN_RE = re.compile(r'(?<![\\`])(`+)(?!`)(.+?)(?<!`)\1(?!`)', re.S)
+
+
+def _indent(line):
+    line = line.expandtabs(4)
+    return len(line) - len(line.lstrip(' '))
+
+
+class CodeRegions:
+    """
+    Character ranges of the code in markdown_text
+
+    Blocks are fenced code and code indented after a blank line, 4 spaces in
+    body text and 8 inside a list; spans are backtick code spans in the rest.
+    """
+
+    def __init__(self, markdown_text):
+        self.blocks = []
+        self.spans = []
+        lines = markdown_text.split('\n')
+        offsets = [0]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line) + 1)
+
+        text_start = None
+        fence = None
+        in_list = False
+        previous_blank = True
+        in_indented = False
+        for i, line in enumerate(lines):
+            blank = not line.strip()
+            if fence is not None:
+                if line.strip() == fence:
+                    self.blocks.append((offsets[fence_line], offsets[i + 1] - 1))
+                    fence = None
+                continue
+            match = _FENCE_RE.match(line)
+            if match and any(later.strip() == match.group(1) for later in lines[i + 1:]):
+                self._spans_in(markdown_text, text_start, offsets[i])
+                text_start = None
+                fence, fence_line = match.group(1), i
+                previous_blank = in_indented = False
+                continue
+
+            if not blank and (in_indented or previous_blank) and _indent(line) >= (8 if in_list else 4):
+                self._spans_in(markdown_text, text_start, offsets[i])
+                text_start = None
+                self.blocks.append((offsets[i], offsets[i + 1] - 1))
+                in_indented = True
+                previous_blank = False
+                continue
+
+            if not blank:
+                if _LIST_ITEM_RE.match(line):
+                    in_list = True
+                elif previous_blank and not line[:1].isspace():
+                    in_list = False
+                if text_start is None:
+                    text_start = offsets[i]
+                in_indented = False
+            previous_blank = blank
+        if fence is not None:
+            text_start = offsets[fence_line] if text_start is None else text_start
+        self._spans_in(markdown_text, text_start, len(markdown_text))
+
+        self._regions = sorted([(start, end, 'block') for start, end in self.blocks]
+                               + [(start, end, 'span') for start, end in self.spans])
+        self._starts = [start for start, _, _ in self._regions]
+
+    def _spans_in(self, markdown_text, start, end):
+        """Record the code spans of the text between two code blocks, paragraph by paragraph"""
+        if start is None:
+            return
+        for paragraph in re.finditer(r'(?:.+\n?)+', markdown_text[start:end]):
+            for match in _CODE_SPAN_RE.finditer(paragraph.group()):
+                self.spans.append((start + paragraph.start() + match.start(),
+                                   start + paragraph.start() + match.end()))
+
+    def kind(self, position):
+        """'block' or 'span' if position is inside code, otherwise None"""
+        index = bisect.bisect_right(self._starts, position) - 1
+        if index >= 0:
+            start, end, kind = self._regions[index]
+            if start <= position < end:
+                return kind
+        return None
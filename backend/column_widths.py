@@ -0,0 +1,102 @@
+"""
+Table column widths for Davinci Document Creator
+Sizes table columns from their content, estimated with cached glyph widths
+"""
+
+import html
+import re
+
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# Rows measured per table; longer tables are sampled evenly
+SAMPLE_ROWS = 100
+
+# No column is narrower than this, or wider than this share of the table
+# when columns compete for space
+MIN_COLUMN_WIDTH = 0.6 * inch
+MAX_COLUMN_SHARE = 0.6
+
+# ReportLab's default left + right cell padding
+CELL_PADDING = 12
+
+# Glyph widths are stored in units of this many thousandths of an em, one
+# byte per Latin-1 character, so the width of a string is the byte sum of
+# its translation through the table
+WIDTH_UNIT = 4
+
+_TAG_RE = re.compile(r'<[^>]*>')
+
+_width_tables = {}
+
+
+def width_table(font_name):
+    """256-byte glyph width table for font_name, built on first use"""
+    table = _width_tables.get(font_name)
+    if table is None:
+        table = bytes(
+            min(255, round(stringWidth(chr(code), font_name, 1000) / WIDTH_UNIT))
+            for code in range(256)
+        )
+        _width_tables[font_name] = table
+    return table
+
+
+def text_width(text, font_name, font_size):
+    """
+    Estimated width of text in points
+
+    Characters outside Latin-1 are measured as '?'.
+    """
+    encoded = text.encode('latin-1', 'replace').translate(width_table(font_name))
+    return sum(encoded) * WIDTH_UNIT * font_size / 1000
+
+
+def _plain_text(cell_text):
+    if '<' in cell_text or '&' in cell_text:
+        return html.unescape(_TAG_RE.sub('', cell_text))
+    return cell_text
+
+
+def column_widths(rows, style, avail_width):
+    """
+    Column widths for a table of cell text, summing to avail_width
+
+    Each column wants its widest cell on one line and needs its longest word.
+    When the wanted widths fit, they grow in proportion to fill the width;
+    otherwise every column gets what it needs and the space left is shared in
+    proportion to how much more each wants.
+    """
+    num_cols = len(rows[0])
+    if len(rows) > SAMPLE_ROWS:
+        step = len(rows) / SAMPLE_ROWS
+        rows = [rows[int(i * step)] for i in range(SAMPLE_ROWS)]
+
+    font_name, font_size = style.fontName, style.fontSize
+    wanted = [0] * num_cols
+    needed = [0] * num_cols
+    for row in rows:
+        for col, cell_text in enumerate(row[:num_cols]):
+            if not cell_text:
+                continue
+            text = _plain_text(cell_text)
+            wanted[col] = max(wanted[col], text_width(text, font_name, font_size))
+            longest_word = max(text.split(), key=len, default='')
+            needed[col] = max(needed[col], text_width(longest_word, font_name, font_size))
+
+    ceiling = max(MIN_COLUMN_WIDTH, avail_width * MAX_COLUMN_SHARE)
+    needed = [min(max(width + CELL_PADDING, MIN_COLUMN_WIDTH), ceiling) for width in needed]
+    wanted = [min(max(width + CELL_PADDING, low), ceiling) for width, low in zip(wanted, needed)]
+
+    total_wanted = sum(wanted)
+    if total_wanted <= avail_width:
+        return [width * avail_width / total_wanted for width in wanted]
+
+    total_needed = sum(needed)
+    if total_needed >= avail_width:
+        return [width * avail_width / total_needed for width in needed]
+
+    spare = avail_width - total_needed
+    flexible = [high - low for high, low in zip(wanted, needed)]
+    total_flexible = sum(flexible)
+    return [low + spare * flex / total_flexible for low, flex in zip(needed, flexible)]
@@ -0,0 +1,194 @@
+"""
+Command line conversion for Davinci Document Creator
+Converts markdown files, or whole directories of them, to PDFs without the web server
+
+    python -m convert docs/ -o pdfs/ --config letterhead.json --incremental
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pdf_cache import PDFCache
+from pdf_optimize import PROFILES
+from renderer import convert_config, create_pdf, default_logo
+
+# Processes converting files at once; 0 converts them in this process
+CONVERT_WORKERS = int(os.environ.get('CONVERT_WORKERS', os.cpu_count() or 1))
+
+# Files picked up from input directories
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+
+# Kept in the output directory: the render key each PDF was made from
+MANIFEST_NAME = '.convert-manifest.json'
+
+
+def load_config(path=None):
+    """
+    Render config and logo digest from a JSON config file, or the defaults
+
+    The file holds the fields of an /api/convert request body (company,
+    address, phone, email, disclaimer, includeTitlePage, optimize...) and
+    optionally logo, the path of a PNG or JPEG header logo relative to the
+    file.
+    """
+    data = {}
+    if path:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    config = convert_config(data)
+    if config['optimize'] is not None and config['optimize'] not in PROFILES:
+        raise ValueError(f"optimize must be one of: {', '.join(PROFILES)}")
+    if data.get('logo'):
+        config['logo_path'] = os.path.join(os.path.dirname(os.path.abspath(path)), data['logo'])
+        with open(config['logo_path'], 'rb') as f:
+            return config, hashlib.sha256(f.read()).hexdigest()
+    config['logo_path'], logo_digest = default_logo()
+    return config, logo_digest
+
+
+def find_documents(inputs, output_dir):
+    """
+    (source, target) paths for each markdown file in inputs
+
+    A file's PDF goes straight into output_dir; a directory's markdown files
+    are found recursively and keep their layout under output_dir.
+    """
+    documents = []
+    for path in inputs:
+        if os.path.isfile(path):
+            documents.append((path, os.path.basename(path)))
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(MARKDOWN_EXTENSIONS):
+                        source = os.path.join(root, name)
+                        documents.append((source, os.path.relpath(source, path)))
+        else:
+            raise ValueError(f"No such file or directory: {path}")
+    return [(source, os.path.join(output_dir, os.path.splitext(relative)[0] + '.pdf'))
+            for source, relative in documents]
+
+
+def convert(markdown_text, target, config):
+    """Render markdown_text to the file target and return its size; a failed render leaves no file"""
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    partial = target + '.partial'
+    try:
+        with open(partial, 'wb') as f:
+            create_pdf(markdown_text, config, output=f)
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return os.path.getsize(target)
+
+
+def convert_all(documents, config, workers=CONVERT_WORKERS):
+    """
+    Yield (index, size_bytes, error) for each (markdown_text, target) document as it finishes
+
+    Documents are converted in up to workers processes; an exception raised
+    by a render is reported as its error.
+    """
+    if workers <= 0 or len(documents) < 2:
+        for index, (markdown_text, target) in enumerate(documents):
+            try:
+                yield index, convert(markdown_text, target, config), None
+            except Exception as e:
+                yield index, None, str(e) or type(e).__name__
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(documents))) as executor:
+        futures = {executor.submit(convert, markdown_text, target, config): index
+                   for index, (markdown_text, target) in enumerate(documents)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, str(e) or type(e).__name__
+
+
+def load_manifest(path):
+    """Render keys by PDF path from an earlier run, or {} if there was none"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    partial = path + '.partial'
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(partial, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m convert', description='Convert markdown files to branded PDFs.')
+    parser.add_argument('inputs', nargs='+', metavar='PATH',
+                        help='markdown files, or directories to convert every .md file under')
+    parser.add_argument('-o', '--output', default='.',
+                        help='directory for the PDFs, default the current directory')
+    parser.add_argument('-c', '--config',
+                        help='JSON file with the letterhead, disclaimer, logo and page options')
+    parser.add_argument('-j', '--workers', type=int, default=CONVERT_WORKERS,
+                        help=f'processes converting at once, 0 for none (default {CONVERT_WORKERS})')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip PDFs whose markdown and config have not changed since the last run')
+    args = parser.parse_args(argv)
+
+    try:
+        config, logo_digest = load_config(args.config)
+        documents = find_documents(args.inputs, args.output)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    # The key covers the markdown, the config and the logo bytes, as for the PDF cache
+    manifest_path = os.path.join(args.output, MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+    manifest = dict(previous)
+    pending, rendered = [], []
+    converted = unchanged = failed = 0
+    for source, target in documents:
+        name = os.path.relpath(target, args.output)
+        try:
+            with open(source, encoding='utf-8') as f:
+                markdown_text = f.read()
+        except (OSError, ValueError) as e:
+            print(f"failed     {source}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        key = PDFCache.make_key(markdown_text, config, logo_digest)
+        if args.incremental and previous.get(name) == key and os.path.exists(target):
+            print(f"unchanged  {source}")
+            unchanged += 1
+            continue
+        manifest.pop(name, None)
+        pending.append((markdown_text, target))
+        rendered.append((source, name, key))
+
+    for index, size, error in convert_all(pending, config, args.workers):
+        source, name, key = rendered[index]
+        if error is not None:
+            print(f"failed     {source}: {error}", file=sys.stderr)
+            failed += 1
+            continue
+        manifest[name] = key
+        converted += 1
+        print(f"converted  {source} -> {pending[index][1]} ({size / 1024:.0f} KB)")
+
+    os.makedirs(args.output, exist_ok=True)
+    save_manifest(manifest_path, manifest)
+    print(f"{converted} converted, {unchanged} unchanged, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,7 +7,7 @@ import sys
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_pdf
+from renderer import create_pdf
 from tests.fixtures import FIXTURES, DEFAULT_CONFIG
 from tests.pdf_compare import PDFRegressionTester
 
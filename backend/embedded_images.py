@@ -0,0 +1,178 @@
+"""
+Embedded image pipeline for Davinci Document Creator
+Decodes each distinct markdown image once per document and embeds it at the
+resolution it is printed at
+"""
+
+import base64
+import hashlib
+import io
+import math
+import os
+import re
+
+from PIL import Image as PILImage
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image as RLImage
+
+from code_regions import CodeRegions
+
+# Print resolution images are downsampled to; 0 keeps the source pixels
+IMAGE_DPI = int(os.environ.get('IMAGE_DPI', 200))
+
+# Images drawn without an explicit width
+DEFAULT_IMAGE_WIDTH = 4 * inch
+
+# Opaque images with more distinct colors than this are treated as photos
+# and stored as JPEG; screenshots, diagrams and logos stay lossless
+PHOTO_MIN_COLORS = 32768
+JPEG_QUALITY = 85
+
+# Data URIs in image syntax are lifted out of the markdown before parsing and
+# replaced with a reference to their payload's hash. Short payloads are left
+# in place, as they cost the parsers nothing, and so are data URIs in code,
+# which must render as written.
+REFERENCE_PREFIX = 'embedded-image:'
+EXTRACT_MIN_CHARS = 1024
+_DATA_URI_RE = re.compile(
+    r'(!\[[^\]\n]*\]\([ \t]*<?|<img\b[^>]*?\bsrc=["\'])'
+    r'data:image/[\w.+-]+;base64,([A-Za-z0-9+/=]{%d,})' % EXTRACT_MIN_CHARS
+)
+
+
+class EmbeddedImage(RLImage):
+    """Image flowable drawing a reader shared by every use of the same picture"""
+
+    def __init__(self, variant, width, height):
+        # Set before Image.__init__, which would otherwise open its own reader
+        self._img = variant.reader
+        RLImage.__init__(self, io.BytesIO(variant.data), width=width, height=height)
+
+
+class ImageVariant:
+    """One encoding of a source image at a given pixel size"""
+
+    def __init__(self, data, size):
+        self.data = data
+        self.size = size
+        # Shared so the pixels are decoded once, and the canvas files every
+        # use under one XObject
+        self.reader = ImageReader(io.BytesIO(data))
+
+
+class SourceImage:
+    """A distinct image of a document, as uploaded"""
+
+    def __init__(self, data):
+        self.data = data
+        self.image = PILImage.open(io.BytesIO(data))
+        self.format = self.image.format
+        self.size = self.image.size
+        self._variants = {}
+
+    def _has_alpha(self):
+        return self.image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in self.image.info
+
+    def variant(self, pixel_size):
+        """The image scaled down to fit pixel_size, encoded once per size"""
+        if pixel_size is not None:
+            # Never upscale
+            pixel_size = (min(self.size[0], pixel_size[0]), min(self.size[1], pixel_size[1]))
+            if pixel_size == self.size:
+                pixel_size = None
+        variant = self._variants.get(pixel_size)
+        if variant is None:
+            variant = self._variants[pixel_size] = self._encode(pixel_size)
+        return variant
+
+    def _encode(self, pixel_size):
+        if pixel_size is None:
+            return ImageVariant(self.data, self.size)
+
+        has_alpha = self._has_alpha()
+        img = self.image.convert('RGBA' if has_alpha else 'RGB')
+        img = img.resize(pixel_size, PILImage.LANCZOS)
+
+        output = io.BytesIO()
+        # ReportLab embeds JPEG as is (DCT); anything else is Flate compressed
+        if not has_alpha and (self.format == 'JPEG' or img.getcolors(PHOTO_MIN_COLORS) is None):
+            img.save(output, 'JPEG', quality=JPEG_QUALITY)
+        else:
+            img.save(output, 'PNG')
+        return ImageVariant(output.getvalue(), img.size)
+
+
+class DocumentImages:
+    """
+    The images of one document, keyed by content hash
+
+    A picture that appears several times is decoded, downsampled and
+    embedded once.
+    """
+
+    def __init__(self, dpi=None):
+        self.dpi = IMAGE_DPI if dpi is None else dpi
+        self._sources = {}
+        self._payloads = {}
+
+    def _source(self, key, load):
+        source = self._sources.get(key)
+        if source is None:
+            source = self._sources[key] = SourceImage(load())
+        return source
+
+    def extract(self, markdown_text):
+        """
+        Markdown with large data URIs replaced by short references
+
+        The payloads are kept here and only decoded when their image flowable
+        is built. References name the payload's hash, so unchanged images
+        keep their reference when the text around them is edited.
+        """
+        code = []
+
+        def lift(match):
+            # Only documents with a large data URI pay for finding their code
+            if not code:
+                code.append(CodeRegions(markdown_text))
+            if code[0].kind(match.start()) is not None:
+                return match.group(0)
+            payload = match.group(2)
+            key = hashlib.sha256(payload.encode('ascii')).hexdigest()
+            self._payloads[key] = payload
+            return match.group(1) + REFERENCE_PREFIX + key
+        return _DATA_URI_RE.sub(lift, markdown_text)
+
+    def from_data_uri(self, src):
+        payload = src.split(',', 1)[1]
+        key = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return self._source(key, lambda: base64.b64decode(payload))
+
+    def from_reference(self, src):
+        """Source for a reference left by extract(); KeyError if it is not one of ours"""
+        key = src[len(REFERENCE_PREFIX):]
+        payload = self._payloads[key]
+        return self._source(key, lambda: base64.b64decode(payload))
+
+    def from_path(self, path):
+        def load():
+            with open(path, 'rb') as f:
+                return f.read()
+        return self._source(('path', path), load)
+
+    def flowable(self, source, width=None, height=None):
+        """
+        Flowable for source drawn at width x height points
+
+        The width defaults to 4 inches and the height follows the image's
+        aspect ratio.
+        """
+        width = width or DEFAULT_IMAGE_WIDTH
+        if not height:
+            height = width * source.size[1] / source.size[0]
+
+        pixel_size = None
+        if self.dpi:
+            pixel_size = (math.ceil(width / 72 * self.dpi), math.ceil(height / 72 * self.dpi))
+        return EmbeddedImage(source.variant(pixel_size), width, height)
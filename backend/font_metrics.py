@@ -0,0 +1,62 @@
+"""
+Font metrics for Davinci Document Creator
+Memoized string widths for the registered TrueType fonts
+"""
+
+import functools
+import os
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+# Distinct (string, size) widths remembered per font
+WIDTH_CACHE_SIZE = int(os.environ.get('WIDTH_CACHE_SIZE', 65536))
+
+# Glyph widths below this code point are looked up in a list rather than
+# the face's dict
+GLYPH_ARRAY_SIZE = 0x3000
+
+
+class MemoizedTTFont(TTFont):
+    """
+    TTFont with a glyph width array and a bounded cache of string widths
+
+    Paragraph wrapping measures every word and line through
+    font.stringWidth, and the same words come up over and over, across
+    paragraphs and documents. Widths are summed in font units and scaled
+    once, exactly as TTFont does, so line breaks do not change.
+    """
+
+    def __init__(self, name, filename, cache_size=WIDTH_CACHE_SIZE, **kwargs):
+        TTFont.__init__(self, name, filename, **kwargs)
+        char_widths = self.face.charWidths
+        default_width = self.face.defaultWidth
+        self._glyph_widths = [char_widths.get(code, default_width) for code in range(GLYPH_ARRAY_SIZE)]
+        self._width = functools.lru_cache(maxsize=cache_size)(self._measure)
+
+    def _measure(self, text, size):
+        glyph_widths = self._glyph_widths
+        char_width = self.face.charWidths.get
+        default_width = self.face.defaultWidth
+        return 0.001 * size * sum(
+            glyph_widths[code] if code < GLYPH_ARRAY_SIZE else char_width(code, default_width)
+            for code in map(ord, text)
+        )
+
+    def stringWidth(self, text, size, encoding='utf8'):
+        if not isinstance(text, str):
+            text = text.decode(encoding or 'utf8')
+        return self._width(text, size)
+
+    def cache_stats(self):
+        info = self._width.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'entries': info.currsize}
+
+
+def stats():
+    """Width cache counters of every registered MemoizedTTFont"""
+    return {
+        name: font.cache_stats()
+        for name, font in list(pdfmetrics._fonts.items())
+        if isinstance(font, MemoizedTTFont)
+    }
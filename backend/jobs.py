@@ -0,0 +1,401 @@
+"""
+Render jobs for Davinci Document Creator
+Queues conversions in SQLite so long documents render in the background
+"""
+
+import ipaddress
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+
+from pdf_spool import SpooledPDF
+from render_pool import RenderPoolFull
+
+logger = logging.getLogger(__name__)
+
+# Job database and finished PDFs; shared by every server process on the host
+JOBS_DIR = os.environ.get('JOBS_DIR', os.path.join(tempfile.gettempdir(), 'davinci-jobs'))
+
+# Seconds a finished job and its PDF are kept
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))
+
+# Threads per server process taking jobs off the queue
+JOB_RUNNERS = int(os.environ.get('JOB_RUNNERS', 1))
+
+# Comma-separated hosts completion callbacks may be sent to; empty allows any
+# host that resolves only to public addresses
+JOB_CALLBACK_HOSTS = [host for host in os.environ.get('JOB_CALLBACK_HOSTS', '').split(',') if host]
+
+# Times a job is started before it is failed, e.g. if its server keeps dying
+JOB_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    download_name TEXT NOT NULL,
+    callback_url TEXT,
+    result_url TEXT,
+    error TEXT,
+    size_bytes INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat() if seconds else None
+
+
+def check_callback_url(url):
+    """
+    Raise ValueError unless url is an http(s) URL on an allowed host
+
+    Without JOB_CALLBACK_HOSTS the host must resolve, and only to public
+    addresses, so callbacks cannot reach loopback, private or link-local
+    services such as the cloud metadata endpoint. Returns the address the
+    callback must then be sent to, as the host may resolve elsewhere by
+    the time it connects, or None for a host on the allowlist.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError("callbackUrl must be an http or https URL")
+    if JOB_CALLBACK_HOSTS:
+        if parsed.hostname not in JOB_CALLBACK_HOSTS:
+            raise ValueError(f"callbackUrl host {parsed.hostname} is not allowed")
+        return None
+    try:
+        addresses = sorted({info[4][0] for info in socket.getaddrinfo(parsed.hostname, None)})
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise ValueError(f"callbackUrl host {parsed.hostname} does not resolve")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            raise ValueError(f"callbackUrl host {parsed.hostname} is not a public address")
+    return addresses[0]
+
+
+class _PinnedPoolManager(PoolManager):
+    """Connects to address whatever the host, keeping the host for TLS"""
+
+    def __init__(self, address, **kwargs):
+        PoolManager.__init__(self, **kwargs)
+        self.address = address
+
+    def connection_from_host(self, host, port=None, scheme='http', pool_kwargs=None):
+        pool_kwargs = dict(pool_kwargs or {})
+        if scheme == 'https':
+            # SNI and certificate checks are for the host, not the address
+            pool_kwargs.update(server_hostname=host, assert_hostname=host)
+        return PoolManager.connection_from_host(self, self.address, port, scheme, pool_kwargs)
+
+
+class _PinnedAdapter(HTTPAdapter):
+    """Transport adapter sending every request to one checked address"""
+
+    def __init__(self, address):
+        # Set first, as HTTPAdapter.__init__ makes the pool manager
+        self.address = address
+        HTTPAdapter.__init__(self)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self.poolmanager = _PinnedPoolManager(self.address, num_pools=connections, maxsize=maxsize,
+                                              block=block, **pool_kwargs)
+
+
+def post_callback(url, address, description):
+    """POST description to url, connecting to address if it is not None"""
+    with requests.Session() as session:
+        headers = {}
+        if address is not None:
+            # No proxies from the environment: a proxy would resolve the host again
+            session.trust_env = False
+            session.mount('http://', _PinnedAdapter(address))
+            session.mount('https://', _PinnedAdapter(address))
+            headers['Host'] = urlparse(url).netloc.rpartition('@')[2]
+        return session.post(url, json=description, headers=headers, timeout=10, allow_redirects=False)
+
+
+class JobStore:
+    """
+    Render jobs and their PDFs on local disk
+
+    Jobs live in a SQLite database and finished PDFs in files beside it, so
+    queued jobs survive a restart and any server process can run them.
+    A job left running by a process that died is started again once it has
+    not been updated for stale_after seconds.
+    """
+
+    def __init__(self, directory=JOBS_DIR, ttl=JOB_RESULT_TTL, stale_after=300):
+        self.directory = directory
+        self.ttl = ttl
+        self.stale_after = stale_after
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'jobs.sqlite3')
+        with closing(self._connect()) as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        # A connection per call, so threads and forked workers never share one
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _result_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.pdf')
+
+    def submit(self, payload, download_name, callback_url=None, result_url=None):
+        """Queue a job for payload and return its id; '{id}' in result_url is replaced by the id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                'INSERT INTO jobs (id, status, payload, download_name, callback_url, result_url, created_at, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', json.dumps(payload), download_name, callback_url,
+                 result_url and result_url.replace('{id}', job_id), now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        """The job as a dict, or None if it is unknown or has expired"""
+        with closing(self._connect()) as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or (row['expires_at'] and row['expires_at'] < time.time()):
+            return None
+        return dict(row)
+
+    def describe(self, job):
+        """The job's public fields, as returned by GET /api/jobs/<id>"""
+        description = {
+            'id': job['id'],
+            'status': job['status'],
+            'progress': round(job['progress'], 3),
+            'created_at': _timestamp(job['created_at']),
+            'updated_at': _timestamp(job['updated_at']),
+        }
+        if job['status'] == 'done':
+            description.update(
+                result_url=job['result_url'], size_bytes=job['size_bytes'],
+                expires_at=_timestamp(job['expires_at'])
+            )
+        elif job['status'] == 'failed':
+            description.update(error=job['error'], expires_at=_timestamp(job['expires_at']))
+        return description
+
+    def result_path(self, job):
+        return self._result_path(job['id'])
+
+    def claim(self):
+        """Mark the oldest queued (or stale) job running and return it, or None"""
+        now = time.time()
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?"
+                " WHERE id = (SELECT id FROM jobs"
+                "  WHERE (status = 'queued' OR (status = 'running' AND updated_at < ?)) AND attempts < ?"
+                "  ORDER BY created_at LIMIT 1)"
+                " RETURNING *",
+                (now, now - self.stale_after, JOB_MAX_ATTEMPTS)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def progress(self, job_id, fraction):
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+                (fraction, time.time(), job_id)
+            )
+
+    def requeue(self, job_id):
+        """Put a claimed job back, without counting the attempt"""
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, progress = 0, updated_at = ?"
+                " WHERE id = ?",
+                (time.time(), job_id)
+            )
+
+    def complete(self, job_id, pdf):
+        """Store the job's PDF, given as bytes or as a SpooledPDF whose temp file is moved in"""
+        if not isinstance(pdf, SpooledPDF):
+            pdf = SpooledPDF(pdf, None, len(pdf), None)
+        path = self._result_path(job_id)
+        # Written under a temporary name so a reader never sees a partial PDF
+        if pdf.path is None:
+            with open(path + '.part', 'wb') as f:
+                f.write(pdf.data)
+        else:
+            shutil.move(pdf.path, path + '.part')
+        os.replace(path + '.part', path)
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET status = 'done', progress = 1, size_bytes = ?, error = NULL,"
+                " updated_at = ?, expires_at = ? WHERE id = ?",
+                (pdf.size, now, now + self.ttl, job_id)
+            )
+
+    def fail(self, job_id, error):
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, expires_at = ? WHERE id = ?",
+                (error, now, now + self.ttl, job_id)
+            )
+
+    def expire(self):
+        """Delete expired jobs and their PDFs; fail jobs that ran out of attempts"""
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Render was interrupted too many times',"
+                " updated_at = ?, expires_at = ? WHERE status = 'running' AND updated_at < ? AND attempts >= ?",
+                (now, now + self.ttl, now - self.stale_after, JOB_MAX_ATTEMPTS)
+            )
+            expired = [row['id'] for row in db.execute('SELECT id FROM jobs WHERE expires_at < ?', (now,))]
+            db.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in expired])
+        for job_id in expired:
+            try:
+                os.remove(self._result_path(job_id))
+            except FileNotFoundError:
+                pass
+        return len(expired)
+
+    def stats(self):
+        """Number of jobs in each status"""
+        with closing(self._connect()) as db:
+            counts = dict(db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return {status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')}
+
+
+class Progress:
+    """
+    Records a running job's progress, at most every few percent
+
+    Picklable, so it can be passed to a render_pool worker with the render.
+    """
+
+    def __init__(self, store, job_id, step=0.05):
+        self.store = store
+        self.job_id = job_id
+        self.step = step
+        self.reported = 0.0
+
+    def __call__(self, fraction):
+        if fraction >= self.reported + self.step:
+            self.reported = fraction
+            self.store.progress(self.job_id, fraction)
+
+
+class JobRunner:
+    """
+    Threads that take jobs off a JobStore and render them
+
+    render(job, progress) returns the PDF bytes or a SpooledPDF; any
+    exception fails the job with its message, except RenderPoolFull, which
+    puts the job back for later. A job's callback_url is sent its description once it finishes.
+    """
+
+    def __init__(self, store, render, threads=JOB_RUNNERS, poll_interval=2.0, expire_interval=60.0):
+        self.store = store
+        self.render = render
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.expire_interval = expire_interval
+        self._wake = threading.Event()
+        self._stopped = False
+        self._last_expired = 0.0
+
+    def start(self):
+        for index in range(self.threads):
+            threading.Thread(target=self._loop, name=f'job-runner-{index}', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def wake(self):
+        """Look for new jobs now rather than at the next poll"""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stopped:
+            try:
+                if time.monotonic() - self._last_expired > self.expire_interval:
+                    self._last_expired = time.monotonic()
+                    self.store.expire()
+                job = self.store.claim()
+            except sqlite3.Error as e:
+                logger.error('Job queue unavailable: %s', e)
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self.run(job)
+
+    def run(self, job):
+        job_id = job['id']
+        try:
+            pdf = self.render(job, Progress(self.store, job_id))
+        except RenderPoolFull as e:
+            self.store.requeue(job_id)
+            time.sleep(e.retry_after)
+            return
+        except Exception as e:
+            logger.warning('Job %s failed: %s', job_id, e)
+            self.store.fail(job_id, str(e) or type(e).__name__)
+        else:
+            size = pdf.size if isinstance(pdf, SpooledPDF) else len(pdf)
+            logger.info('Job %s done: size_bytes=%d', job_id, size)
+            self.store.complete(job_id, pdf)
+        if job['callback_url']:
+            threading.Thread(target=self.notify, args=(job['callback_url'], job_id), daemon=True).start()
+
+    def notify(self, url, job_id, attempts=3):
+        """POST the finished job's description to its callback URL, retrying with backoff"""
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        for attempt in range(attempts):
+            try:
+                # Checked again on each send, and sent to the address checked
+                address = check_callback_url(url)
+                response = post_callback(url, address, self.store.describe(job))
+                if response.status_code < 500:
+                    return
+                error = f'HTTP {response.status_code}'
+            except ValueError as e:
+                error = str(e)
+                break
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt + 1 < attempts:
+                time.sleep(2 ** attempt)
+        logger.warning('Job %s callback to %s failed: %s', job_id, url, error)
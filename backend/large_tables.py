@@ -0,0 +1,131 @@
+"""
+Large table layout for Davinci Document Creator
+Lays out tables of thousands of rows a page at a time
+"""
+
+import os
+
+from reportlab.platypus import Flowable, LongTable, Paragraph
+
+# Tables with more rows than this, header included, are laid out as a
+# LargeTable
+LARGE_TABLE_ROWS = int(os.environ.get('LARGE_TABLE_ROWS', 200))
+
+
+def cell_factory(style):
+    """
+    Cell flowable builder for a table cell style
+
+    Plain text cells get a paragraph with a ready-made text fragment instead
+    of going through Paragraph's markup parser. It wraps and draws exactly
+    like the parsed paragraph, at a fraction of the cost.
+    """
+    template = Paragraph('x', style).frags[0]
+
+    def make_cell(text):
+        if not text or '<' in text or '&' in text:
+            return Paragraph(text, style)
+        return Paragraph(text, style, frags=[template.clone(text=text, link=[], us_lines=[])])
+    return make_cell
+
+
+class LargeTable(Flowable):
+    """
+    A table laid out one page at a time
+
+    ReportLab splits a Table at a page break by building a new Table from all
+    of the remaining rows and measuring them again, so a long table costs
+    time quadratic in its rows. Instead, rows are measured once, as they are
+    reached, and each page gets a LongTable of the header and the rows that
+    fit, with their heights given. The rest is handed on to the next
+    LargeTable, and cell flowables are released once their page is drawn.
+    """
+
+    def __init__(self, header, rows, col_widths, table_style, make_cell,
+                 start=0, measured=None, padding=None):
+        Flowable.__init__(self)
+        self.header = header
+        # Row text, shared with the LargeTables that continue this one
+        self.rows = rows
+        self.col_widths = col_widths
+        self.table_style = table_style
+        self.make_cell = make_cell
+        self.start = start
+        # (cells, height) of the rows from start on that were measured already
+        self.measured = measured if measured is not None else []
+        # Horizontal and vertical cell padding, as table_style resolves it
+        self.padding = padding if padding is not None else self._cell_padding()
+        # Tables are centered in the frame
+        self.hAlign = 'CENTER'
+        self._header = None
+
+    def _cell_padding(self):
+        probe = LongTable([self.header], colWidths=self.col_widths)
+        probe.setStyle(self.table_style)
+        style = probe._cellStyles[0][0]
+        return (style.leftPadding + style.rightPadding, style.topPadding + style.bottomPadding)
+
+    def _row(self, texts):
+        """Cells for a row of text, and the row height the table will give them"""
+        cells = [self.make_cell(text) for text in texts]
+        horizontal, vertical = self.padding
+        height = max(
+            cell.wrap(width - horizontal, 72000)[1]
+            for cell, width in zip(cells, self.col_widths)
+        )
+        return cells, height + vertical
+
+    def _fit(self, avail_height):
+        """Rows from start that fit under the header in avail_height, and their height"""
+        if self._header is None:
+            self._header = self._row(self.header)
+        height = self._header[1]
+        count = 0
+        while self.start + count < len(self.rows):
+            if count == len(self.measured):
+                self.measured.append(self._row(self.rows[self.start + count]))
+            row_height = self.measured[count][1]
+            if height + row_height > avail_height:
+                break
+            height += row_height
+            count += 1
+        return count, height
+
+    def _page_table(self, count):
+        rows = [self._header] + self.measured[:count]
+        table = LongTable(
+            [cells for cells, _ in rows],
+            colWidths=self.col_widths,
+            rowHeights=[height for _, height in rows],
+            repeatRows=1,
+        )
+        table.setStyle(self.table_style)
+        return table
+
+    def wrap(self, avail_width, avail_height):
+        count, height = self._fit(avail_height)
+        self.width = sum(self.col_widths)
+        self.height = height
+        if self.start + count < len(self.rows):
+            # Overflow, so the frame splits the table here
+            self.height += self.measured[count][1]
+        return self.width, self.height
+
+    def split(self, avail_width, avail_height):
+        count, _ = self._fit(avail_height)
+        if count == 0:
+            return []
+        if self.start + count == len(self.rows):
+            return [self]
+        rest = LargeTable(
+            self.header, self.rows, self.col_widths, self.table_style, self.make_cell,
+            start=self.start + count, measured=self.measured[count:], padding=self.padding
+        )
+        return [self._page_table(count), rest]
+
+    def draw(self):
+        table = self._page_table(len(self.measured))
+        table.wrapOn(self.canv, self.width, self.height)
+        table.drawOn(self.canv, 0, 0)
+        self.measured = []
+        self._header = None
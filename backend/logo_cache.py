@@ -0,0 +1,138 @@
+"""
+Uploaded logo cache for Davinci Document Creator
+Normalizes uploaded logos in memory to the header's print size and shares
+them across requests
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from PIL import Image as PILImage, ImageOps
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+
+MAX_LOGO_BYTES = 5 * 1024 * 1024
+
+# The header logo box (size S from the branding guidelines) and the
+# resolution it is printed at
+LOGO_BOX = (3.5 * cm, 1.05 * cm)
+LOGO_DPI = 300
+
+
+class InvalidLogo(ValueError):
+    """Raised for uploads that are not a usable image"""
+
+
+class NormalizedLogo:
+    """An uploaded logo scaled to the header box, ready to embed"""
+
+    def __init__(self, data, digest, size):
+        self.data = data
+        # Hash of the bytes as uploaded, used in PDF cache keys
+        self.digest = digest
+        self.size = size
+
+    def reader(self):
+        """A fresh ImageReader; readers hold file positions, so each document gets its own"""
+        return ImageReader(io.BytesIO(self.data))
+
+
+def normalize_logo(data, box=LOGO_BOX, dpi=LOGO_DPI):
+    """
+    Decode an image and shrink it to fit box (in points) at dpi
+
+    Honors EXIF orientation, which phone photos rely on. Images without
+    transparency that arrived as JPEG are re-encoded as JPEG, which ReportLab
+    embeds without decoding; everything else becomes PNG. Returns
+    (image_bytes, (width, height)).
+    """
+    try:
+        img = PILImage.open(io.BytesIO(data))
+        source_format = img.format
+        img.load()
+        img = ImageOps.exif_transpose(img)
+    except Exception as e:
+        raise InvalidLogo(f"Uploaded logo is not a valid image: {e}")
+
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+    img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    max_width = round(box[0] / 72 * dpi)
+    max_height = round(box[1] / 72 * dpi)
+    scale = min(max_width / img.width, max_height / img.height)
+    if scale < 1:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, PILImage.LANCZOS)
+
+    output = io.BytesIO()
+    if source_format == 'JPEG' and not has_alpha:
+        img.save(output, 'JPEG', quality=90)
+    else:
+        img.save(output, 'PNG', optimize=True)
+    return output.getvalue(), img.size
+
+
+def decode_logo(logo_b64):
+    """Base64 upload to a NormalizedLogo; raises InvalidLogo"""
+    try:
+        data = base64.b64decode(logo_b64)
+    except (binascii.Error, TypeError, ValueError):
+        raise InvalidLogo("Invalid base64 for logo")
+
+    if len(data) > MAX_LOGO_BYTES:
+        raise InvalidLogo("Logo image exceeds 5MB limit")
+
+    normalized, size = normalize_logo(data)
+    return NormalizedLogo(normalized, hashlib.sha256(data).hexdigest(), size)
+
+
+class LogoCache:
+    """LRU of normalized uploads keyed by a hash of their base64 text"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, logo_b64):
+        """Normalized logo for a base64 upload, decoding it on first sight"""
+        try:
+            if isinstance(logo_b64, str):
+                logo_b64 = logo_b64.encode('ascii')
+        except UnicodeEncodeError:
+            raise InvalidLogo("Invalid base64 for logo")
+        if not isinstance(logo_b64, bytes):
+            raise InvalidLogo("Invalid base64 for logo")
+        key = hashlib.sha256(logo_b64).hexdigest()
+
+        with self._lock:
+            logo = self._entries.get(key)
+            if logo is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return logo
+            self.misses += 1
+
+        logo = decode_logo(logo_b64)
+
+        with self._lock:
+            self._entries[key] = logo
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return logo
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'size_bytes': sum(len(logo.data) for logo in self._entries.values()),
+            }
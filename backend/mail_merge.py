@@ -0,0 +1,132 @@
+"""
+Mail merge for Davinci Document Creator
+Fills a markdown template's {{placeholders}} from records of values
+"""
+
+import html
+import math
+import os
+import re
+
+from batch import render_all
+from block_cache import BlockCache
+from code_regions import CodeRegions
+from renderer import create_pdf
+
+# Most records accepted in one /api/convert/merge request
+MERGE_MAX_RECORDS = int(os.environ.get('MERGE_MAX_RECORDS', 500))
+
+# Records rendered per render_pool job; they share one block cache, and
+# finished chunks are streamed while later ones render
+MERGE_CHUNK_RECORDS = 16
+
+# {{name}} inserts the value as plain text, {{{name}}} as markdown
+PLACEHOLDER_RE = re.compile(r'\{\{\{\s*([\w.-]+)\s*\}\}\}|\{\{\s*([\w.-]+)\s*\}\}')
+
+_MARKDOWN_SPECIAL_RE = re.compile(r'([\\`*_{}\[\]()#+\-.!])')
+
+
+def escape_markdown(value, table=False):
+    """
+    value as markdown that renders as exactly that text, on one line
+
+    Entities in paragraph text are decoded three times on the way to the
+    PDF (markdown, the HTML or inline parser, then ReportLab's paragraph
+    markup), and twice in table cells, so &, < and > are escaped as often.
+    """
+    value = _MARKDOWN_SPECIAL_RE.sub(r'\\\1', ' '.join(str(value).split()))
+    for _ in range(2 if table else 3):
+        value = html.escape(value, quote=False)
+    # No backslash escapes for these outside code, so entities it is
+    return value.replace('~', '&#126;').replace('|', '&#124;')
+
+
+def escape_code_span(value):
+    """
+    value as the text of a code span, on one line
+
+    Markdown leaves code as written, but entities in a code span are still
+    decoded twice on the way to the PDF.
+    """
+    value = ' '.join(str(value).split())
+    for _ in range(2):
+        value = html.escape(value, quote=False)
+    return value
+
+
+class MergeTemplate:
+    """A markdown template and the placeholders it uses"""
+
+    def __init__(self, markdown_text):
+        self.markdown_text = markdown_text
+        self.fields = sorted({match.group(1) or match.group(2) for match in PLACEHOLDER_RE.finditer(markdown_text)})
+        self.code = CodeRegions(markdown_text)
+
+    def fill(self, record, escape=True):
+        """
+        The template with each placeholder replaced by the record's value
+
+        Raises ValueError naming any placeholders the record has no value for.
+        A value of None fills in as empty text. Values in code blocks go in as
+        they are, since code is printed as written.
+        """
+        missing = [field for field in self.fields if field not in record]
+        if missing:
+            raise ValueError(f"Missing values for: {', '.join(missing)}")
+
+        text = self.markdown_text
+
+        def substitute(match):
+            value = record[match.group(1) or match.group(2)]
+            value = '' if value is None else str(value)
+            if match.group(1) or not escape:
+                return value
+            code = self.code.kind(match.start())
+            if code == 'block':
+                return value
+            if code == 'span':
+                return escape_code_span(value)
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            return escape_markdown(value, table=text[line_start:match.start()].lstrip().startswith('|'))
+        return PLACEHOLDER_RE.sub(substitute, text)
+
+
+def render_merge(template_text, records, config, logo=None):
+    """
+    A (pdf_bytes, error) pair for each record filled into template_text
+
+    Runs in a render_pool worker. The records share one block cache, so
+    blocks without placeholders are compiled once and only the blocks with
+    substituted values are compiled per record.
+    """
+    template = MergeTemplate(template_text)
+    block_cache = BlockCache()
+    results = []
+    for record in records:
+        try:
+            document_config = config if logo is None else dict(config, logo_image=logo.reader())
+            with block_cache.lock:
+                pdf_buffer = create_pdf(template.fill(record), document_config, block_cache=block_cache)
+            results.append((pdf_buffer.getvalue(), None))
+        except Exception as e:
+            results.append((None, str(e) or type(e).__name__))
+    return results
+
+
+def render_records(records, render_chunk, workers, chunk_size=MERGE_CHUNK_RECORDS):
+    """
+    Yield (index, pdf_bytes, error) for each record, a chunk at a time as chunks finish
+
+    Records are split into chunks of at most chunk_size, and at least one
+    per worker; render_chunk(records) returns a (pdf_bytes, error) pair per
+    record, and an exception it raises fails the whole chunk.
+    """
+    size = max(1, min(chunk_size, math.ceil(len(records) / max(1, workers))))
+    starts = range(0, len(records), size)
+    chunks = [records[start:start + size] for start in starts]
+    for chunk_index, results, error in render_all(chunks, render_chunk, workers):
+        start = starts[chunk_index]
+        if results is None:
+            results = [(None, error)] * len(chunks[chunk_index])
+        for offset, (pdf_bytes, record_error) in enumerate(results):
+            yield start + offset, pdf_bytes, record_error
@@ -0,0 +1,892 @@
+"""
+Markdown to ReportLab compiler for Davinci Document Creator
+Builds flowables straight from a parsed block tree instead of rendering HTML
+with markdown2 and parsing it back with HTMLParser
+"""
+
+import html
+import os
+import re
+import threading
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Spacer, Image as RLImage, Table, TableStyle, HRFlowable, Preformatted
+
+from column_widths import column_widths
+from embedded_images import REFERENCE_PREFIX, DocumentImages
+from large_tables import LARGE_TABLE_ROWS, LargeTable, cell_factory
+from themes import bullet_style, table_cell_style
+
+
+class UnsupportedMarkdown(Exception):
+    """Raised when a parser backend cannot reproduce the HTML path exactly"""
+
+
+def preprocess_markdown(markdown_text):
+    """Normalize tables and separator lines before parsing"""
+    lines = markdown_text.split('\n')
+    processed_lines = []
+    in_table = False
+
+    for line in lines:
+        stripped = line.strip()
+        is_table_line = stripped.startswith('|') and '|' in stripped[1:]
+        is_table_separator = is_table_line and '-' in stripped
+
+        if is_table_line:
+            if not in_table and len(processed_lines) > 0:
+                if processed_lines[-1].strip():
+                    processed_lines.append('')
+            in_table = True
+        elif in_table and not is_table_line:
+            in_table = False
+
+        if (len(stripped) >= 3 and all(c in '=-_■' for c in stripped) and not is_table_separator):
+            processed_lines.append('---')
+        else:
+            processed_lines.append(line)
+
+    return '\n'.join(processed_lines)
+
+
+# Flowable builders shared by the HTML parser and the compiler
+
+def paragraph_flowable(text, style_name, styles, list_depth=0):
+    """Paragraph for already-stripped inline markup, or None if it cannot be built"""
+    text = text.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
+
+    style = styles[style_name]
+    if style_name == 'BulletText':
+        # Use the precompiled style for this depth when the theme has one
+        level_style = f'BulletLevel{list_depth}'
+        if level_style in styles:
+            style = styles[level_style]
+        else:
+            style = bullet_style(styles['BulletText'], list_depth)
+
+    try:
+        return Paragraph(text, style)
+    except:
+        # Fallback
+        return Paragraph(text, styles['CustomBody'])
+
+
+def hr_flowable():
+    return HRFlowable(width="100%", thickness=1, color=colors.HexColor('#CCCCCC'), spaceBefore=16, spaceAfter=4)
+
+
+def code_flowables(text, styles):
+    """Preformatted code block, or nothing for whitespace-only code"""
+    if not text.strip():
+        return []
+    return [Preformatted(text, styles['CodeBlock']), Spacer(1, 12)]
+
+
+def image_flowables(src, alt, styles, width=None, height=None, images=None):
+    """Image from a data URI, an extracted data URI or a local path, with an alt-text fallback"""
+    if images is None:
+        images = DocumentImages()
+    try:
+        if src.startswith(REFERENCE_PREFIX):
+            return [images.flowable(images.from_reference(src), width, height), Spacer(1, 12)]
+        elif src.startswith('data:image'):
+            if ',' in src:
+                return [images.flowable(images.from_data_uri(src), width, height), Spacer(1, 12)]
+        elif os.path.exists(src):
+            return [images.flowable(images.from_path(src), width, height), Spacer(1, 12)]
+    except Exception:
+        if alt:
+            return [Paragraph(f'[Image: {alt}]', styles['CustomBody'])]
+    return []
+
+
+def table_flowables(table_data, styles):
+    """Grid table with every cell rendered as a Paragraph; long tables are laid out a page at a time"""
+    if 'TableCell' in styles:
+        cell_style = styles['TableCell']
+    else:
+        cell_style = table_cell_style(styles['CustomBody'])
+    make_cell = cell_factory(cell_style)
+
+    rows = [[cell_text or "" for cell_text in row] for row in table_data]
+    if not rows: return []
+
+    # Size columns from their content
+    col_widths = column_widths(rows, cell_style, 6.5 * inch)
+
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#F0F0F0')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CCCCCC')),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('PADDING', (0, 0), (-1, -1), 6),
+    ])
+
+    if len(rows) > LARGE_TABLE_ROWS:
+        return [LargeTable(rows[0], rows[1:], col_widths, table_style, make_cell), Spacer(1, 12)]
+
+    table = Table([[make_cell(text) for text in row] for row in rows], colWidths=col_widths)
+    table.setStyle(table_style)
+    return [table, Spacer(1, 12)]
+
+
+# Block-level syntax. The patterns mirror the ones markdown2 uses so both
+# front ends agree on where blocks start and end.
+_FENCE_RE = re.compile(r'^([ \t]*`{3,})\s*?([\w+-]+)?\s*$')
+_ATX_RE = re.compile(r'^(\#{1,6})[ \t]*(.+?)[ \t]{0,99}(?<!\\)\#*\n')
+_SETEXT_RE = re.compile(r'^(=+|-+)[ \t]*$')
+_HR_RE = re.compile(r'^[ ]{0,3}([-_*])[ ]{0,2}(\1[ ]{0,2}){2,}$')
+_LIST_START_RE = re.compile(r'^([ ]{0,3})([*+-]|\d+\.)[ \t]+')
+_ITEM_RE = re.compile(r'^([ \t]*)([*+-]|\d+\.)[ \t]+')
+_BLOCKQUOTE_RE = re.compile(r'^[ \t]*>[ \t]?.+')
+_BLOCKQUOTE_STRIP_RE = re.compile(r'^[ \t]*>[ \t]?')
+_TABLE_UNDERLINE_RE = re.compile(
+    r'^[ ]{0,3}(?:(?:\|\ *:?-+:?\ *)+\|?\s?|(?:\ *:?-+:?\ *\|)+(?:\ *:?-+:?\ *)?\s?)$')
+_TABLE_ROW_RE = re.compile(r'^[ ]{0,3}(?! ).*\|')
+_LINK_DEF_RE = re.compile(r'^[ ]{0,3}\[.+\]:')
+_TASK_RE = re.compile(r'\[[ xX]\][ \t]')
+_TASK_START_RE = re.compile(r'^\[[ xX]\][ \t]+')
+_OUTDENT_RE = re.compile(r'^(\t|[ ]{1,4})')
+
+# Inline syntax
+_CODE_SPAN_RE = re.compile(r'(?<!\\)(`+)(?!`)(.+?)(?<!`)\1(?!`)', re.S)
+_AUTOLINK_RE = re.compile(r'<((?:https?|ftp):[\w~:/?#@!$*+,;%=.-]+)>', re.I)
+_ESCAPE_RE = re.compile(r'\\([\\`*_{}\[\]()>#+\-.!<])')
+_IMAGE_RE = re.compile(r'!\[([^\[\]`&<>"\\*_~]*)\]\(([^\s()<>"\'&\\]+)\)')
+_LINK_RE = re.compile(r'\[([^\[\]]*)\]\(([^\s()<>"\'&\\]+)\)')
+_STRIKE_RE = re.compile(r'~~(?=\S)(.+?)(?<=\S)~~', re.S)
+_STRONG_RE = re.compile(r'(\*\*|__)(?=\S)(.+?[*_]*)(?<=\S)\1', re.S)
+_EM_RE = re.compile(r'(\*|_)(?=\S)(.+?)(?<=\S)\1', re.S)
+_ENTITY_RE = re.compile(r'&#?[xX]?(?:[0-9a-fA-F]+|\w+);')
+_PLACEHOLDER_RE = re.compile('(\x01[^\x01]*\x01)')
+_LITERAL_RE = re.compile('\x02(\\d+)\x02')
+# Left-over markup characters that a second inline pass could still pick up
+_LEFTOVER_RE = re.compile(r'[*_`\\]|~~')
+
+
+def _split_table_row(line):
+    line = re.sub(r'^[ \t\n]+|[ \t\n]+$', '', line)
+    line = re.sub(r'^\||\|$', '', line)
+    return [re.sub(r'\\\|', '|', cell.strip()) for cell in re.split(r'^\||(?<![\`\\])\|', line)]
+
+
+def _uniform_outdent(lines, min_outdent=None, max_outdent=None):
+    """Strip the smallest common indentation, the way markdown2 does for list items"""
+    whitespace = [re.match(r'[ \t]*', line).group(0) if line else None for line in lines]
+    present = [ws for ws in whitespace if ws is not None]
+    if not present:
+        return lines
+
+    outdent = min(present)
+    if min_outdent is not None:
+        outdent = min([ws for ws in present if ws >= min_outdent] or [min_outdent])
+    if max_outdent is not None:
+        outdent = min(outdent, max_outdent)
+
+    outdented = []
+    for line_ws, line in zip(whitespace, lines):
+        if line.startswith(outdent):
+            outdented.append(line[len(outdent):])
+        elif line_ws is not None and line_ws < outdent:
+            outdented.append(line[len(line_ws):])
+        else:
+            outdented.append(line)
+    return outdented
+
+
+class BlockParser:
+    """
+    Built-in parser backend: markdown to a tree of block tuples
+
+    Blocks are ('heading', level, inline), ('paragraph', inline), ('code', text),
+    ('hr',), ('table', rows), ('blockquote', blocks) and
+    ('list', ordered, start, items) where each item is (loose, task, blocks).
+    Tight items hold ('text', inline) blocks and their sub-lists. Inline content
+    is a list of tokens (see _inline).
+    """
+
+    def parse(self, markdown_text):
+        text = preprocess_markdown(markdown_text)
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if '\x01' in text or '\x02' in text:
+            raise UnsupportedMarkdown('control characters')
+
+        lines = []
+        for line in text.split('\n'):
+            line = line.expandtabs(4)
+            if _LINK_DEF_RE.match(line):
+                raise UnsupportedMarkdown('link definition')
+            lines.append(line if line.strip(' \t') else '')
+        return self._blocks(lines, in_list=False)
+
+    # Block structure
+
+    def _hard_start(self, lines, i):
+        """Kind of block markdown2 recognizes at line i before lists and paragraphs"""
+        line = lines[i]
+        fence = _FENCE_RE.match(line)
+        if fence and self._fence_end(lines, i, fence.group(1)) is not None:
+            if fence.group(1)[0] != '`':
+                raise UnsupportedMarkdown('indented fence')
+            return 'fence'
+        if i + 1 < len(lines) and _SETEXT_RE.match(lines[i + 1]):
+            if lines[i + 1].rstrip(' \t') == '-':
+                raise UnsupportedMarkdown('single dash underline')
+            return 'setext'
+        if line.startswith('#') and _ATX_RE.match(line + '\n'):
+            return 'atx'
+        if _HR_RE.match(line):
+            return 'hr'
+        return None
+
+    def _fence_end(self, lines, i, fence):
+        for j in range(i + 1, len(lines)):
+            if lines[j].rstrip(' \t').endswith(fence):
+                if lines[j].rstrip(' \t') != fence:
+                    raise UnsupportedMarkdown('fence closed mid-line')
+                return j
+        return None
+
+    def _hard_block(self, kind, lines, i):
+        line = lines[i]
+        if kind == 'fence':
+            fence = _FENCE_RE.match(line)
+            end = self._fence_end(lines, i, fence.group(1))
+            code = '\n'.join(lines[i + 1:end])
+            if fence.group(2) and (code.startswith('\n') or code.endswith('\n') or not code
+                                   or re.search(r'&(?:amp|lt|gt);', code)):
+                # markdown2 unescapes these before highlighting, and Pygments
+                # strips blank lines around the code
+                raise UnsupportedMarkdown('highlighted code with entities or blank edges')
+            return ('code', code + '\n'), end + 1
+        if kind == 'setext':
+            level = 1 if lines[i + 1][0] == '=' else 2
+            return ('heading', level, self._inline(line)), i + 2
+        if kind == 'atx':
+            match = _ATX_RE.match(line + '\n')
+            return ('heading', len(match.group(1)), self._inline(match.group(2))), i + 1
+        return ('hr',), i + 1
+
+    def _blocks(self, lines, in_list):
+        blocks = []
+        i = 0
+        n = len(lines)
+        prev_blank = True
+        while i < n:
+            line = lines[i]
+            if not line:
+                prev_blank = True
+                i += 1
+                continue
+            kind = self._hard_start(lines, i)
+            if kind:
+                block, i = self._hard_block(kind, lines, i)
+                blocks.append(block)
+                prev_blank = True
+            elif (prev_blank or in_list) and _LIST_START_RE.match(line):
+                block, i = self._list(lines, i, in_list)
+                blocks.append(block)
+                prev_blank = True
+            elif prev_blank and self._is_table(lines, i):
+                block, i = self._table(lines, i)
+                blocks.append(block)
+                prev_blank = False
+            elif prev_blank and line.startswith('    '):
+                end = i + 1
+                while end < n and (not lines[end] or lines[end].startswith('    ')):
+                    if lines[end] and self._hard_start(lines, end):
+                        break
+                    end += 1
+                while not lines[end - 1]:
+                    end -= 1
+                code = '\n'.join(_OUTDENT_RE.sub('', l) for l in lines[i:end]).lstrip('\n').rstrip()
+                blocks.append(('code', code + '\n'))
+                i = end
+                prev_blank = False
+            elif _BLOCKQUOTE_RE.match(line):
+                if in_list:
+                    raise UnsupportedMarkdown('blockquote inside list')
+                block, i = self._blockquote(lines, i)
+                blocks.append(block)
+                prev_blank = True
+            else:
+                end = i + 1
+                while end < n and lines[end]:
+                    if (self._hard_start(lines, end) or _BLOCKQUOTE_RE.match(lines[end])
+                            or (in_list and _LIST_START_RE.match(lines[end]))):
+                        break
+                    end += 1
+                text = '\n'.join(lines[i:end]).lstrip(' \t')
+                blocks.append(('paragraph', self._inline(text)))
+                i = end
+                prev_blank = False
+        return blocks
+
+    def _blockquote(self, lines, i):
+        end = i + 1
+        while end < len(lines) and lines[end]:
+            kind = self._hard_start(lines, end)
+            if kind in ('atx', 'setext'):
+                raise UnsupportedMarkdown('heading inside blockquote')
+            if kind:
+                break
+            end += 1
+
+        k = end
+        while k < len(lines) and not lines[k]:
+            k += 1
+        if k > end and k < len(lines) and lines[k].startswith('    '):
+            # The code block swallows the blank line and the quote runs on into it
+            raise UnsupportedMarkdown('code block after blockquote')
+
+        inner = []
+        for line in lines[i:end]:
+            line = _BLOCKQUOTE_STRIP_RE.sub('', line, count=1)
+            inner.append(line if line.strip(' \t') else '')
+        blocks = self._blocks(inner, in_list=False)
+        if self._has_code(blocks):
+            # markdown2 re-indents blockquote HTML, which shifts code block text
+            raise UnsupportedMarkdown('code inside blockquote')
+        return ('blockquote', blocks), end
+
+    def _has_code(self, blocks):
+        for block in blocks:
+            if block[0] == 'code':
+                return True
+            if block[0] == 'blockquote' and self._has_code(block[1]):
+                return True
+            if block[0] == 'list':
+                for _, _, content in block[3]:
+                    if self._has_code(content):
+                        return True
+        return False
+
+    def _is_table(self, lines, i):
+        if not (i + 2 < len(lines)
+                and '|' in lines[i] and re.match(r'[ ]{0,3}', lines[i]).end() < 4
+                and _TABLE_UNDERLINE_RE.match(lines[i + 1])):
+            return False
+        if not lines[i + 2] and i + 3 < len(lines) and _TABLE_ROW_RE.match(lines[i + 3]):
+            # markdown2's underline pattern can swallow one blank line
+            raise UnsupportedMarkdown('blank line after table underline')
+        return bool(_TABLE_ROW_RE.match(lines[i + 2]))
+
+    def _table(self, lines, i):
+        end = i + 2
+        while end < len(lines) and _TABLE_ROW_RE.match(lines[end]):
+            if self._hard_start(lines, end):
+                # markdown2 renders headings first, so their HTML becomes a row
+                raise UnsupportedMarkdown('heading inside table')
+            end += 1
+
+        rows = []
+        for line in [lines[i]] + lines[i + 2:end]:
+            cells = []
+            for cell in _split_table_row(line):
+                tokens = self._inline(cell)
+                if any(token[0] in ('image', 'br') for token in tokens):
+                    raise UnsupportedMarkdown('image inside table')
+                cells.append(tokens)
+            rows.append(cells)
+        return ('table', rows), end
+
+    def _list(self, lines, i, in_list, passes=0):
+        """Parse one list starting at line i; returns the block and the next line index"""
+        n = len(lines)
+        start = _LIST_START_RE.match(lines[i])
+        indent, marker = start.group(1), start.group(2)
+        ordered = marker.endswith('.')
+        same = r'\d+\.' if ordered else r'[*+-]'
+        other = r'[*+-]' if ordered else r'\d+\.'
+        if re.match(r' *' + re.escape(marker) + ' ', lines[i][start.end():]):
+            raise UnsupportedMarkdown('marker run')
+        other_re = re.compile(re.escape(indent) + other + r'[ \t]+')
+        same_re = re.compile(r'[ \t]*' + same + r'[ \t]+')
+
+        # Find where markdown2's whole-list pattern stops
+        end = i + 1
+        while end < n:
+            line = lines[end]
+            if not line:
+                k = end
+                while k < n and not lines[k]:
+                    k += 1
+                if k == n or self._hard_start(lines, k) or other_re.match(lines[k]):
+                    break
+                if lines[k][0] != ' ' and not same_re.match(lines[k]):
+                    break
+                end = k
+                continue
+            kind = self._hard_start(lines, end)
+            if kind in ('atx', 'setext'):
+                raise UnsupportedMarkdown('heading inside list')
+            if kind or other_re.match(line):
+                break
+            end += 1
+
+        # Split into items at markers with exactly the first item's indentation
+        item_re = re.compile(re.escape(indent) + r'(?:[*+-]|\d+\.)[ \t]+')
+        starts = [i] + [j for j in range(i + 1, end) if item_re.match(lines[j])]
+        items = []
+        previous_blank = False
+        for index, item_start in enumerate(starts):
+            item_end = starts[index + 1] if index + 1 < len(starts) else end
+            item_lines = lines[item_start:item_end]
+            trailing_blank = not item_lines[-1]
+            if index + 1 == len(starts):
+                while not item_lines[-1]:
+                    item_lines.pop()
+            loose = previous_blank or '' in item_lines
+            previous_blank = trailing_blank
+            items.append(self._list_item(item_lines, loose, passes))
+
+        return ('list', ordered, marker, items), end
+
+    def _list_item(self, item_lines, loose, passes):
+        marker = _ITEM_RE.match(item_lines[0])
+        first = item_lines[0][marker.end():]
+        if not first.strip() or _LIST_START_RE.match(first) or _HR_RE.match(first):
+            raise UnsupportedMarkdown('list marker at item start')
+
+        task = bool(_TASK_START_RE.match(first))
+        if task and first[_TASK_START_RE.match(first).end():].startswith('['):
+            raise UnsupportedMarkdown('reference link syntax')
+
+        if loose:
+            content = _uniform_outdent([first] + item_lines[1:], min_outdent=' ', max_outdent='    ')
+            blocks = self._blocks(content, in_list=True)
+            if task:
+                # The checkbox replaces the marker at the start of the first paragraph
+                if blocks[0][0] != 'paragraph' or blocks[0][1][0][0] != 'text':
+                    raise UnsupportedMarkdown('task marker outside a paragraph')
+                tokens = blocks[0][1]
+                text = tokens[0][1]
+                checkbox = _TASK_START_RE.match(text)
+                if not checkbox:
+                    raise UnsupportedMarkdown('task marker outside a paragraph')
+                tokens[0] = ('text', text[checkbox.end():])
+            self._check_task_markers(blocks)
+            return (True, task, blocks)
+
+        if task:
+            first = first[_TASK_START_RE.match(first).end():]
+
+        content = _uniform_outdent([first] + item_lines[1:], min_outdent=' ')
+        for index in range(1, len(content)):
+            if self._hard_start(content, index):
+                raise UnsupportedMarkdown('block syntax inside list item')
+        split = len(content)
+        for index in range(1, len(content)):
+            if _LIST_START_RE.match(content[index]):
+                split = index
+                break
+
+        sublists = []
+        j = split
+        while j < len(content):
+            if not _LIST_START_RE.match(content[j]):
+                raise UnsupportedMarkdown('text after sub-list')
+            block, j = self._list(content, j, True, passes + 1)
+            sublists.append(block)
+
+        text = '\n'.join(content[:split])
+        if sublists and sublists[0][1] and sublists[0][2] != '1.':
+            # <ol start="N"> escapes markdown2's no-break-before-list rule
+            text += '\n'
+        blocks = [('text', self._inline(text, passes))]
+        self._check_task_markers(blocks)
+        for index, block in enumerate(sublists):
+            if index and block[1] and block[2] != '1.':
+                blocks.append(('text', [('br',)] * (passes + 1)))
+            blocks.append(block)
+        return (False, task, blocks)
+
+    def _check_task_markers(self, blocks):
+        """markdown2 turns the first [ ]/[x] anywhere in an item into a checkbox"""
+        for block in blocks:
+            if block[0] in ('paragraph', 'text'):
+                inlines = [block[1]]
+            elif block[0] == 'heading':
+                inlines = [block[2]]
+            elif block[0] == 'table':
+                inlines = [cell for row in block[1] for cell in row]
+            elif block[0] == 'blockquote':
+                self._check_task_markers(block[1])
+                continue
+            else:
+                continue
+            for tokens in inlines:
+                for token in tokens:
+                    if token[0] == 'text' and _TASK_RE.search(token[1]):
+                        raise UnsupportedMarkdown('task marker inside item text')
+
+    # Inline content
+
+    def _inline(self, text, passes=0):
+        """
+        Inline markdown to tokens: ('text', s), ('b'|'i'|'code'|'link', opening, href),
+        ('br',), ('flush',) and ('image', src, alt)
+        """
+        literals = []
+        links = []
+
+        def literal(value):
+            literals.append(value)
+            return '\x02%d\x02' % (len(literals) - 1)
+
+        text = _CODE_SPAN_RE.sub(
+            lambda m: '\x01C\x01' + literal(m.group(2).strip(' \t')) + '\x01c\x01', text)
+
+        def autolink(match):
+            links.append(match.group(1))
+            return '\x01A%d\x01' % (len(links) - 1) + literal(match.group(1)) + '\x01a\x01'
+        text = _AUTOLINK_RE.sub(autolink, text)
+
+        if '\\\\<' in text:
+            raise UnsupportedMarkdown('escaped backslash before <')
+        text = _ESCAPE_RE.sub(lambda m: literal(m.group(1)), text)
+
+        if re.search(r'\][ ]?(?:\n[ ]*)?\[|\[\^', text):
+            raise UnsupportedMarkdown('reference link syntax')
+
+        def image(match):
+            links.append((match.group(2), match.group(1)))
+            return '\x01M%d\x01' % (len(links) - 1)
+        text = _IMAGE_RE.sub(image, text)
+
+        def link(match):
+            links.append(match.group(2))
+            return '\x01A%d\x01' % (len(links) - 1) + match.group(1) + '\x01a\x01'
+        text = _LINK_RE.sub(link, text)
+
+        if re.search(r'<[A-Za-z/!?$]|\]\(|!\[', text):
+            raise UnsupportedMarkdown('raw HTML or unsupported link syntax')
+
+        # <s> is not a formatting tag for the HTML parser: it only splits the text
+        text = _STRIKE_RE.sub('\x01F\x01\\1', text)
+        text = _STRONG_RE.sub('\x01B\x01\\2\x01b\x01', text)
+        text = _EM_RE.sub('\x01I\x01\\2\x01i\x01', text)
+
+        if passes and _LEFTOVER_RE.search(_PLACEHOLDER_RE.sub('', text)):
+            # Nested tight list items go through markdown2's span pass again
+            raise UnsupportedMarkdown('markup characters in nested list item')
+
+        # Each extra span pass adds another break before a newline
+        text = re.sub(r' *\n', '\x01R\x01' * (passes + 1) + '\n', text)
+
+        tokens = []
+        for part in _PLACEHOLDER_RE.split(text):
+            if not part:
+                continue
+            if part[0] != '\x01':
+                pieces = _LITERAL_RE.split(part)
+                for index, piece in enumerate(pieces):
+                    if index % 2:
+                        pieces[index] = literals[int(piece)]
+                    else:
+                        pieces[index] = _ENTITY_RE.sub(lambda m: html.unescape(m.group(0)), piece)
+                value = ''.join(pieces)
+                if tokens and tokens[-1][0] == 'text':
+                    tokens[-1] = ('text', tokens[-1][1] + value)
+                else:
+                    tokens.append(('text', value))
+                continue
+
+            code = part[1:-1]
+            tag = code[0]
+            if tag in 'BbIi':
+                tokens.append(('b' if tag in 'Bb' else 'i', tag.isupper(), None))
+            elif tag in 'Cc':
+                tokens.append(('code', tag == 'C', None))
+            elif tag == 'A':
+                tokens.append(('link', True, links[int(code[1:])]))
+            elif tag == 'a':
+                tokens.append(('link', False, None))
+            elif tag == 'M':
+                src, alt = links[int(code[1:])]
+                tokens.append(('image', src, alt))
+            elif tag == 'R':
+                tokens.append(('br',))
+            elif tag == 'F':
+                tokens.append(('flush',))
+
+        return tokens
+
+
+class FlowableCompiler:
+    """
+    Turn parsed blocks into flowables
+
+    Style and nesting state follow HTMLToReportLab step for step, so both front
+    ends produce the same story for the same document.
+    """
+
+    def __init__(self, styles, images=None):
+        self.styles = styles
+        self.images = images if images is not None else DocumentImages()
+        self.story = []
+        self.current_text = []
+        self.current_style = 'CustomBody'
+        self.list_depth = 0
+        self.in_bold = False
+        self.in_italic = False
+        self.in_link = False
+
+    def compile(self, blocks):
+        self._blocks(blocks)
+        return self.finish()
+
+    def feed(self, blocks):
+        """Compile more top-level blocks, leaving trailing text pending"""
+        self._blocks(blocks)
+
+    def finish(self):
+        self._flush()
+        return self.story
+
+    def state(self):
+        """State carried from one top-level block to the next, as a hashable tuple"""
+        return (self.current_style, tuple(self.current_text), self.in_bold, self.in_italic, self.in_link)
+
+    def restore(self, state):
+        current_style, current_text, self.in_bold, self.in_italic, self.in_link = state
+        self.current_style = current_style
+        self.current_text = list(current_text)
+
+    def _start(self):
+        # Every block-level tag flushes pending text first
+        if self.current_text:
+            self._flush()
+
+    def _flush(self):
+        if self.current_text:
+            text = ''.join(self.current_text).strip()
+            if text:
+                if self.in_bold: text += '</b>'
+                if self.in_italic: text += '</i>'
+                if self.in_link: text += '</u></link>'
+                self.story.append(paragraph_flowable(text, self.current_style, self.styles, self.list_depth))
+        self.in_bold = False
+        self.in_italic = False
+        self.in_link = False
+        self.current_text = []
+
+    def _blocks(self, blocks):
+        for block in blocks:
+            getattr(self, '_' + block[0])(*block[1:])
+
+    def _heading(self, level, inline):
+        self._start()
+        if level <= 3:
+            self.current_style = f'CustomHeading{level}'
+        self._inline(inline)
+        if level <= 3:
+            # h4-h6 have no style of their own and stay pending
+            self._flush()
+            self.current_style = 'CustomBody'
+
+    def _paragraph(self, inline):
+        self._start()
+        self.current_style = 'CustomBody'
+        self._inline(inline)
+        self._flush()
+        self.current_style = 'CustomBody'
+
+    def _code(self, text):
+        self._start()
+        self._flush()
+        self.story.extend(code_flowables(text, self.styles))
+
+    def _hr(self):
+        self._start()
+        self.story.append(hr_flowable())
+
+    def _blockquote(self, blocks):
+        self._start()
+        self.current_style = 'BlockQuote'
+        self._blocks(blocks)
+        self._flush()
+        self.current_style = 'CustomBody'
+
+    def _table(self, rows):
+        self._start()
+        table_data = []
+        for row in rows:
+            cells = []
+            for tokens in row:
+                self.current_text = []
+                self._inline(tokens, in_cell=True)
+                text = ''.join(self.current_text).strip()
+                cells.append(text.replace('<b></b>', '').replace('<i></i>', ''))
+            self.current_text = []
+            table_data.append(cells)
+        self.story.extend(table_flowables(table_data, self.styles))
+
+    def _text(self, inline):
+        self._inline(inline)
+
+    def _list(self, ordered, start, items):
+        self._start()
+        self.list_depth += 1
+        for number, (loose, task, content) in enumerate(items, 1):
+            self._start()
+            self.current_text.append(f'{number}. ' if ordered else '• ')
+            self.current_style = 'BulletText'
+            if task:
+                self._start()
+            self._blocks(content)
+            self._flush()
+        self.list_depth -= 1
+
+    def _inline(self, tokens, in_cell=False):
+        for token in tokens:
+            kind = token[0]
+            if kind == 'text':
+                if in_cell or token[1].strip() or self.current_text:
+                    self.current_text.append(token[1])
+            elif kind == 'b':
+                if token[1] and not self.in_bold:
+                    self.in_bold = True
+                    self.current_text.append('<b>')
+                elif not token[1] and self.in_bold:
+                    self.in_bold = False
+                    self.current_text.append('</b>')
+            elif kind == 'i':
+                if token[1] and not self.in_italic:
+                    self.in_italic = True
+                    self.current_text.append('<i>')
+                elif not token[1] and self.in_italic:
+                    self.in_italic = False
+                    self.current_text.append('</i>')
+            elif kind == 'link':
+                if token[1] and not self.in_link:
+                    self.in_link = True
+                    self.current_text.append(f'<link href="{token[2]}" color="blue"><u>')
+                elif not token[1] and self.in_link:
+                    self.in_link = False
+                    self.current_text.append('</u></link>')
+            elif kind == 'code':
+                self.current_text.append('<font name="Courier" backColor="#F5F5F5">' if token[1] else '</font>')
+            elif kind == 'br':
+                self.current_text.append('<br/>')
+            elif kind == 'flush':
+                if not in_cell:
+                    self._start()
+            elif kind == 'image':
+                self._start()
+                self.story.extend(image_flowables(token[1], token[2], self.styles, images=self.images))
+
+
+_backends = {
+    'builtin': BlockParser,
+}
+_backends_lock = threading.Lock()
+
+DEFAULT_BACKEND = 'builtin'
+
+
+def register_backend(name, factory):
+    """Register a parser backend; factory() returns an object with parse(markdown_text)"""
+    with _backends_lock:
+        _backends[name] = factory
+
+
+def get_backend(name=None):
+    name = name or DEFAULT_BACKEND
+    factory = _backends.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown markdown backend: {name}")
+    return factory()
+
+
+def split_blocks(markdown_text):
+    """
+    Split markdown into top-level chunks that parse the same on their own
+
+    A chunk ends at a blank line followed by an unindented line, unless
+    markdown2 would carry a fence, list or blockquote across that blank line.
+    """
+    text = preprocess_markdown(markdown_text).replace('\r\n', '\n').replace('\r', '\n')
+    lines = text.split('\n')
+    chunks = []
+    start = 0
+    has_list = has_quote = False
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip(' \t'):
+            i += 1
+            continue
+
+        if (i > start and not lines[i - 1].strip(' \t') and line[0] not in ' \t'
+                and not (i >= 2 and _TABLE_UNDERLINE_RE.match(lines[i - 2]))
+                and not (has_list and _LIST_START_RE.match(line))
+                and not (has_quote and _BLOCKQUOTE_RE.match(line))):
+            chunks.append('\n'.join(lines[start:i]))
+            start = i
+            has_list = has_quote = False
+
+        fence = _FENCE_RE.match(line)
+        if fence:
+            # Keep a fenced block whole, blank lines and all
+            close = next((j for j in range(i + 1, len(lines))
+                          if lines[j].rstrip(' \t').endswith(fence.group(1))), None)
+            if close is not None:
+                i = close + 1
+                continue
+        if _LIST_START_RE.match(line):
+            has_list = True
+        if _BLOCKQUOTE_RE.match(line):
+            has_quote = True
+        i += 1
+
+    chunks.append('\n'.join(lines[start:]))
+    return chunks
+
+
+def compile_markdown(markdown_text, styles, backend=None, images=None):
+    """Markdown to a list of flowables; raises UnsupportedMarkdown when the HTML path is needed"""
+    blocks = get_backend(backend).parse(markdown_text)
+    return FlowableCompiler(styles, images).compile(blocks)
+
+
+def story_signature(story):
+    """Comparable summary of a story: flowable types, styles and text"""
+    signature = []
+    for flowable in story:
+        if isinstance(flowable, Paragraph):
+            # Paragraphs collapse whitespace, so only the words matter
+            signature.append(('Paragraph', flowable.style.name, ' '.join(flowable.text.split())))
+        elif isinstance(flowable, Preformatted):
+            signature.append(('Preformatted', flowable.style.name, tuple(flowable.lines)))
+        elif isinstance(flowable, Table):
+            cells = tuple(
+                tuple(' '.join(getattr(cell, 'text', str(cell)).split()) for cell in row)
+                for row in flowable._cellvalues
+            )
+            signature.append(('Table', tuple(flowable._colWidths), cells))
+        elif isinstance(flowable, LargeTable):
+            cells = tuple(
+                tuple(' '.join(text.split()) for text in row)
+                for row in [flowable.header] + flowable.rows[flowable.start:]
+            )
+            signature.append(('Table', tuple(flowable.col_widths), cells))
+        elif isinstance(flowable, Spacer):
+            signature.append(('Spacer', flowable.width, flowable.height))
+        elif isinstance(flowable, RLImage):
+            signature.append(('Image', flowable.drawWidth, flowable.drawHeight))
+        else:
+            signature.append((type(flowable).__name__,))
+    return signature
+
+
+def compare_stories(expected, actual):
+    """Differences between two stories as (index, expected, actual) tuples"""
+    expected_sig = story_signature(expected)
+    actual_sig = story_signature(actual)
+    differences = []
+    for index in range(max(len(expected_sig), len(actual_sig))):
+        left = expected_sig[index] if index < len(expected_sig) else None
+        right = actual_sig[index] if index < len(actual_sig) else None
+        if left != right:
+            differences.append((index, left, right))
+    return differences
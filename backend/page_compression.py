@@ -0,0 +1,77 @@
+"""
+Page stream compression for Davinci Document Creator
+Compresses a canvas's page content streams in a thread pool before ReportLab writes the file
+"""
+
+import base64
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from reportlab import rl_config
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFDictionary, PDFName, PDFStream
+
+# Threads compressing page streams at save; 0 compresses them in the saving thread
+COMPRESS_THREADS = int(os.environ.get('COMPRESS_THREADS', min(4, os.cpu_count() or 1)))
+
+# Pages handed to a thread at a time; documents with fewer are compressed in the saving thread
+PAGES_PER_TASK = 16
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The thread pool, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=COMPRESS_THREADS, thread_name_prefix='compress')
+        return _pool
+
+
+def _forget_pool():
+    # A forked child (a render_pool worker) has none of the pool's threads
+    global _pool
+    _pool = None
+
+
+os.register_at_fork(after_in_child=_forget_pool)
+
+
+def _encode(streams, ascii85):
+    """Each page stream as ReportLab's filters would encode it"""
+    encoded = []
+    for stream in streams:
+        # zlib releases the GIL, so the pool's threads deflate at once
+        data = zlib.compress(stream.encode('utf8') if isinstance(stream, str) else stream)
+        # The same bytes as ReportLab's ASCII85 filter, which is pure Python
+        encoded.append(base64.a85encode(data) + b'~>' if ascii85 else data)
+    return encoded
+
+
+def compress_pages(canvas):
+    """
+    Compress the content streams of canvas's pages, to be called just before canvas.save()
+
+    Each page gets a content stream already encoded with ReportLab's page
+    filters, so save() writes it as it is and the file is byte for byte the
+    one ReportLab would write.
+    """
+    if rl_config.wrapA85:
+        return
+    pages = [page for page in canvas._doc.Pages.pages if page.compression and page.stream and not page.Contents]
+    streams = [page.stream for page in pages]
+    ascii85 = bool(rl_config.useA85)
+    if COMPRESS_THREADS and len(pages) > PAGES_PER_TASK:
+        chunks = [streams[start:start + PAGES_PER_TASK] for start in range(0, len(streams), PAGES_PER_TASK)]
+        encoded = [data for chunk in get_pool().map(_encode, chunks, [ascii85] * len(chunks)) for data in chunk]
+    else:
+        encoded = _encode(streams, ascii85)
+
+    filters = ['ASCII85Decode', 'FlateDecode'] if ascii85 else ['FlateDecode']
+    for page, data in zip(pages, encoded):
+        contents = PDFStream(PDFDictionary({'Filter': PDFArray([PDFName(name) for name in filters])}), data)
+        contents.__Comment__ = "page stream"
+        page.Contents = contents
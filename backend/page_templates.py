@@ -0,0 +1,178 @@
+"""
+Precompiled template pages for Davinci Document Creator
+Builds the constant parts of the title and signature pages once per brand and
+shares them across requests
+"""
+
+import io
+import re
+import threading
+
+from reportlab.graphics import renderPDF
+from reportlab.pdfgen import canvas
+from reportlab.platypus.flowables import Flowable
+
+# Operators whose resources (images, graphics states, shadings, font subsets)
+# are registered with the document as they are drawn, so their output cannot
+# be replayed into another document
+_DOCUMENT_BOUND_OPS = re.compile(r'(?<![\w/])(Do|gs|sh|Tj|TJ|BI)\b|/F\d+\+\d+')
+
+# Font selections name the font by its per-document resource name
+_FONT_SELECT = re.compile(r'(/F\d+)( [\d.]+ Tf)')
+
+
+class Prebuilt:
+    """
+    A flowable built once and drawn into many documents
+
+    Laying out and drawing a flowable both mutate it, so they take turns
+    under a lock. Documents get a PrebuiltFlowable each.
+    """
+
+    def __init__(self, flowable):
+        self.flowable = flowable
+        self.lock = threading.Lock()
+        self._laid_out_for = None
+        self._size = None
+
+    def _layout(self, avail_width, avail_height):
+        if self._laid_out_for != (avail_width, avail_height):
+            self._size = self.flowable.wrap(avail_width, avail_height)
+            self._laid_out_for = (avail_width, avail_height)
+        return self._size
+
+    def wrap(self, avail_width, avail_height):
+        with self.lock:
+            return self._layout(avail_width, avail_height)
+
+    def draw_on(self, canv, x, y, _sW, avail_width, avail_height):
+        with self.lock:
+            self._layout(avail_width, avail_height)
+            self.flowable.drawOn(canv, x, y, _sW=_sW)
+
+    def instance(self):
+        return PrebuiltFlowable(self)
+
+
+class PrebuiltFlowable(Flowable):
+    """One document's handle on a Prebuilt flowable; never split"""
+
+    def __init__(self, prebuilt):
+        Flowable.__init__(self)
+        self.prebuilt = prebuilt
+        self.hAlign = getattr(prebuilt.flowable, 'hAlign', 'LEFT')
+        self._avail = (0, 0)
+
+    def wrap(self, availWidth, availHeight):
+        self._avail = (availWidth, availHeight)
+        self.width, self.height = self.prebuilt.wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        return []
+
+    def getSpaceBefore(self):
+        return self.prebuilt.flowable.getSpaceBefore()
+
+    def getSpaceAfter(self):
+        return self.prebuilt.flowable.getSpaceAfter()
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self.prebuilt.draw_on(canvas, x, y, _sW, *self._avail)
+
+
+class PrerenderedDrawing:
+    """
+    A vector drawing rendered to PDF operators once
+
+    Documents replay the operators instead of walking the drawing's shapes,
+    mapping font selections to the document's own font names. Drawings whose
+    output depends on per-document resources are drawn normally instead.
+    """
+
+    def __init__(self, drawing, width, height):
+        self.drawing = drawing
+        self.width = width
+        self.height = height
+
+        scratch = canvas.Canvas(io.BytesIO())
+        renderPDF.draw(drawing, scratch, 0, 0)
+        code = '\n'.join(scratch._code)
+
+        if _DOCUMENT_BOUND_OPS.search(code):
+            self._parts = None
+        else:
+            fonts = {internal: name for name, internal in scratch._doc.fontMapping.items()}
+            parts = _FONT_SELECT.split(code)
+            # split() alternates text, font name, size + Tf
+            for i in range(1, len(parts), 3):
+                parts[i] = fonts[parts[i]]
+            self._parts = parts
+
+    @property
+    def replayable(self):
+        return self._parts is not None
+
+    def draw(self, canv):
+        if self._parts is None:
+            renderPDF.draw(self.drawing, canv, 0, 0)
+            return
+
+        code = []
+        for i, part in enumerate(self._parts):
+            if i % 3 == 1:
+                part = canv._doc.getInternalFontName(part)
+            code.append(part)
+        canv._code.append(''.join(code))
+
+    def instance(self, hAlign='CENTER'):
+        return PrerenderedFlowable(self, hAlign)
+
+
+class PrerenderedFlowable(Flowable):
+    """One document's handle on a PrerenderedDrawing"""
+
+    def __init__(self, prerendered, hAlign='CENTER'):
+        Flowable.__init__(self)
+        self.prerendered = prerendered
+        self.width = prerendered.width
+        self.height = prerendered.height
+        self.hAlign = hAlign
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.prerendered.draw(self.canv)
+
+
+class TemplateCache:
+    """Shared template flowables by name, rebuilt when their version changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, name, build, version=None):
+        """
+        The shared template(s) for name, building them on first use
+
+        build() returns Prebuilt/PrerenderedDrawing objects; callers put
+        their instance() into the story, never the template itself.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != version:
+                entry = (version, build())
+                self._entries[name] = entry
+                self.builds += 1
+            return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Process-wide templates for the title and signature pages
+templates = TemplateCache()
@@ -0,0 +1,218 @@
+"""
+Parallel section rendering for Davinci Document Creator
+Renders the page-aligned sections of a long document in worker processes
+"""
+
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from markdown_compiler import split_blocks
+from pdf_objects import dictionary_end, read_pdf, renumber
+
+# Worker processes for section rendering; 0 renders every document serially
+SECTION_WORKERS = int(os.environ.get('SECTION_WORKERS', 0))
+
+# Shorter documents render faster in one process than handed out to several
+SECTION_MIN_CHARS = int(os.environ.get('SECTION_MIN_CHARS', 100000))
+
+_pool = None
+
+
+def enabled(markdown_text, config):
+    """Whether a document should be rendered in sections"""
+    return (SECTION_WORKERS > 0
+            and bool(config.get('section_page_breaks'))
+            and len(markdown_text) >= SECTION_MIN_CHARS)
+
+
+def split_sections(markdown_text, parts=None):
+    """
+    Split markdown at top-level H1 headings into at most parts sections
+
+    With section page breaks every H1 starts a new page, so each section lays
+    out exactly as it would in the whole document. Any text before the first
+    H1 is a section of its own. Joined with newlines, the sections give back
+    the preprocessed markdown. Consecutive H1 sections are grouped into
+    parts of similar length, since each rendered part embeds its own subset
+    of the fonts.
+    """
+    sections = []
+    for chunk in split_blocks(markdown_text):
+        if not chunk.strip():
+            continue
+        if not sections or chunk.startswith('# '):
+            sections.append([])
+        sections[-1].append(chunk)
+    sections = ['\n'.join(chunks) for chunks in sections]
+
+    parts = parts or SECTION_WORKERS
+    if not parts or len(sections) <= parts:
+        return sections
+    target = sum(map(len, sections)) / parts
+    grouped = [[]]
+    size = 0
+    for section in sections:
+        if grouped[-1] and size >= target * len(grouped) and len(grouped) < parts:
+            grouped.append([])
+        grouped[-1].append(section)
+        size += len(section)
+    return ['\n'.join(group) for group in grouped]
+
+
+def get_pool():
+    """The process pool, started on first use"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=SECTION_WORKERS)
+    return _pool
+
+
+def shutdown():
+    """Stop the pool's processes, if it was started"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def _forget_pool():
+    # A forked child (a render_pool worker) starts a pool of its own
+    global _pool
+    _pool = None
+
+
+os.register_at_fork(after_in_child=_forget_pool)
+
+
+def render(render_section, jobs):
+    """Run render_section(*job) for each job in the pool; PDF bytes in job order"""
+    futures = [get_pool().submit(render_section, *job) for job in jobs]
+    return [future.result() for future in futures]
+
+
+_CONTENTS_RE = re.compile(rb'/Contents (\d+ 0 R)')
+
+
+class _Output:
+    """Objects of the merged PDF, numbered in the order they are reserved"""
+
+    def __init__(self):
+        self.objects = [None]
+
+    def reserve(self):
+        self.objects.append((b'', b''))
+        return len(self.objects) - 1
+
+    def add(self, dictionary, stream=b''):
+        number = self.reserve()
+        self.objects[number] = (dictionary, stream)
+        return number
+
+    def copy(self, objects, skipped=(), numbers=None):
+        """Copy objects except skipped under new numbers; returns the old to new mapping"""
+        numbers = dict(numbers or {})
+        for number in objects:
+            if number not in skipped:
+                numbers[number] = self.reserve()
+        for number, (dictionary, stream) in objects.items():
+            if number not in skipped:
+                self.objects[numbers[number]] = (renumber(dictionary, numbers), stream)
+        return numbers
+
+    def write(self, header, root, info, buffer=None):
+        """Write the PDF to buffer, or to a new BytesIO returned at its start"""
+        rewind = buffer is None
+        if rewind:
+            buffer = io.BytesIO()
+        buffer.write(header)
+        offsets = []
+        for number, (dictionary, stream) in enumerate(self.objects[1:], 1):
+            offsets.append(buffer.tell())
+            buffer.write(b'%d 0 obj\n%s%s\nendobj\n' % (number, dictionary, stream))
+        xref = buffer.tell()
+        buffer.write(b'xref\n0 %d\n0000000000 65535 f \n' % len(self.objects))
+        buffer.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+        buffer.write(b'trailer\n<< /Info %d 0 R /Root %d 0 R /Size %d >>\nstartxref\n%d\n%%%%EOF\n'
+                     % (info, root, len(self.objects), xref))
+        if rewind:
+            buffer.seek(0)
+        return buffer
+
+
+def _chrome_forms(output, chrome_pdf):
+    """
+    Copy a chrome PDF into output with each page turned into a form XObject
+
+    Returns the form number for each page, or None for a page without the
+    letterhead form, which has no chrome at all (the title page).
+    """
+    objects, root, info, pages, page_order = read_pdf(chrome_pdf)
+    contents = {page: int(_CONTENTS_RE.search(objects[page][0]).group(1).split()[0]) for page in page_order}
+    # Fonts and the shared letterhead form are copied as they are
+    numbers = output.copy(objects, {root, info, pages, *page_order, *contents.values()})
+
+    forms = []
+    for page in page_order:
+        page_dictionary = objects[page][0]
+        if b'/XObject' not in page_dictionary:
+            forms.append(None)
+            continue
+        resources_at = page_dictionary.index(b'/Resources <<')
+        resources = page_dictionary[resources_at:dictionary_end(page_dictionary, resources_at + 11)]
+        dictionary, stream = objects[contents[page]]
+        forms.append(output.add(
+            b'<< /Type /XObject /Subtype /Form /BBox [ 0 0 612 792 ] '
+            + renumber(resources, numbers) + b' ' + dictionary[2:], stream
+        ))
+    return forms
+
+
+def merge(section_pdfs, render_chrome, file=None):
+    """
+    One PDF of the sections' pages in order, each drawn over by its page of chrome
+
+    The PDF is written to file, or to a new BytesIO, which is returned.
+
+    render_chrome(page_count) returns a PDF with a page for every section
+    page: the letterhead, footer and "Page N of M" label the serial path
+    would have drawn there. Each chrome page becomes a form XObject that its
+    section page draws last, as NumberedCanvas does. The sections' fonts,
+    images and content streams are copied through byte for byte, with only
+    their object numbers changed.
+    """
+    sections = [read_pdf(pdf) for pdf in section_pdfs]
+    output = _Output()
+    pages_number = output.reserve()
+    stamp = b'q /PageChrome Do Q\n'
+    stamp_number = output.add(b'<< /Length %d >>' % len(stamp), b'\nstream\n' + stamp + b'endstream')
+    forms = iter(_chrome_forms(output, render_chrome(sum(len(section[4]) for section in sections))))
+
+    kids = []
+    info_number = output.add(sections[0][0][sections[0][2]][0])
+    for objects, root, info, pages, page_order in sections:
+        numbers = output.copy(objects, {root, info, pages}, {pages: pages_number})
+        for page in page_order:
+            kids.append(numbers[page])
+            form = next(forms)
+            if form is None:
+                continue
+            dictionary = _CONTENTS_RE.sub(
+                lambda match: b'/Contents [ %s %d 0 R ]' % (match.group(1), stamp_number),
+                output.objects[numbers[page]][0], 1
+            )
+            if b'/XObject <<' in dictionary:
+                dictionary = dictionary.replace(b'/XObject <<', b'/XObject << /PageChrome %d 0 R' % form, 1)
+            else:
+                dictionary = dictionary.replace(
+                    b'/Resources <<', b'/Resources << /XObject << /PageChrome %d 0 R >>' % form, 1
+                )
+            output.objects[numbers[page]] = (dictionary, b'')
+
+    output.objects[pages_number] = (
+        b'<< /Count %d /Kids [ %s ] /Type /Pages >>' % (len(kids), b' '.join(b'%d 0 R' % kid for kid in kids)), b''
+    )
+    root_number = output.add(b'<< /PageMode /UseNone /Pages %d 0 R /Type /Catalog >>' % pages_number)
+    header = section_pdfs[0][:section_pdfs[0].index(b'\n1 0 obj') + 1]
+    return output.write(header, root_number, info_number, file)
@@ -0,0 +1,105 @@
+"""
+Content-addressed PDF cache for Davinci Document Creator
+Keeps recently rendered PDFs in memory so repeated conversions skip ReportLab
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+class PDFCache:
+    """Thread-safe LRU cache of rendered PDFs bounded by total byte size"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        # A single huge PDF should not flush the whole cache
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(markdown_text, config, logo_digest=None):
+        """
+        Build the cache key for a render request
+
+        The key covers everything that influences the output: the normalized
+        markdown, the effective config and the logo bytes (not its path or
+        in-memory image, which say nothing about its content).
+        """
+        normalized = markdown_text.replace('\r\n', '\n').replace('\r', '\n').rstrip()
+
+        effective = {
+            key: value for key, value in config.items()
+            if key not in ('logo_path', 'logo_image')
+        }
+        effective['include_title_page'] = bool(config.get('include_title_page', False))
+        effective['include_signature_page'] = bool(config.get('include_signature_page', False))
+        effective['logo'] = logo_digest
+        if effective['include_title_page']:
+            # The title page prints today's date
+            effective['date'] = datetime.now().strftime('%Y-%m-%d')
+
+        digest = hashlib.sha256()
+        digest.update(normalized.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(json.dumps(effective, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return (pdf_bytes, etag) for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, pdf_bytes):
+        """Store rendered PDF bytes and return their strong ETag"""
+        etag = hashlib.sha256(pdf_bytes).hexdigest()[:32]
+        size = len(pdf_bytes)
+        if size > self.max_entry_bytes:
+            return etag
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+
+            self._entries[key] = (pdf_bytes, etag)
+            self._size += size
+
+            while self._size > self.max_bytes and self._entries:
+                _, (evicted_bytes, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted_bytes)
+                self.evictions += 1
+
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Counters for monitoring cache effectiveness"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
@@ -0,0 +1,290 @@
+"""
+PDF linearization for Davinci Document Creator
+Rewrites a PDF so a viewer can show the first page before the rest has downloaded
+"""
+
+import io
+import re
+import zlib
+from collections import defaultdict
+
+from pdf_objects import REF_RE, document_id, read_pdf, renumber
+
+# Catalog entries a viewer reads on opening, placed before the first page
+_OPEN_DOCUMENT_KEYS = {b'ViewerPreferences', b'Threads', b'OpenAction', b'AcroForm'}
+
+_OPEN, _OTHER = 'open', 'other'
+
+_PAGES_RE = re.compile(rb'/Type\s*/Pages(?![\w.])')
+_PARENT_RE = re.compile(rb'/Parent\s+\d+ 0 R')
+_TOKEN_RE = re.compile(rb'\d+\s+\d+\s+R(?!\w)|<<|>>|\[|\]|\((?:\\.|[^\\)])*\)|/[^\s/<>\[\]()]*|[^\s/<>\[\]()]+')
+
+# Values in the linearization dictionary and first-page trailer are written
+# after the layout is fixed, padded to the width of the largest
+_WIDEST = 10 ** 10 - 1
+
+
+def _entries(dictionary):
+    """{key: value} for the top-level entries of a dictionary's bytes"""
+    items = []
+    depth = 0
+    for match in _TOKEN_RE.finditer(dictionary):
+        token = match.group()
+        if token in (b'>>', b']'):
+            depth -= 1
+            if depth == 1:
+                items[-1] = (items[-1][0], match.end())
+        elif depth == 1:
+            items.append((match.start(), match.end()))
+        if token in (b'<<', b'['):
+            depth += 1
+    values = [dictionary[start:end] for start, end in items]
+    return {key[1:]: value for key, value in zip(values[::2], values[1::2])}
+
+
+class _Bits:
+    """Big-endian bit packing for the hint tables"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self._value = 0
+        self._count = 0
+
+    def write(self, value, bits):
+        self._value = (self._value << bits) | value
+        self._count += bits
+        while self._count >= 8:
+            self._count -= 8
+            self.data.append((self._value >> self._count) & 0xFF)
+        self._value &= (1 << self._count) - 1
+
+    def column(self, values, bits):
+        """One item for every page or object; each column starts on a byte boundary"""
+        for value in values:
+            self.write(value, bits)
+        if self._count:
+            self.write(0, 8 - self._count)
+
+
+def _page_offset_table(first_page_offset, nobjects, lengths, shared_ids, nshared_total):
+    """The page offset hint table (PDF 1.7, F.4.1), content streams counted as whole pages"""
+    bits = _Bits()
+    min_objects, min_length = min(nobjects), min(lengths)
+    object_bits = (max(nobjects) - min_objects).bit_length()
+    length_bits = (max(lengths) - min_length).bit_length()
+    shared_count_bits = max(len(ids) for ids in shared_ids).bit_length()
+    shared_id_bits = nshared_total.bit_length()
+    for value, width in ((min_objects, 32), (first_page_offset, 32), (object_bits, 16),
+                         (min_length, 32), (length_bits, 16), (0, 32), (0, 16),
+                         (min_length, 32), (length_bits, 16), (shared_count_bits, 16),
+                         (shared_id_bits, 16), (0, 16), (4, 16)):
+        bits.write(value, width)
+    bits.column([count - min_objects for count in nobjects], object_bits)
+    bits.column([length - min_length for length in lengths], length_bits)
+    bits.column([len(ids) for ids in shared_ids], shared_count_bits)
+    bits.column([number for ids in shared_ids for number in ids], shared_id_bits)
+    # Numerators of each shared reference's position in the page: none
+    bits.column([], 0)
+    bits.column([0] * len(lengths), 0)
+    bits.column([length - min_length for length in lengths], length_bits)
+    return bytes(bits.data)
+
+
+def _shared_object_table(first_shared, first_shared_offset, nshared_first_page, lengths):
+    """The shared object hint table (PDF 1.7, F.4.2), one object per group"""
+    bits = _Bits()
+    min_length = min(lengths)
+    length_bits = (max(lengths) - min_length).bit_length()
+    for value, width in ((first_shared, 32), (first_shared_offset, 32), (nshared_first_page, 32),
+                         (len(lengths), 32), (0, 16), (min_length, 32), (length_bits, 16)):
+        bits.write(value, width)
+    bits.column([length - min_length for length in lengths], length_bits)
+    # No MD5 signatures, and every group is a single object
+    bits.column([0] * len(lengths), 1)
+    bits.column([0] * len(lengths), 0)
+    return bytes(bits.data)
+
+
+def _users(objects, root, info, page_order):
+    """
+    The users of each object: page indexes, _OPEN and _OTHER
+
+    Pages are walked without following /Parent, and no walk enters a page or
+    page tree node other than the one it starts from.
+    """
+    pages = set(page_order)
+    tree = {number for number, (dictionary, _) in objects.items() if _PAGES_RE.search(dictionary)}
+    users = defaultdict(set)
+
+    def walk(start, user):
+        stack = [start]
+        while stack:
+            number = stack.pop()
+            if number not in objects or user in users[number]:
+                continue
+            users[number].add(user)
+            dictionary = objects[number][0]
+            if number in pages:
+                dictionary = _PARENT_RE.sub(b'', dictionary)
+            stack.extend(reference for reference in map(int, REF_RE.findall(dictionary))
+                         if reference not in pages and reference not in tree)
+
+    users[root].add(_OPEN)
+    catalog = _entries(objects[root][0])
+    outlines_open = re.search(rb'/UseOutlines(?![\w.])', catalog.get(b'PageMode', b'')) is not None
+    for key, value in catalog.items():
+        if key == b'Pages':
+            continue
+        user = _OPEN if key in _OPEN_DOCUMENT_KEYS or (key == b'Outlines' and outlines_open) else _OTHER
+        for reference in map(int, REF_RE.findall(value)):
+            if reference not in pages and reference not in tree:
+                walk(reference, user)
+    walk(info, _OTHER)
+    for node in tree:
+        walk(node, _OTHER)
+    for index, page in enumerate(page_order):
+        walk(page, index)
+    return users, tree
+
+
+def linearize(pdf, file=None):
+    """
+    A linearized copy of the ReportLab PDF bytes pdf, written to file or a new BytesIO
+
+    The catalog, the hint tables and everything the first page draws come
+    first, so a viewer can show page 1 once the first /E bytes have arrived;
+    each later page then follows with the objects only it uses.
+    """
+    objects, root, info, pages_root, page_order = read_pdf(pdf)
+    users, tree = _users(objects, root, info, page_order)
+
+    open_document = [root]
+    first_page = [page_order[0]]
+    first_page_shared = []
+    private = defaultdict(list)
+    shared = []
+    other = sorted(tree, key=lambda number: number != pages_root)
+    for number in sorted(objects):
+        if number in (root, page_order[0]) or number in tree:
+            continue
+        owners = users[number]
+        page_users = {user for user in owners if isinstance(user, int)}
+        if _OPEN in owners:
+            open_document.append(number)
+        elif 0 in page_users:
+            (first_page if owners == {0} else first_page_shared).append(number)
+        elif len(page_users) == 1 and len(owners) == 1:
+            private[page_users.pop()].append(number)
+        elif len(page_users) > 1:
+            shared.append(number)
+        else:
+            other.append(number)
+    first_page += first_page_shared
+    later_pages = [[page] + [number for number in private[index] if number != page]
+                   for index, page in enumerate(page_order[1:], 1)]
+    main = [number for objects_of_page in later_pages for number in objects_of_page] + shared + other
+
+    # Later pages, shared objects and the rest take 1.. in file order; the
+    # linearization dictionary, catalog, hint stream and first page follow
+    numbers = {}
+    for number in main:
+        numbers[number] = len(numbers) + 1
+    lindict_number = len(numbers) + 1
+    for number in open_document:
+        numbers[number] = len(numbers) + 2
+    hint_number = len(numbers) + 2
+    for number in first_page:
+        numbers[number] = len(numbers) + 3
+    size = len(numbers) + 3
+
+    bodies = {
+        numbers[number]: b'%d 0 obj\n%s%s\nendobj\n' % (numbers[number], renumber(objects[number][0], numbers),
+                                                          objects[number][1])
+        for number in objects
+    }
+
+    identifier = document_id(pdf)
+
+    def lindict(length, hint_offset, hint_length, first_page_end, main_xref_entry):
+        return b'%d 0 obj\n<< /Linearized 1 /L %d /H [ %d %d ] /O %d /E %d /N %d /T %d >>\nendobj\n' % (
+            lindict_number, length, hint_offset, hint_length, numbers[page_order[0]], first_page_end,
+            len(page_order), main_xref_entry)
+
+    def first_trailer(main_xref):
+        return b'trailer\n<< /Size %d /Info %d 0 R /Root %d 0 R%s /Prev %d >>\nstartxref\n0\n%%%%EOF\n' % (
+            size, numbers[info], numbers[root], b' /ID ' + identifier if identifier else b'', main_xref)
+
+    header = pdf[:pdf.rindex(b'\n', 0, pdf.index(b' 0 obj')) + 1]
+    lindict_width = len(lindict(*[_WIDEST] * 5))
+    trailer_width = len(first_trailer(_WIDEST))
+    first_xref_at = len(header) + lindict_width
+    position = first_xref_at + len(b'xref\n%d %d\n' % (lindict_number, size - lindict_number)) + \
+        20 * (size - lindict_number) + trailer_width
+
+    # Offsets past the hint stream are first laid out without it, as the
+    # hint tables give them
+    offsets = {lindict_number: len(header)}
+    for number in open_document:
+        offsets[numbers[number]] = position
+        position += len(bodies[numbers[number]])
+    hint_offset = position
+    for number in first_page + main:
+        offsets[numbers[number]] = position
+        position += len(bodies[numbers[number]])
+
+    def length_of(group):
+        return sum(len(bodies[numbers[number]]) for number in group)
+
+    shared_groups = first_page + shared
+    shared_index = {number: index for index, number in enumerate(shared_groups)}
+    shared_ids = [[]] + [
+        [shared_index[number] for number in shared_groups if index in users[number] and len(users[number]) > 1]
+        for index in range(1, len(page_order))
+    ]
+    page_table = _page_offset_table(
+        offsets[numbers[page_order[0]]],
+        [len(first_page)] + [len(group) for group in later_pages],
+        [length_of(first_page)] + [length_of(group) for group in later_pages],
+        shared_ids, len(shared_groups)
+    )
+    shared_table = _shared_object_table(
+        numbers[shared[0]] if shared else 0, offsets[numbers[shared[0]]] if shared else 0,
+        len(first_page), [len(bodies[numbers[number]]) for number in shared_groups]
+    )
+    hint_data = zlib.compress(page_table + shared_table)
+    hint = b'%d 0 obj\n<< /Filter /FlateDecode /Length %d /S %d >>\nstream\n%s\nendstream\nendobj\n' % (
+        hint_number, len(hint_data), len(page_table), hint_data)
+    offsets[hint_number] = hint_offset
+    for number in first_page + main:
+        offsets[numbers[number]] += len(hint)
+    first_page_end = offsets[numbers[first_page[-1]]] + len(bodies[numbers[first_page[-1]]])
+    main_xref = position + len(hint)
+
+    main_xref_head = b'xref\n0 %d\n' % lindict_number
+    main_section = main_xref_head + b'0000000000 65535 f \n' + b''.join(
+        b'%010d 00000 n \n' % offsets[number] for number in range(1, lindict_number)
+    ) + b'trailer\n<< /Size %d >>\nstartxref\n%d\n%%%%EOF\n' % (lindict_number, first_xref_at)
+    length = main_xref + len(main_section)
+
+    output = io.BytesIO() if file is None else file
+    output.write(header)
+    output.write(_padded(lindict(length, hint_offset, len(hint), first_page_end,
+                                 main_xref + len(main_xref_head) - 1), lindict_width))
+    output.write(b'xref\n%d %d\n' % (lindict_number, size - lindict_number))
+    output.write(b''.join(b'%010d 00000 n \n' % offsets[number] for number in range(lindict_number, size)))
+    output.write(_padded(first_trailer(main_xref), trailer_width))
+    for number in open_document:
+        output.write(bodies[numbers[number]])
+    output.write(hint)
+    for number in first_page + main:
+        output.write(bodies[numbers[number]])
+    output.write(main_section)
+    if file is None:
+        output.seek(0)
+    return output
+
+
+def _padded(data, width):
+    """data with spaces added before its closing '>>' to make it width bytes"""
+    at = data.index(b'>>\n')
+    return data[:at] + b' ' * (width - len(data)) + data[at:]
@@ -0,0 +1,58 @@
+"""
+PDF objects for Davinci Document Creator
+Reads the objects of ReportLab's PDFs, so they can be rewritten without a PDF library
+"""
+
+import re
+
+REF_RE = re.compile(rb'(?<![\w.])(\d+) 0 R(?!\w)')
+
+
+def read_pdf(pdf):
+    """
+    Objects of a ReportLab PDF as {number: (dictionary, stream or b'')}
+
+    Also returns the numbers of the catalog, the info dictionary and the
+    pages in order. Objects are located through the xref table, so stream
+    data is never scanned.
+    """
+    xref = int(pdf[pdf.rindex(b'startxref') + 9:].split()[0])
+    trailer = pdf[pdf.index(b'trailer', xref):]
+    lines = pdf[xref:pdf.index(b'trailer', xref)].split(b'\n')[2:]
+    offsets = sorted((int(line[:10]), number) for number, line in enumerate(lines) if line[17:18] == b'n')
+
+    objects = {}
+    for (offset, number), (end, _) in zip(offsets, offsets[1:] + [(xref, None)]):
+        body = pdf[pdf.index(b'obj', offset) + 3:pdf.rindex(b'endobj', offset, end)].strip(b'\r\n')
+        stream_at = body.find(b'>>\nstream')
+        if stream_at < 0:
+            objects[number] = (body, b'')
+        else:
+            objects[number] = (body[:stream_at + 2], body[stream_at + 2:])
+
+    root = int(re.search(rb'/Root (\d+) 0 R', trailer).group(1))
+    info = int(re.search(rb'/Info (\d+) 0 R', trailer).group(1))
+    pages = int(re.search(rb'/Pages (\d+) 0 R', objects[root][0]).group(1))
+    kids = re.search(rb'/Kids \[([^\]]*)\]', objects[pages][0]).group(1)
+    return objects, root, info, pages, [int(number) for number in REF_RE.findall(kids)]
+
+
+def renumber(dictionary, numbers):
+    """dictionary with each reference to object n changed to numbers[n]"""
+    return REF_RE.sub(lambda match: b'%d 0 R' % numbers[int(match.group(1))], dictionary)
+
+
+def dictionary_end(data, start):
+    """Index just past the '>>' closing the dictionary opened at data[start:start + 2]"""
+    depth = 0
+    for match in re.finditer(rb'<<|>>', data[start:]):
+        depth += 1 if match.group() == b'<<' else -1
+        if depth == 0:
+            return start + match.end()
+    raise ValueError("Unbalanced dictionary")
+
+
+def document_id(pdf):
+    """The trailer's /ID array, as written, or None"""
+    match = re.search(rb'/ID\s*(\[[^\]]*\])', pdf[pdf.rindex(b'trailer'):])
+    return match.group(1) if match else None
@@ -0,0 +1,331 @@
+"""
+PDF size optimization for Davinci Document Creator
+Rewrites ReportLab's PDFs smaller: binary streams, leaner page content, object streams and a compressed xref
+"""
+
+import base64
+import io
+import logging
+import os
+import re
+import zlib
+
+from pdf_objects import REF_RE, document_id, read_pdf
+
+logger = logging.getLogger(__name__)
+
+# Profile for requests that do not choose one: 'fast', 'small', or '' for none
+PDF_OPTIMIZE = os.environ.get('PDF_OPTIMIZE', '')
+
+# Objects packed into each object stream
+OBJECTS_PER_STREAM = 100
+
+PROFILES = {
+    # Streams lose their ASCII85 layer but keep their Flate data; new streams are compressed quickly
+    'fast': {'level': 1, 'recompress': False, 'minimize': False},
+    # Content streams also lose redundant operators, and every stream is recompressed at the best level
+    'small': {'level': 9, 'recompress': True, 'minimize': True},
+}
+
+_LENGTH_RE = re.compile(rb'/Length (\d+)')
+_FILTER_RE = re.compile(rb'\s*/Filter\s*(\[[^\]]*\]|/\w+)')
+_CONTENTS_RE = re.compile(rb'/Contents\s*(\d+ 0 R|\[[^\]]*\])')
+_FORM_RE = re.compile(rb'/Subtype\s*/Form(?![\w.])')
+_VERSION_RE = re.compile(rb'^%PDF-1\.[0-4]')
+
+_CONTENT_TOKEN_RE = re.compile(rb'''
+    \((?:\\.|[^\\()]|\((?:\\.|[^\\()])*\))*\)   # string, with one level of balanced parentheses
+    | <<|>>|<[0-9A-Fa-f\s]*>|\[|\]              # dictionary and array brackets, hex string
+    | /[^\s/<>\[\]()%{}]*                       # name
+    | %[^\r\n]*                                 # comment
+    | [^\s/<>\[\]()%{}]+                        # number, keyword or operator
+''', re.X)
+
+# Operators setting one part of the graphics state, by the part they set
+_STATE_OPERATORS = {
+    b'Tf': b'Tf', b'TL': b'TL', b'Tc': b'Tc', b'Tw': b'Tw', b'Tz': b'Tz', b'Ts': b'Ts', b'Tr': b'Tr',
+    b'w': b'w', b'J': b'J', b'j': b'j', b'M': b'M', b'd': b'd', b'ri': b'ri', b'i': b'i',
+    b'g': b'fill', b'rg': b'fill', b'k': b'fill', b'G': b'stroke', b'RG': b'stroke', b'K': b'stroke',
+}
+_ALL_STATE = frozenset(_STATE_OPERATORS.values())
+
+# Operators that change state the table above cannot follow, and the parts they leave unknown
+_UNTRACKED_WRITERS = {
+    b'cs': {b'fill'}, b'sc': {b'fill'}, b'scn': {b'fill'},
+    b'CS': {b'stroke'}, b'SC': {b'stroke'}, b'SCN': {b'stroke'},
+    b'TD': {b'TL'}, b'"': {b'Tw', b'Tc'}, b'gs': _ALL_STATE,
+}
+# Those of them that draw nothing
+_UNTRACKED_STATE = {b'cs', b'sc', b'scn', b'CS', b'SC', b'SCN', b'TD', b'gs'}
+
+_TEXT_STATE = frozenset({b'Tf', b'TL', b'Tc', b'Tw', b'Tz', b'Ts', b'Tr'})
+_NO_STATE = frozenset()
+
+# The parts of that state other operators read; any operator not listed may read all of it
+_READS = {
+    **{operator: _NO_STATE for operator in (b'm', b'l', b'c', b'v', b'y', b'h', b're', b'n', b'W', b'W*',
+                                            b'BT', b'ET', b'Td', b'Tm', b'cm')},
+    **{operator: _ALL_STATE - _TEXT_STATE for operator in (b'S', b's', b'f', b'F', b'f*', b'B', b'B*',
+                                                          b'b', b'b*', b'sh')},
+    b'Tj': _ALL_STATE - {b'TL'}, b'TJ': _ALL_STATE - {b'TL'}, b'T*': frozenset({b'TL'}),
+}
+
+_IDENTITY_CM = ([b'1', b'0', b'0', b'1', b'0', b'0'], b'cm')
+
+
+def _operations(content):
+    """(operands, operator) pairs of a content stream, or None if it has inline images"""
+    operations = []
+    operands = []
+    depth = 0
+    for match in _CONTENT_TOKEN_RE.finditer(content):
+        token = match.group()
+        if token[:1] == b'%':
+            continue
+        if token in (b'[', b'<<'):
+            depth += 1
+        elif token in (b']', b'>>'):
+            depth -= 1
+        elif depth == 0 and (token[:1].isalpha() or token in (b"'", b'"')) \
+                and token not in (b'true', b'false', b'null'):
+            if token == b'BI':
+                return None
+            operations.append((operands, token))
+            operands = []
+            continue
+        operands.append(token)
+    return operations
+
+
+def _drop_repeated_state(operations):
+    """Operations without state changes that set the value already in effect, or an identity cm"""
+    kept = []
+    state = {}
+    saved = []
+    for operands, operator in operations:
+        part = _STATE_OPERATORS.get(operator)
+        if part is not None:
+            value = (operator, operands)
+            if state.get(part) == value:
+                continue
+            state[part] = value
+        elif operator == b'q':
+            saved.append(dict(state))
+        elif operator == b'Q':
+            state = saved.pop() if saved else {}
+        elif operator in _UNTRACKED_WRITERS:
+            for unknown in _UNTRACKED_WRITERS[operator]:
+                state.pop(unknown, None)
+        elif (operands, operator) == _IDENTITY_CM:
+            continue
+        kept.append((operands, operator))
+    return kept
+
+
+def _drop_unused_state(operations, live_at_end):
+    """
+    Operations without state changes that nothing reads before they are replaced or restored
+
+    Works backwards: a part of the state is live while some later operation
+    may read it, and a q ... Q block only passes on what is read inside it.
+    """
+    kept = []
+    live = set(live_at_end)
+    outside = []
+    for operands, operator in reversed(operations):
+        part = _STATE_OPERATORS.get(operator)
+        if part is not None:
+            if part not in live:
+                continue
+            live.discard(part)
+        elif operator == b'Q':
+            outside.append(live)
+            live = set()
+        elif operator == b'q':
+            live = live | outside.pop() if outside else set(_ALL_STATE)
+        else:
+            live |= _READS.get(operator, _ALL_STATE)
+        kept.append((operands, operator))
+    kept.reverse()
+    return kept
+
+
+def _drop_empty_blocks(operations):
+    """
+    Operations without q ... Q blocks that draw nothing, and empty BT ET pairs
+
+    Q restores whatever a block changed, so a block of only state changes,
+    transforms and unpainted paths has no effect.
+    """
+    kept = []
+    blocks = []
+    for operands, operator in operations:
+        if operator == b'q':
+            blocks.append(len(kept))
+        elif operator == b'Q' and blocks:
+            start = blocks.pop()
+            if all(_READS.get(inner) == _NO_STATE or inner in _STATE_OPERATORS or inner in _UNTRACKED_STATE
+                   for _, inner in kept[start + 1:]):
+                del kept[start:]
+                continue
+        elif operator == b'ET' and kept and kept[-1][1] == b'BT':
+            kept.pop()
+            continue
+        kept.append((operands, operator))
+    return kept
+
+
+def minimize_content(content, followed=False):
+    """
+    content, a decoded content stream, without operators that change nothing drawn
+
+    followed is set for a stream that another of the page's content streams
+    continues, so the state it leaves behind is still read.
+    """
+    operations = _operations(content)
+    if operations is None:
+        return content
+    operations = _drop_repeated_state(operations)
+    operations = _drop_unused_state(operations, _ALL_STATE if followed else ())
+    operations = _drop_empty_blocks(operations)
+    return b''.join(b' '.join(operands + [operator]) + b'\n' for operands, operator in operations)
+
+
+def _content_streams(objects, page_order):
+    """{number: followed} for each page content stream and form XObject"""
+    streams = {number: False for number, (dictionary, stream) in objects.items()
+               if stream and _FORM_RE.search(dictionary)}
+    for page in page_order:
+        match = _CONTENTS_RE.search(objects[page][0])
+        if match is None:
+            continue
+        numbers = [int(number) for number in REF_RE.findall(match.group(1))]
+        for index, number in enumerate(numbers):
+            streams[number] = streams.get(number, False) or index < len(numbers) - 1
+    return streams
+
+
+def _rewrite_stream(dictionary, stream, profile, content=None):
+    """
+    (dictionary, stream) of one stream object after the profile's changes
+
+    content is None for a stream that is not drawn as content, or whether
+    another content stream follows it.
+    """
+    filter_match = _FILTER_RE.search(dictionary)
+    filters = re.findall(rb'/(\w+)', filter_match.group(1)) if filter_match else []
+    if b'/DecodeParms' in dictionary and len(filters) > 1:
+        return dictionary, stream
+    start = stream.index(b'stream') + 6
+    start += 2 if stream[start:start + 2] == b'\r\n' else 1
+    data = stream[start:start + int(_LENGTH_RE.search(dictionary).group(1))]
+
+    if filters[:1] == [b'ASCII85Decode']:
+        data = base64.a85decode(data, adobe=True)
+        filters = filters[1:]
+    if not filters:
+        raw = data
+    elif filters == [b'FlateDecode'] and (profile['recompress'] or (profile['minimize'] and content is not None)):
+        raw = zlib.decompress(data)
+    else:
+        raw = None
+    if raw is not None:
+        if profile['minimize'] and content is not None:
+            raw = minimize_content(raw, content)
+        data = zlib.compress(raw, profile['level'])
+        filters = [b'FlateDecode']
+
+    if filter_match:
+        dictionary = dictionary[:filter_match.start()] + dictionary[filter_match.end():]
+    if filters:
+        names = b' '.join(b'/' + name for name in filters)
+        dictionary = dictionary[:2] + b' /Filter ' + (names if len(filters) == 1 else b'[ %s ]' % names) \
+            + dictionary[2:]
+    dictionary = _LENGTH_RE.sub(b'/Length %d' % len(data), dictionary, 1)
+    return dictionary, b'\nstream\n' + data + b'\nendstream'
+
+
+def _xref_stream(entries, number, root, info, identifier, level):
+    """An xref stream object for entries of (type, field 2, field 3), PNG Up predicted"""
+    widths = [1] + [max(1, (max(entry[index] for entry in entries).bit_length() + 7) // 8) for index in (1, 2)]
+    rows = [b''.join(value.to_bytes(width, 'big') for value, width in zip(entry, widths)) for entry in entries]
+    predicted = bytearray()
+    previous = bytes(sum(widths))
+    for row in rows:
+        predicted.append(2)
+        predicted.extend((byte - above) & 0xFF for byte, above in zip(row, previous))
+        previous = row
+    data = zlib.compress(bytes(predicted), level)
+    return (b'%d 0 obj\n<< /Type /XRef /Size %d /W [ %d %d %d ] /Root %d 0 R /Info %d 0 R%s '
+            b'/Filter /FlateDecode /DecodeParms << /Columns %d /Predictor 12 >> /Length %d >>\n'
+            b'stream\n%s\nendstream\nendobj\n') % (
+        number, len(entries), *widths, root, info, b' /ID ' + identifier if identifier else b'',
+        sum(widths), len(data), data)
+
+
+def optimize(pdf, profile, file=None, object_streams=True):
+    """
+    A smaller copy of the ReportLab PDF bytes pdf, written to file or a new BytesIO
+
+    profile is a name in PROFILES. With object_streams, objects other than
+    streams are packed into compressed object streams listed in an xref
+    stream, which needs PDF 1.5; without, the plain xref table is kept, as
+    linearize() expects.
+    """
+    settings = PROFILES[profile]
+    objects, root, info, _, page_order = read_pdf(pdf)
+    contents = _content_streams(objects, page_order)
+    for number, (dictionary, stream) in objects.items():
+        if stream:
+            objects[number] = _rewrite_stream(dictionary, stream, settings, contents.get(number))
+
+    header = pdf[:pdf.rindex(b'\n', 0, pdf.index(b' 0 obj')) + 1]
+    identifier = document_id(pdf)
+    output = io.BytesIO()
+    size = max(objects) + 1
+    if object_streams:
+        output.write(_VERSION_RE.sub(b'%PDF-1.5', header))
+        entries = [(0, 0, 0xFFFF)] + [(0, 0, 0)] * (size - 1)
+        packed = [number for number in sorted(objects) if not objects[number][1]]
+        for number in sorted(objects):
+            if objects[number][1]:
+                entries[number] = (1, output.tell(), 0)
+                output.write(b'%d 0 obj\n%s%s\nendobj\n' % (number, *objects[number]))
+        for first in range(0, len(packed), OBJECTS_PER_STREAM):
+            chunk = packed[first:first + OBJECTS_PER_STREAM]
+            bodies = [objects[number][0] + b'\n' for number in chunk]
+            offsets = [0]
+            for body in bodies[:-1]:
+                offsets.append(offsets[-1] + len(body))
+            index = b' '.join(b'%d %d' % pair for pair in zip(chunk, offsets)) + b'\n'
+            data = zlib.compress(index + b''.join(bodies), settings['level'])
+            entries.append((1, output.tell(), 0))
+            for position, number in enumerate(chunk):
+                entries[number] = (2, len(entries) - 1, position)
+            output.write(b'%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\n'
+                         b'stream\n%s\nendstream\nendobj\n' % (len(entries) - 1, len(chunk), len(index),
+                                                              len(data), data))
+        xref = output.tell()
+        entries.append((1, xref, 0))
+        output.write(_xref_stream(entries, len(entries) - 1, root, info, identifier, settings['level']))
+    else:
+        output.write(header)
+        offsets = [None] * size
+        for number in sorted(objects):
+            offsets[number] = output.tell()
+            output.write(b'%d 0 obj\n%s%s\nendobj\n' % (number, *objects[number]))
+        xref = output.tell()
+        output.write(b'xref\n0 %d\n0000000000 65535 f \n' % size)
+        output.write(b''.join(b'0000000000 65535 f \n' if offset is None else b'%010d 00000 n \n' % offset
+                              for offset in offsets[1:]))
+        output.write(b'trailer\n<< /Info %d 0 R /Root %d 0 R /Size %d%s >>\n' % (
+            info, root, size, b' /ID ' + identifier if identifier else b''))
+    output.write(b'startxref\n%d\n%%%%EOF\n' % xref)
+
+    logger.info('PDF optimized: profile=%s size_bytes=%d saved_bytes=%d',
+                profile, output.tell(), len(pdf) - output.tell())
+    if file is None:
+        output.seek(0)
+        return output
+    file.write(output.getbuffer())
+    return file
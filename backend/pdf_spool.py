@@ -0,0 +1,106 @@
+"""
+Spooled PDF output for Davinci Document Creator
+Moves large PDFs to temp files as they are written, so they are served from disk rather than memory
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+# PDFs up to this size are kept in memory; larger ones go to a temp file
+PDF_SPOOL_BYTES = int(os.environ.get('PDF_SPOOL_BYTES', 8 * 1024 * 1024))
+
+# Where spooled PDFs are written; each is deleted once opened for sending
+PDF_SPOOL_DIR = os.environ.get('PDF_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'davinci-spool'))
+
+
+class SpooledPDF:
+    """
+    A rendered PDF: its bytes, or the path of the temp file holding it
+
+    Small enough to send back from a render worker either way. etag is the
+    one PDFCache.put gives the same bytes.
+    """
+
+    def __init__(self, data, path, size, etag):
+        self.data = data
+        self.path = path
+        self.size = size
+        self.etag = etag
+
+    def read(self):
+        """The PDF bytes, read from the temp file if it was spooled"""
+        if self.path is None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def discard(self):
+        """Delete the temp file, if any; an open copy stays readable until closed"""
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class PDFSpool:
+    """
+    A write-only file to render a PDF into
+
+    Data is kept in memory until the PDF passes threshold, then it all goes
+    to a temp file in directory. finish() returns the SpooledPDF.
+    """
+
+    def __init__(self, threshold=None, directory=None):
+        self.threshold = PDF_SPOOL_BYTES if threshold is None else threshold
+        self.directory = directory or PDF_SPOOL_DIR
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._size = 0
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self._digest.update(data)
+        if self._file is None and self._size + len(data) > self.threshold:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = tempfile.NamedTemporaryFile(
+                dir=self.directory, prefix='pdf-', suffix='.pdf', delete=False
+            )
+            with self._buffer.getbuffer() as written:
+                self._file.write(written)
+            self._buffer = None
+        (self._buffer if self._file is None else self._file).write(data)
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        etag = self._digest.hexdigest()[:32]
+        if self._file is None:
+            return SpooledPDF(self._buffer.getvalue(), None, self._size, etag)
+        self._file.close()
+        return SpooledPDF(None, self._file.name, self._size, etag)
+
+
+def remove_stale(max_age, directory=None):
+    """Delete spooled PDFs older than max_age seconds, left by renders that never finished"""
+    directory = directory or PDF_SPOOL_DIR
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.startswith('pdf-') and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
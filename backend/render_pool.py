@@ -0,0 +1,249 @@
+"""
+Render pool for Davinci Document Creator
+Runs PDF renders in worker processes behind a bounded queue
+"""
+
+import atexit
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+# Render processes per server process; 0 renders in the request thread
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 2))
+
+# Renders that may wait for a free worker; past that requests are turned away
+RENDER_QUEUE_SIZE = int(os.environ.get('RENDER_QUEUE_SIZE', 4))
+
+# Markdown shorter than this renders in the request thread: it is quicker
+# than the trip to a worker, and must not queue behind long documents
+RENDER_INLINE_CHARS = int(os.environ.get('RENDER_INLINE_CHARS', 10000))
+
+# Seconds a render may run (and, separately, wait) before it is given up on
+RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', 120))
+
+
+class RenderPoolFull(Exception):
+    """Every worker is busy and the queue is full; retry_after is in seconds"""
+
+    def __init__(self, retry_after):
+        Exception.__init__(self, f"Render queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderTimeout(Exception):
+    """A render ran past the pool's timeout; its worker was stopped"""
+
+
+def _serve(connection, cleanup):
+    """Worker process loop: run each (function, args) received and send back the outcome"""
+    # A group of its own, so stopping the worker also stops any processes
+    # its renders started
+    os.setpgrp()
+    try:
+        while True:
+            try:
+                job = connection.recv()
+            except EOFError:
+                return
+            if job is None:
+                return
+            function, args = job
+            try:
+                outcome = (True, function(*args))
+            except Exception as e:
+                outcome = (False, e)
+            try:
+                connection.send(outcome)
+            except Exception as e:
+                # The result or exception could not be pickled
+                connection.send((False, RuntimeError(f"Render failed: {e!r}")))
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+
+class _Worker:
+    """One render process and the pipe to it"""
+
+    def __init__(self, context, cleanup=None):
+        self.connection, child = context.Pipe()
+        # Not a daemon, so a render can still use parallel_sections' pool
+        self.process = context.Process(target=_serve, args=(child, cleanup), name='render-worker')
+        self.process.start()
+        child.close()
+
+    def stop(self, graceful=False):
+        if graceful:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.join()
+        self.connection.close()
+
+
+class RenderPool:
+    """
+    Worker processes for renders, with a bounded queue and a per-job timeout
+
+    Renders are CPU bound and can take minutes, so they run outside the web
+    server's threads. At most workers renders run at once and queue_size more
+    wait; run() turns further requests away at once with RenderPoolFull. A
+    render that runs past timeout raises RenderTimeout, and its worker is
+    stopped and replaced. Workers start on first use from a fork server
+    rather than the threaded web server, whose locks another thread may
+    hold as it forks; the fork server imports the preload modules once, so
+    workers start with fonts and templates already loaded. cleanup is called
+    in a worker as it exits. Functions run in workers must be importable
+    without side effects.
+    """
+
+    def __init__(self, workers=RENDER_WORKERS, queue_size=RENDER_QUEUE_SIZE, timeout=RENDER_TIMEOUT,
+                 cleanup=None, preload=()):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.cleanup = cleanup
+        self._context = multiprocessing.get_context('forkserver')
+        if preload:
+            self._context.set_forkserver_preload(list(preload))
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._idle = queue.Queue()
+        self._all = set()
+        self._lock = threading.Lock()
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.render_seconds = 0.0
+        atexit.register(self.shutdown)
+
+    def _take(self):
+        with self._lock:
+            if len(self._all) < self.workers:
+                worker = _Worker(self._context, self.cleanup)
+                self._all.add(worker)
+                return worker
+        return self._idle.get(timeout=self.timeout)
+
+    def _discard(self, worker):
+        """Stop worker, and start another in its place if a render is waiting for one"""
+        replacement = None
+        with self._lock:
+            self._all.discard(worker)
+            # A render waiting in _take would otherwise not see the free slot
+            if self.queued and len(self._all) < self.workers:
+                replacement = _Worker(self._context, self.cleanup)
+                self._all.add(replacement)
+        worker.stop()
+        if replacement is not None:
+            self._idle.put(replacement)
+
+    def retry_after(self):
+        """Seconds until a worker is likely to be free, from the average render time"""
+        with self._lock:
+            finished = self.completed + self.failed
+            average = self.render_seconds / finished if finished else 1.0
+            backlog = self.running + self.queued
+        return max(1, math.ceil(average * backlog / max(self.workers, 1)))
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        return RenderPoolFull(self.retry_after())
+
+    def run(self, function, *args):
+        """function(*args) in a worker process; its exceptions are raised here"""
+        if not self.workers:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            raise self._reject()
+        try:
+            queued_at = time.monotonic()
+            with self._lock:
+                self.queued += 1
+            try:
+                worker = self._take()
+            except queue.Empty:
+                raise self._reject()
+            finally:
+                with self._lock:
+                    self.queued -= 1
+
+            started = time.monotonic()
+            with self._lock:
+                self.running += 1
+                self.wait_seconds += started - queued_at
+                self.max_wait_seconds = max(self.max_wait_seconds, started - queued_at)
+            ok = timed_out = False
+            try:
+                worker.connection.send((function, args))
+                if not worker.connection.poll(self.timeout):
+                    self._discard(worker)
+                    worker = None
+                    timed_out = True
+                    raise RenderTimeout(f"Render took longer than {self.timeout:g}s")
+                ok, value = worker.connection.recv()
+            except (EOFError, OSError):
+                # The worker died mid-render, e.g. killed for memory
+                self._discard(worker)
+                worker = None
+                raise RuntimeError("Render worker exited unexpectedly")
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    if timed_out:
+                        self.timeouts += 1
+                    else:
+                        self.render_seconds += time.monotonic() - started
+                        if ok:
+                            self.completed += 1
+                        else:
+                            self.failed += 1
+                if worker is not None:
+                    self._idle.put(worker)
+            if not ok:
+                raise value
+            return value
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            started = self.completed + self.failed + self.timeouts
+            finished = self.completed + self.failed
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'running': self.running,
+                'queued': self.queued,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.wait_seconds / started * 1000, 1) if started else 0.0,
+                'max_wait_ms': round(self.max_wait_seconds * 1000, 1),
+                'avg_render_ms': round(self.render_seconds / finished * 1000, 1) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        """Stop the idle workers; renders still running are killed"""
+        with self._lock:
+            workers = list(self._all)
+            self._all.clear()
+        for worker in workers:
+            worker.stop(graceful=True)
+        self._idle = queue.Queue()
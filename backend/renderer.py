@@ -0,0 +1,813 @@
+"""
+Document rendering for Davinci Document Creator
+Markdown to branded PDF, with no web server or sign-in: used by app.py and the convert command
+"""
+import markdown2
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch, cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image as RLImage, Table, TableStyle
+from reportlab.lib import colors
+from reportlab.pdfgen import canvas
+from svglib.svglib import svg2rlg
+from reportlab.graphics import renderPDF
+from reportlab.platypus.flowables import Flowable
+import reportlab.rl_config
+reportlab.rl_config.warnOnMissingFontGlyphs = 0
+import io
+import os
+from datetime import datetime
+from html.parser import HTMLParser
+import logging
+from brand_assets import BrandAssets
+from page_templates import Prebuilt, PrerenderedDrawing, templates
+from embedded_images import DocumentImages
+from page_compression import compress_pages
+import parallel_sections
+from pdf_linearize import linearize
+from pdf_optimize import PDF_OPTIMIZE, optimize
+from pdf_spool import PDFSpool
+from themes import get_theme
+from markdown_compiler import (
+    UnsupportedMarkdown, preprocess_markdown, compile_markdown, compare_stories,
+    paragraph_flowable, hr_flowable, code_flowables, image_flowables, table_flowables
+)
+
+logger = logging.getLogger(__name__)
+
+# Logos and fonts, resolved and read once; changed logos are reloaded
+brand_assets = BrandAssets(check_interval=int(os.environ.get('ASSET_CHECK_INTERVAL', 30))).load()
+
+# Register NotoSans fonts for Unicode support
+try:
+    brand_assets.register_fonts()
+    # Register italic variants if available, or just map to regular for now to prevent crashes
+    # Ideally we would download Italic too, but Regular/Bold covers 99% of use cases
+except Exception as e:
+    # CRITICAL: Fonts are required for PDF generation. Log generic error if they fail.
+    logger.error(f"CRITICAL: Failed to load NotoSans fonts: {e}. PDF generation may fail or look incorrect.")
+    # Fallback map if load fails (though we downloaded them)
+    pass
+
+# Compile the default theme once at startup rather than on the first request
+get_theme()
+
+# Markdown front end: 'ast' (compiler with HTML fallback), 'html' or 'conformance'
+MARKDOWN_FRONTEND = os.environ.get('MARKDOWN_FRONTEND', 'ast').lower()
+
+# Brand colours drawn on every page
+DAVINCI_BLUE = colors.HexColor('#0B98CE')
+DAVINCI_GREY = colors.HexColor('#494949')
+DAVINCI_STONE = colors.HexColor('#7A879C')  # light grey for the disclaimer
+
+class NumberedCanvas(canvas.Canvas):
+    """
+    Canvas that adds the letterhead, footer and "Page N of M" to each page
+
+    The letterhead, logo and disclaimer are the same on every page, so they
+    are drawn once into a form XObject that each page references. The total
+    page count is only known at save time, so each page gets a placeholder
+    line that save() replaces with its label.
+    """
+    PAGE_NUMBER_SLOT = '% page number'
+    PAGE_CHROME_FORM = 'pageChrome'
+
+    def __init__(self, *args, **kwargs):
+        # Extract custom parameters before passing to Canvas
+        self.logo_path = kwargs.pop('logo_path', None)
+        self.logo_image = kwargs.pop('logo_image', None)
+        self.letterhead = kwargs.pop('letterhead', None)
+        self.disclaimer = kwargs.pop('disclaimer', None)
+        self.has_title_page = kwargs.pop('has_title_page', False)
+
+        canvas.Canvas.__init__(self, *args, **kwargs)
+        self.current_page_number = 1
+        self.total_pages = 0
+
+    def showPage(self):
+        # Title page - no numbering, header, or footer
+        if not (self.has_title_page and self.getPageNumber() == 1):
+            self._code.append(self.PAGE_NUMBER_SLOT)
+            self.saveState()
+            self.doForm(self.PAGE_CHROME_FORM)
+            self.restoreState()
+        canvas.Canvas.showPage(self)
+
+    def save(self):
+        pages = self._doc.Pages.pages
+        # If title page exists, the first content page is still "Page 1"
+        numbered_pages = pages[1:] if self.has_title_page else pages
+        self.total_pages = len(numbered_pages)
+
+        for page_number, page in enumerate(numbered_pages, 1):
+            self.current_page_number = page_number
+            start = len(self._code)
+            self.draw_page_number()
+            label = '\n'.join(self._code[start:])
+            del self._code[start:]
+            # The slot is the last one on the page; body text may contain the same words
+            head, _, tail = page.stream.rpartition(self.PAGE_NUMBER_SLOT)
+            page.stream = head + label + tail
+
+        if numbered_pages:
+            self.beginForm(self.PAGE_CHROME_FORM)
+            self.draw_header()
+            self.draw_footer()
+            self.endForm()
+        compress_pages(self)
+        canvas.Canvas.save(self)
+
+    def draw_page_number(self):
+        self.saveState()
+        self.setFont("NotoSans", 9)
+        self.setFillColor(DAVINCI_GREY)
+        self.drawRightString(
+            letter[0] - inch * 0.75, 
+            inch * 0.5,
+            f"Page {self.current_page_number} of {self.total_pages}"
+        )
+        self.restoreState()
+
+    def draw_header(self):
+        self.saveState()
+        
+        # Logo on top right per branding guidelines (horizontal version, size S: 3.5cm x 1.05cm)
+        logo = self.logo_image
+        if logo is None and self.logo_path and os.path.exists(self.logo_path):
+            logo = self.logo_path
+        if logo is not None:
+            try:
+                self.drawImage(
+                    logo,
+                    letter[0] - (3.5 * cm) - inch * 0.75,  # Right aligned with margin
+                    letter[1] - (1.05 * cm) - inch * 0.5,  # Top aligned with space
+                    width=3.5 * cm,  # Size S from branding guidelines
+                    height=1.05 * cm,
+                    preserveAspectRatio=True,
+                    mask='auto'
+                )
+            except:
+                pass
+        
+        # Letterhead on top left - using Davinci Blue color
+        if self.letterhead:
+            self.setFont("NotoSans-Bold", 12)
+            self.setFillColor(DAVINCI_BLUE)
+            self.drawString(inch * 0.75, letter[1] - inch * 0.75, self.letterhead['company'])
+            self.setFont("NotoSans", 9)
+            self.setFillColor(DAVINCI_GREY)
+            self.drawString(inch * 0.75, letter[1] - inch * 0.95, self.letterhead.get('address', ''))
+            self.drawString(inch * 0.75, letter[1] - inch * 1.1, self.letterhead.get('phone', ''))
+            if self.letterhead.get('email'):
+                self.drawString(inch * 0.75, letter[1] - inch * 1.25, self.letterhead.get('email', ''))
+        
+        self.restoreState()
+
+    def draw_footer(self):
+        self.saveState()
+        
+        # Disclaimer in bottom center
+        if self.disclaimer:
+            self.setFont("NotoSans", 8)
+            self.setFillColor(DAVINCI_STONE)
+            text_width = self.stringWidth(self.disclaimer, "NotoSans", 8)
+            self.drawString(
+                (letter[0] - text_width) / 2,
+                inch * 0.3,
+                self.disclaimer
+            )
+        
+        self.restoreState()
+
+class HTMLToReportLab(HTMLParser):
+    """Convert HTML to ReportLab flowables"""
+    def __init__(self, styles, images=None):
+        super().__init__()
+        self.story = []
+        self.styles = styles
+        self.images = images if images is not None else DocumentImages()
+        self.current_text = []
+        self.current_style = 'CustomBody'
+        self.list_depth = 0
+        self.list_type_stack = [] # Stack to track 'ul' or 'ol'
+        self.list_counters = []   # Stack to track counters for 'ol'
+        
+        self.in_table = False
+        self.table_data = []
+        self.table_row = []
+        self.in_cell = False
+        
+        self.in_pre = False
+        
+        self.in_bold = False
+        self.in_italic = False
+        self.in_link = False
+        self.link_href = None
+        self.in_blockquote = False
+        self.last_was_metadata = False
+        
+    def handle_starttag(self, tag, attrs):
+        # Flush any accumulated text before handling new tag
+        if self.current_text and tag not in ['strong', 'em', 'b', 'i', 'code', 'a', 'td', 'th', 'br'] and not self.in_cell and not self.in_pre:
+            self._flush_text()
+
+        if tag == 'h1':
+            self.current_style = 'CustomHeading1'
+        elif tag == 'h2':
+            self.current_style = 'CustomHeading2'
+        elif tag == 'h3':
+            self.current_style = 'CustomHeading3'
+        elif tag == 'p':
+            if not self.in_table: # Don't reset style inside tables
+                self.current_style = 'CustomBody'
+        elif tag == 'ul':
+            self.list_depth += 1
+            self.list_type_stack.append('ul')
+            self.list_counters.append(0)
+        elif tag == 'ol':
+            self.list_depth += 1
+            self.list_type_stack.append('ol')
+            self.list_counters.append(0)
+        elif tag == 'li':
+            # Determine list type and increment counter if needed
+            if self.list_type_stack:
+                list_type = self.list_type_stack[-1]
+                if list_type == 'ol':
+                    self.list_counters[-1] += 1
+                    number = f"{self.list_counters[-1]}."
+                    self.current_text.append(f'{number} ')
+                else:
+                    self.current_text.append('• ')
+            else:
+                self.current_text.append('• ') # Fallback
+            
+            # Set style to BulletText but we'll manually adjust indent in _flush_text or by creating a custom style on the fly
+            self.current_style = 'BulletText'
+            
+        elif tag == 'hr':
+            self.story.append(hr_flowable())
+        elif tag == 'table':
+            self.in_table = True
+            self.table_data = []
+        elif tag == 'tr' and self.in_table:
+            self.table_row = []
+        elif tag in ['td', 'th'] and self.in_table:
+            self.in_cell = True
+            self.current_text = []
+        elif tag == 'a':
+            if not self.in_link:
+                self.in_link = True
+                href = None
+                for attr_name, attr_value in attrs:
+                    if attr_name == 'href':
+                        href = attr_value
+                        break
+                if href:
+                    self.link_href = href
+                    self.current_text.append(f'<link href="{href}" color="blue"><u>')
+        elif tag in ['strong', 'b']:
+            if not self.in_bold:
+                self.in_bold = True
+                self.current_text.append('<b>')
+        elif tag in ['em', 'i']:
+            if not self.in_italic:
+                self.in_italic = True
+                self.current_text.append('<i>')
+        elif tag == 'pre':
+            self.in_pre = True
+            self._flush_text() # Ensure previous text is saved
+        elif tag == 'code':
+            if not self.in_pre:
+                # Inline code
+                self.current_text.append('<font name="Courier" backColor="#F5F5F5">')
+        elif tag == 'br':
+            self.current_text.append('<br/>')
+        elif tag == 'blockquote':
+            self.in_blockquote = True
+            self.current_style = 'BlockQuote'
+            
+        # Image handling (same as before)
+        elif tag == 'img':
+            src = None
+            alt = ''
+            width = None
+            height = None
+            for attr_name, attr_value in attrs:
+                if attr_name == 'src': src = attr_value
+                elif attr_name == 'alt': alt = attr_value
+                elif attr_name == 'width':
+                    try: width = float(attr_value)
+                    except: pass
+                elif attr_name == 'height':
+                    try: height = float(attr_value)
+                    except: pass
+            
+            if src:
+                if self.current_text: self._flush_text()
+                self.story.extend(image_flowables(src, alt, self.styles, width, height, self.images))
+
+    def handle_endtag(self, tag):
+        if tag in ['h1', 'h2', 'h3', 'p']:
+            self._flush_text()
+            self.current_style = 'CustomBody'
+        elif tag == 'li':
+            self._flush_text()
+            # Don't reset style yet, might be in nested list
+        elif tag == 'blockquote':
+            self._flush_text()
+            self.in_blockquote = False
+            self.current_style = 'CustomBody'
+        elif tag == 'a':
+            if self.in_link:
+                self.in_link = False
+                self.current_text.append('</u></link>')
+        elif tag == 'ul' or tag == 'ol':
+            if self.list_depth > 0:
+                self.list_depth -= 1
+                if self.list_type_stack: self.list_type_stack.pop()
+                if self.list_counters: self.list_counters.pop()
+        elif tag == 'table':
+            self.in_table = False
+            if self.table_data:
+                self._process_table()
+        elif tag == 'tr':
+            if self.table_row:
+                self.table_data.append(self.table_row)
+                self.table_row = []
+        elif tag in ['td', 'th']:
+            text = ''.join(self.current_text).strip()
+            # Remove empty formatting tags
+            text = text.replace('<b></b>', '').replace('<i></i>', '')
+            self.table_row.append(text)
+            self.current_text = []
+            self.in_cell = False
+        elif tag in ['strong', 'b']:
+            if self.in_bold:
+                self.in_bold = False
+                self.current_text.append('</b>')
+        elif tag in ['em', 'i']:
+            if self.in_italic:
+                self.in_italic = False
+                self.current_text.append('</i>')
+        elif tag == 'pre':
+            self.in_pre = False
+            text = ''.join(self.current_text) # Preserve whitespace
+            self.current_text = []
+            self.story.extend(code_flowables(text, self.styles))
+        elif tag == 'code':
+            if not self.in_pre:
+                self.current_text.append('</font>')
+
+    def handle_data(self, data):
+        if self.in_pre:
+            self.current_text.append(data) # Preserve exact characters including newlines
+        elif self.in_cell:
+            self.current_text.append(data)
+        elif self.in_table:
+            pass # Skip whitespace between tr/td
+        elif data.strip() or self.current_text: # Add if content or if we already have content (space)
+             # Collapse whitespace for normal text
+             if not self.in_pre:
+                 self.current_text.append(data)
+
+    def _process_table(self):
+        # Robust table creation using Paragraphs for all cells
+        self.story.extend(table_flowables(self.table_data, self.styles))
+
+    def _flush_text(self):
+        if self.current_text:
+            text = ''.join(self.current_text).strip()
+            if text:
+                # Auto-close open tags to prevent ReportLab crashes
+                if self.in_bold: text += '</b>'
+                if self.in_italic: text += '</i>'
+                if self.in_link: text += '</u></link>'
+                
+                self.story.append(paragraph_flowable(text, self.current_style, self.styles, self.list_depth))
+
+        # Reset open tag state since we've flushed the paragraph
+        self.in_bold = False
+        self.in_italic = False
+        self.in_link = False
+        self.current_text = []
+        
+    def get_story(self):
+        self._flush_text()
+        return self.story
+
+class SVGFlowable(Flowable):
+    """Custom flowable to render SVG graphics in ReportLab PDFs"""
+    def __init__(self, svg_path, width=None, height=None, drawing=None):
+        Flowable.__init__(self)
+        self.svg_path = svg_path
+        # A pre-parsed drawing is scaled in place, so pass a copy
+        self.drawing = drawing if drawing is not None else svg2rlg(svg_path)
+
+        if self.drawing:
+            # Get original dimensions
+            orig_width = self.drawing.width
+            orig_height = self.drawing.height
+            aspect_ratio = orig_height / orig_width
+
+            # Calculate dimensions
+            if width and not height:
+                self.width = width
+                self.height = width * aspect_ratio
+            elif height and not width:
+                self.height = height
+                self.width = height / aspect_ratio
+            elif width and height:
+                self.width = width
+                self.height = height
+            else:
+                self.width = orig_width
+                self.height = orig_height
+
+            # Scale the drawing
+            scale_x = self.width / orig_width
+            scale_y = self.height / orig_height
+            self.drawing.width = self.width
+            self.drawing.height = self.height
+            self.drawing.scale(scale_x, scale_y)
+        else:
+            self.width = 0
+            self.height = 0
+
+    def draw(self):
+        if self.drawing:
+            renderPDF.draw(self.drawing, self.canv, 0, 0)
+
+def build_title_logo(logo_asset):
+    """Title page logo at 12cm wide, as a template shared across documents"""
+    if logo_asset.is_svg:
+        logo = SVGFlowable(logo_asset.path, width=12*cm, drawing=logo_asset.drawing())
+        if not logo.drawing:
+            return None
+        return PrerenderedDrawing(logo.drawing, logo.width, logo.height)
+
+    logo = RLImage(io.BytesIO(logo_asset.data), width=12*cm, height=3.6*cm, kind='proportional')
+    logo.hAlign = 'CENTER'
+    return Prebuilt(logo)
+
+def create_title_page(config, styles, document_title):
+    """Create a professional title page with company logo and document info"""
+    story = []
+
+    # Add large vertical spacer to center content
+    story.append(Spacer(1, 2.5 * inch))
+
+    # Company logo, side-by-side version (SVG preferred over PNG)
+    logo_asset = brand_assets.get('title_logo')
+    if logo_asset:
+        try:
+            logo = templates.get('title_logo', lambda: build_title_logo(logo_asset), version=logo_asset.digest)
+            if logo:
+                story.append(logo.instance())
+                story.append(Spacer(1, 0.75 * inch))
+        except Exception:
+            pass
+
+    story.append(Paragraph(document_title or 'Document', styles['TitlePageTitle']))
+
+    story.append(Spacer(1, 0.5 * inch))
+
+    letterhead = config.get('letterhead', {})
+    company_name = letterhead.get('company', 'Davinci AI Solutions')
+    story.append(Paragraph(company_name, styles['TitlePageCompany']))
+
+    story.append(Spacer(1, 0.3 * inch))
+
+    current_date = datetime.now().strftime('%B %d, %Y')
+    story.append(Paragraph(current_date, styles['TitlePageDate']))
+
+    story.append(PageBreak())
+
+    return story
+
+def build_signature_page(styles):
+    """Signature page flowables; nothing on the page varies per document"""
+    preamble_text = (
+        "By signing below, you acknowledge that you have reviewed this document "
+        "and agree with its contents, recommendations, and proposed course of action. "
+        "Your signature confirms your approval to proceed as outlined in this document."
+    )
+    anchor_style = styles['SignatureAnchor']
+
+    signature_data = [
+        ['Davinci AI Solutions', '', '', ''],
+        ['Name:', Paragraph('/ds_davinci_name/', anchor_style), 'Date:', Paragraph('/ds_davinci_date/', anchor_style)],
+        ['Title/Role:', Paragraph('/ds_davinci_title/', anchor_style), '', ''],
+        ['Signature:', Paragraph('/ds_davinci_signature/', anchor_style), '', ''],
+        ['', '', '', ''],
+        ['Approved by:', '', '', ''],
+        ['Name:', Paragraph('/ds_recipient_name/', anchor_style), 'Date:', Paragraph('/ds_recipient_date/', anchor_style)],
+        ['Title/Role:', Paragraph('/ds_recipient_title/', anchor_style), '', ''],
+        ['Signature:', Paragraph('/ds_recipient_signature/', anchor_style), '', '']
+    ]
+
+    signature_table = Table(signature_data, colWidths=[1.2*inch, 2.3*inch, 0.8*inch, 1.7*inch])
+    signature_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'NotoSans'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#494949')),
+        ('FONTNAME', (0, 0), (0, 0), 'NotoSans-Bold'),
+        ('FONTSIZE', (0, 0), (0, 0), 12),
+        ('SPAN', (0, 0), (-1, 0)),
+        ('FONTNAME', (0, 5), (0, 5), 'NotoSans-Bold'),
+        ('FONTSIZE', (0, 5), (0, 5), 12),
+        ('SPAN', (0, 5), (-1, 5)),
+        ('SPAN', (0, 4), (-1, 4)),
+        ('LINEBELOW', (0, 4), (-1, 4), 0, colors.white),
+        ('LINEABOVE', (0, 4), (-1, 4), 0, colors.white),
+        ('SPAN', (1, 2), (3, 2)),
+        ('SPAN', (1, 3), (3, 3)),
+        ('SPAN', (1, 7), (3, 7)),
+        ('SPAN', (1, 8), (3, 8)),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
+        ('LINEABOVE', (0, 0), (-1, 0), 1, colors.HexColor('#0B98CE')),
+        ('LINEABOVE', (0, 5), (-1, 5), 1, colors.HexColor('#0B98CE')),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#F0F8FF')),
+        ('BACKGROUND', (0, 5), (-1, 5), colors.HexColor('#F0F8FF')),
+    ]))
+
+    return [
+        Prebuilt(Paragraph('Approval & Signatures', styles['SignatureTitle'])),
+        Prebuilt(Paragraph(preamble_text, styles['SignaturePreamble'])),
+        Prebuilt(signature_table),
+    ]
+
+def create_signature_page(config, styles):
+    theme_id = getattr(styles, 'theme_id', id(styles))
+    page = templates.get(('signature_page', theme_id), lambda: build_signature_page(styles))
+    return [PageBreak()] + [template.instance() for template in page]
+
+def render_html_story(markdown_text, styles, images=None):
+    """Legacy front end: markdown2 HTML parsed back into flowables"""
+    # Preprocessing (No more regex for lists!)
+    html = markdown2.markdown(
+        preprocess_markdown(markdown_text),
+        extras=[
+            'fenced-code-blocks',
+            'tables',
+            'break-on-newline',
+            'header-ids',
+            'strike',
+            'task_list'
+        ]
+    )
+
+    # Removed dangerous regex post-processing
+
+    parser = HTMLToReportLab(styles, images)
+    parser.feed(html)
+    return parser.get_story()
+
+def build_content_story(markdown_text, styles, frontend=None, block_cache=None, images=None):
+    """
+    Turn markdown into content flowables with the selected front end
+
+    'ast' compiles the markdown directly and falls back to the HTML path for
+    anything the compiler cannot reproduce exactly; 'html' always uses the
+    HTML path; 'conformance' renders both, logs any difference and returns
+    the HTML result. With a block_cache, 'ast' only recompiles the top-level
+    blocks that are not cached yet. images is the document's DocumentImages,
+    holding any data URIs extracted from markdown_text.
+    """
+    frontend = frontend or 'ast'
+    if frontend == 'html':
+        return render_html_story(markdown_text, styles, images)
+
+    if frontend == 'conformance':
+        expected = render_html_story(markdown_text, styles, images)
+        try:
+            actual = compile_markdown(markdown_text, styles, images=images)
+        except UnsupportedMarkdown as e:
+            logger.info('Markdown compiler skipped document: %s', e)
+            return expected
+        except Exception:
+            logger.exception('Markdown compiler failed')
+            return expected
+        for index, left, right in compare_stories(expected, actual):
+            logger.warning('Markdown compiler mismatch at flowable %d: html=%r ast=%r', index, left, right)
+        return expected
+
+    if frontend != 'ast':
+        raise ValueError(f"Unknown markdown front end: {frontend}")
+    try:
+        if block_cache is not None:
+            return block_cache.compile(markdown_text, styles, images=images)
+        return compile_markdown(markdown_text, styles, images=images)
+    except UnsupportedMarkdown:
+        return render_html_story(markdown_text, styles, images)
+    except Exception:
+        logger.exception('Markdown compiler failed, using HTML front end')
+        return render_html_story(markdown_text, styles, images)
+
+def new_document(buffer):
+    """The letter-size page layout every document is built on"""
+    return SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=inch * 1.0,
+        leftMargin=inch * 1.0,
+        topMargin=inch * 1.6,
+        bottomMargin=inch * 1.3
+    )
+
+def find_document_title(markdown_text):
+    """Text of the first H1 line, used on the title page"""
+    for line in markdown_text.split('\n'):
+        if line.startswith('# '):
+            return line[2:].strip()
+    return None
+
+def break_before_sections(story):
+    """Start every H1 after the first flowable on a new page"""
+    broken = story[:1]
+    for flowable in story[1:]:
+        if isinstance(flowable, Paragraph) and flowable.style.name == 'CustomHeading1':
+            broken.append(PageBreak())
+        broken.append(flowable)
+    return broken
+
+def build_story(markdown_text, config, styles, document_title, block_cache=None,
+                include_title_page=False, include_signature_page=False):
+    """Flowables for markdown_text, between the title and signature pages if asked for"""
+    # Parse without the base64 of embedded images; it is decoded when the
+    # image flowables are built
+    images = DocumentImages()
+    markdown_text = images.extract(markdown_text)
+
+    content_story = build_content_story(
+        markdown_text, styles, config.get('markdown_frontend', MARKDOWN_FRONTEND), block_cache, images
+    )
+
+    if not content_story:
+        content_story.append(Paragraph("No content to display", styles['CustomBody']))
+
+    if config.get('section_page_breaks'):
+        content_story = break_before_sections(content_story)
+
+    story = []
+    if include_title_page:
+        story.extend(create_title_page(config, styles, document_title))
+
+    story.extend(content_story)
+    # doc.build consumes the story; without other references each flowable
+    # can be freed as soon as its page is drawn
+    del content_story
+
+    if include_signature_page:
+        story.extend(create_signature_page(config, styles))
+    return story
+
+def canvas_options(config):
+    """NumberedCanvas arguments for the letterhead, footer and title page rules"""
+    # Logos are drawn from memory: an uploaded logo's reader, or the decoded
+    # brand asset rather than a re-read of the file
+    logo_image = config.get('logo_image')
+    if logo_image is None:
+        logo_asset = brand_assets.for_path(config.get('logo_path'))
+        logo_image = logo_asset.image_reader() if logo_asset else None
+
+    return {
+        'logo_path': config.get('logo_path'),
+        'logo_image': logo_image,
+        'letterhead': config.get('letterhead'),
+        'disclaimer': config.get('disclaimer'),
+        'has_title_page': config.get('include_title_page', False),
+    }
+
+def render_section(markdown_text, config, document_title, include_title_page, include_signature_page):
+    """
+    PDF bytes of one section of a document, without page chrome
+
+    Runs in a parallel_sections worker; create_pdf draws the letterhead,
+    footer and page numbers over the merged pages.
+    """
+    buffer = io.BytesIO()
+    story = build_story(
+        markdown_text, config, get_theme(config.get('theme')), document_title,
+        include_title_page=include_title_page, include_signature_page=include_signature_page
+    )
+    new_document(buffer).build(story)
+    return buffer.getvalue()
+
+def render_page_chrome(config, page_count):
+    """A PDF of page_count pages holding only the letterhead, footer and page numbers"""
+    buffer = io.BytesIO()
+    chrome = NumberedCanvas(buffer, pagesize=letter, **canvas_options(config))
+    for _ in range(page_count):
+        chrome.showPage()
+    chrome.save()
+    buffer.seek(0)
+    return buffer
+
+def create_sectioned_pdf(markdown_text, sections, config, output=None):
+    """Render sections in the worker pool, then merge them under one set of page chrome into output"""
+    document_title = find_document_title(markdown_text)
+    # An uploaded logo is only needed for the chrome, drawn here
+    section_config = {key: value for key, value in config.items() if key != 'logo_image'}
+    last = len(sections) - 1
+    pdfs = parallel_sections.render(render_section, [
+        (section, section_config, document_title,
+         index == 0 and config.get('include_title_page', False),
+         index == last and config.get('include_signature_page', False))
+        for index, section in enumerate(sections)
+    ])
+    return parallel_sections.merge(pdfs, lambda page_count: render_page_chrome(config, page_count).getvalue(), output)
+
+def layout_progress(progress):
+    """A doc.build progress callback passing the fraction of the story laid out to progress"""
+    total = [0]
+
+    def callback(kind, value):
+        if kind == 'SIZE_EST':
+            total[0] = value
+        elif kind == 'PROGRESS' and total[0]:
+            progress(value / total[0])
+    return callback
+
+def create_pdf(markdown_text, config, block_cache=None, progress=None, output=None):
+    """
+    Render markdown_text to a PDF in output, or in a new BytesIO
+
+    Returns output, or the BytesIO positioned at its start.
+    """
+    profile, linearized = config.get('optimize'), config.get('linearize')
+    if profile or linearized:
+        # Both rewrite every object, so the whole PDF is rendered first
+        pdf = create_pdf(markdown_text, dict(config, optimize=None, linearize=False), block_cache, progress).getvalue()
+        if not linearized:
+            return optimize(pdf, profile, output)
+        if profile:
+            # A linearized file keeps its plain xref table
+            pdf = optimize(pdf, profile, object_streams=False).getvalue()
+        return linearize(pdf, output)
+
+    if block_cache is None and parallel_sections.enabled(markdown_text, config):
+        sections = parallel_sections.split_sections(markdown_text)
+        if len(sections) > 1:
+            return create_sectioned_pdf(markdown_text, sections, config, output)
+
+    buffer = io.BytesIO() if output is None else output
+    doc = new_document(buffer)
+    styles = get_theme(config.get('theme'))
+
+    story = build_story(
+        markdown_text, config, styles, find_document_title(markdown_text), block_cache,
+        config.get('include_title_page', False), config.get('include_signature_page', False)
+    )
+
+    if progress is not None:
+        doc.setProgressCallBack(layout_progress(progress))
+    options = canvas_options(config)
+    doc.build(story, canvasmaker=lambda *args, **kwargs: NumberedCanvas(*args, **kwargs, **options))
+
+    if output is None:
+        buffer.seek(0)
+    return buffer
+
+def render_pdf(markdown_text, config, logo=None, progress=None, spool=False):
+    """
+    PDF bytes of create_pdf, for a render_pool worker
+
+    An uploaded logo is passed as its NormalizedLogo and opened in the worker.
+    With spool, returns a SpooledPDF instead: a PDF past PDF_SPOOL_BYTES is
+    written straight to a temp file, and only its path is sent back.
+    """
+    if logo is not None:
+        config = dict(config, logo_image=logo.reader())
+    if spool:
+        return create_pdf(markdown_text, config, progress=progress, output=PDFSpool()).finish()
+    return create_pdf(markdown_text, config, progress=progress).getvalue()
+
+def convert_config(data):
+    """Render config for a convert-style request body, before the logo is resolved"""
+    return {
+        'letterhead': {
+            'company': data.get('company', 'Davinci AI Solutions'),
+            'address': data.get('address', '11-6320 11 Street SE, Calgary, AB T2H 2L7'),
+            'phone': data.get('phone', '+1 (403) 245-9429'),
+            'email': data.get('email', 'info@davincisolutions.ai')
+        },
+        'disclaimer': data.get('disclaimer', 'This document contains confidential and proprietary information of Davinci AI Solutions. © 2025 All Rights Reserved.'),
+        'logo_path': None,
+        'include_title_page': data.get('includeTitlePage', False),
+        'include_signature_page': data.get('includeSignaturePage', False),
+        'section_page_breaks': data.get('sectionPageBreaks', False),
+        'linearize': data.get('linearize', False),
+        'optimize': data.get('optimize', PDF_OPTIMIZE) or None
+    }
+
+def default_logo():
+    """The default header logo as (path, digest), or (None, None) if it is missing"""
+    asset = brand_assets.get('logo')
+    if asset is None:
+        return None, None
+    return asset.path, asset.digest
+
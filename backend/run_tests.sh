@@ -53,9 +53,13 @@ while [[ $# -gt 0 ]]; do
             RUN_MODE="quick"
             shift
             ;;
+        --perf)
+            RUN_MODE="perf"
+            shift
+            ;;
         *)
             echo "Unknown option: $1"
-            echo "Usage: $0 [--unit|--integration|--regression|--quick] [--save-baseline]"
+            echo "Usage: $0 [--unit|--integration|--regression|--perf|--quick] [--save-baseline]"
             exit 1
             ;;
     esac
@@ -80,6 +84,15 @@ case $RUN_MODE in
             python -m pytest tests/test_regression.py -v
         fi
         ;;
+    perf)
+        echo "⏱️  Running performance suite..."
+        if [ "$SAVE_BASELINE" = true ]; then
+            echo "📝 Saving new baselines..."
+            python tests/perf_stages.py --save-baseline
+        else
+            python tests/perf_stages.py --compare
+        fi
+        ;;
     quick)
         echo "🧪 Running quick test suite..."
         python -m pytest tests/test_html_parser.py -v --tb=short
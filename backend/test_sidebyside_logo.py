@@ -8,7 +8,7 @@ import os
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from app import create_pdf
+from renderer import create_pdf
 
 test_markdown = """# Davinci AI Solutions Proposal
 
@@ -0,0 +1,258 @@
+"""
+Rendering performance suite for Davinci Document Creator
+Times each stage of rendering the test fixtures and compares them to stored baselines
+
+Run with --save-baseline to store new baselines, or --compare to fail on a
+stage that got slower or a render that uses more memory than its baseline.
+Timings depend on the machine, so baselines are only comparable on the
+machine that saved them.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from html.parser import HTMLParser
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markdown_compiler
+import renderer
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# Every fixture is also rendered repeated this many times, as <name>_x<scale>
+SCALES = (10, 50)
+
+# Markdown front ends timed: the markdown compiler, and markdown2 with the HTML parser
+FRONTENDS = ('ast', 'html')
+
+# Stages in pipeline order; each is timed without the stages it calls
+STAGES = ('preprocess', 'markdown2', 'html_parse', 'compile', 'layout', 'save')
+
+# Renders per document and front end; each stage keeps its fastest time
+RUNS = 5
+
+# A stage regresses when it is this much slower than its baseline...
+THRESHOLD = 0.25
+
+# ...and slower by at least this much; smaller changes are timer noise
+MIN_REGRESSION_MS = 2.0
+MIN_REGRESSION_KB = 256
+
+# markdown2 hashes text together with SECRET_SALT, a random 0-1 MB of zero
+# bytes per process, so its time varies threefold from run to run; the suite
+# pins it to the mean length
+MARKDOWN2_SALT_BYTES = 500000
+
+# Times a document with a regression is measured again, after the rest,
+# keeping the best of each metric, so a slow moment does not fail the run
+RETRIES = 2
+
+
+class StageTimer:
+    """Time spent in each stage, not counting the stages it calls"""
+
+    def __init__(self):
+        self.times = {}
+        self._inner = []
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            self._inner.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                inner = self._inner.pop()
+                self.times[stage] = self.times.get(stage, 0.0) + elapsed - inner
+                if self._inner:
+                    self._inner[-1] += elapsed
+        return timed
+
+
+def instrument(timer):
+    """Patches that route each rendering stage through timer"""
+    return [
+        # The HTML path preprocesses in renderer, the compiler's parser in markdown_compiler
+        patch.object(renderer, 'preprocess_markdown',
+                     timer.wrap('preprocess', markdown_compiler.preprocess_markdown)),
+        patch.object(markdown_compiler, 'preprocess_markdown',
+                     timer.wrap('preprocess', markdown_compiler.preprocess_markdown)),
+        patch.object(renderer.markdown2, 'markdown', timer.wrap('markdown2', renderer.markdown2.markdown)),
+        patch.object(renderer.HTMLToReportLab, 'feed', timer.wrap('html_parse', HTMLParser.feed)),
+        patch.object(renderer, 'compile_markdown', timer.wrap('compile', renderer.compile_markdown)),
+        patch.object(renderer.SimpleDocTemplate, 'build', timer.wrap('layout', renderer.SimpleDocTemplate.build)),
+        patch.object(renderer.NumberedCanvas, 'save', timer.wrap('save', renderer.NumberedCanvas.save)),
+    ]
+
+
+def documents(scales=SCALES):
+    """Markdown by name: the fixtures, then each scaled variant"""
+    named = dict(FIXTURES)
+    for scale in scales:
+        for name, markdown_text in FIXTURES.items():
+            named[f'{name}_x{scale}'] = "\n\n".join([markdown_text] * scale)
+    return named
+
+
+def time_stages(markdown_text, frontend, runs=RUNS):
+    """Fastest milliseconds of each stage and of the whole create_pdf call over runs renders"""
+    config = dict(DEFAULT_CONFIG, markdown_frontend=frontend)
+    best = {}
+    for _ in range(runs):
+        timer = StageTimer()
+        # Garbage left by earlier renders is not collected on this one's time
+        gc.collect()
+        with ExitStack() as stack:
+            for patcher in instrument(timer):
+                stack.enter_context(patcher)
+            start = time.perf_counter()
+            renderer.create_pdf(markdown_text, config)
+            timer.times['total'] = time.perf_counter() - start
+        for stage, seconds in timer.times.items():
+            best[stage] = min(best.get(stage, seconds), seconds)
+    return {stage: round(seconds * 1000, 3) for stage, seconds in best.items()}
+
+
+def peak_memory(markdown_text, frontend):
+    """Peak KB allocated by Python during one render, as traced by tracemalloc"""
+    config = dict(DEFAULT_CONFIG, markdown_frontend=frontend)
+    tracemalloc.start()
+    try:
+        renderer.create_pdf(markdown_text, config)
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def measure(markdown_text, runs=RUNS):
+    """Stage times (ms) and peak memory (peak_kb) of markdown_text for each front end"""
+    result = {'chars': len(markdown_text)}
+    for frontend in FRONTENDS:
+        result[frontend] = dict(time_stages(markdown_text, frontend, runs),
+                                peak_kb=peak_memory(markdown_text, frontend))
+    return result
+
+
+def best_of(result, other):
+    """The lower of each metric of two measure() results"""
+    best = dict(result)
+    for frontend in FRONTENDS:
+        best[frontend] = {metric: min(value, other[frontend].get(metric, value))
+                          for metric, value in result[frontend].items()}
+    return best
+
+
+def baseline_path(name, baseline_dir=BASELINE_DIR):
+    return os.path.join(baseline_dir, f"{name}.perf.json")
+
+
+def save_baseline(name, result, baseline_dir=BASELINE_DIR):
+    os.makedirs(baseline_dir, exist_ok=True)
+    path = baseline_path(name, baseline_dir)
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return path
+
+
+def load_baseline(name, baseline_dir=BASELINE_DIR):
+    """The stored result for name, or None if there is no baseline"""
+    path = baseline_path(name, baseline_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(result, baseline, threshold=THRESHOLD):
+    """
+    Regressions of result against baseline, as (front end, metric, old, new)
+
+    A metric regresses when it grew by more than threshold (a fraction) and
+    by more than MIN_REGRESSION_MS, or MIN_REGRESSION_KB for peak memory.
+    """
+    regressions = []
+    for frontend in FRONTENDS:
+        for metric, old in baseline.get(frontend, {}).items():
+            new = result.get(frontend, {}).get(metric)
+            if new is None:
+                continue
+            min_change = MIN_REGRESSION_KB if metric == 'peak_kb' else MIN_REGRESSION_MS
+            if new > old * (1 + threshold) and new - old > min_change:
+                regressions.append((frontend, metric, old, new))
+    return regressions
+
+
+def format_row(name, frontend, metrics):
+    cells = [f"{metrics[stage]:>12.1f}" if stage in metrics else f"{'-':>12}" for stage in STAGES + ('total',)]
+    return f"{name:<22}{frontend:<6}{''.join(cells)}{metrics['peak_kb']:>9}KB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time each rendering stage of the test fixtures')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--compare', action='store_true', help='exit with status 1 on any regression')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help=f'allowed slowdown as a fraction (default {THRESHOLD})')
+    parser.add_argument('--runs', type=int, default=RUNS, help=f'renders per document (default {RUNS})')
+    parser.add_argument('names', nargs='*', help='documents to run, default all')
+    args = parser.parse_args()
+
+    named = documents()
+    unknown = [name for name in args.names if name not in named]
+    if unknown:
+        parser.error(f"unknown documents: {', '.join(unknown)}; choose from {', '.join(named)}")
+
+    renderer.markdown2.SECRET_SALT = bytes(MARKDOWN2_SALT_BYTES)
+    # Fonts, theme and page templates are loaded by the first render
+    renderer.create_pdf(FIXTURES['complex'], DEFAULT_CONFIG)
+
+    names = args.names or list(named)
+    results = {name: measure(named[name], args.runs) for name in names}
+    baselines = {} if args.save_baseline else {name: load_baseline(name) for name in names}
+
+    # Documents with a regression are measured again once the others are done
+    for _ in range(RETRIES):
+        regressed = [name for name in names
+                     if baselines.get(name) and compare(results[name], baselines[name], args.threshold)]
+        for name in regressed:
+            results[name] = best_of(results[name], measure(named[name], args.runs))
+
+    print(f"{'document':<22}{'front':<6}{''.join(f'{stage:>12}' for stage in STAGES + ('total',))}{'peak':>11}")
+    failures = []
+    for name in names:
+        result, baseline = results[name], baselines.get(name)
+        for frontend in FRONTENDS:
+            print(format_row(name, frontend, result[frontend]))
+
+        if args.save_baseline:
+            save_baseline(name, result)
+        elif baseline is None:
+            if args.compare:
+                failures.append(f"{name}: no baseline, run with --save-baseline first")
+        else:
+            for frontend, metric, old, new in compare(result, baseline, args.threshold):
+                unit = 'KB' if metric == 'peak_kb' else 'ms'
+                failures.append(f"{name} {frontend} {metric}: {old}{unit} -> {new}{unit} "
+                                f"(+{(new / old - 1) * 100:.0f}%)")
+
+    if args.save_baseline:
+        print(f"\nBaselines saved to: {BASELINE_DIR}")
+    elif failures:
+        print(f"\n{len(failures)} regressions beyond {args.threshold:.0%}:")
+        for failure in failures:
+            print(f"  - {failure}")
+    return 1 if args.compare and failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Unit tests for batch conversion and the streamed ZIP
+"""
+import unittest
+import sys
+import os
+import io
+import json
+import zipfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+
+from batch import BATCH_MAX_DOCUMENTS, file_name, render_all, stream_zip, unique_names
+from tests.fixtures import FIXTURES
+
+
+class TestNames(unittest.TestCase):
+    """Test ZIP entry names"""
+
+    def test_repeats_are_numbered(self):
+        self.assertEqual(unique_names(['a.pdf', 'a.pdf', 'A.pdf', 'b.pdf']),
+                         ['a.pdf', 'a (2).pdf', 'A (3).pdf', 'b.pdf'])
+
+    def test_client_names_cannot_leave_the_archive(self):
+        self.assertEqual(file_name('../../etc/report', 'document'), 'report.pdf')
+        self.assertEqual(file_name('..\\report.PDF', 'document'), 'report.PDF')
+        self.assertEqual(file_name('', 'document'), 'document.pdf')
+
+
+class TestStreamZip(unittest.TestCase):
+    """Test building the ZIP as renders finish"""
+
+    def test_entries_are_streamed_as_they_finish(self):
+        produced = []
+
+        def results():
+            for index in (1, 0):
+                produced.append(index)
+                yield index, b'%PDF-' + str(index).encode(), None
+            yield 2, None, 'bad markdown'
+
+        chunks = []
+        for chunk in stream_zip(['a.pdf', 'b.pdf', 'c.pdf'], results()):
+            # Each entry is sent before the next render is waited for
+            chunks.append((len(produced), chunk))
+        self.assertEqual([count for count, chunk in chunks[:2]], [1, 2])
+        self.assertIn(b'%PDF-1', chunks[0][1])
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunk for _, chunk in chunks)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), ['b.pdf', 'a.pdf', 'manifest.json'])
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual(manifest['failed'], 1)
+        self.assertEqual([entry['status'] for entry in manifest['documents']], ['done', 'done', 'failed'])
+
+    def test_render_errors_are_reported(self):
+        def render(document):
+            if document == 'bad':
+                raise ValueError("bad markdown")
+            return document.encode()
+        results = sorted(render_all(['one', 'bad', 'two'], render, 2))
+        self.assertEqual(results, [(0, b'one', None), (1, None, 'bad markdown'), (2, b'two', None)])
+
+
+class TestBatchEndpoint(unittest.TestCase):
+    """Test /api/convert/batch"""
+
+    def setUp(self):
+        import app
+        self.client = app.app.test_client()
+
+    def test_zip_of_pdfs_with_shared_settings(self):
+        documents = [
+            {'markdown': FIXTURES['simple']},
+            {'markdown': FIXTURES['complex'], 'name': 'complex'},
+            {'markdown': FIXTURES['simple'], 'company': 'Other Company Ltd'},
+            {'markdown': '   '},
+        ]
+        response = self.client.post('/api/convert/batch', json={'documents': documents, 'company': 'Batch Test Inc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/zip')
+
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        manifest = json.loads(archive.read('manifest.json'))
+        files = [entry['file'] for entry in manifest['documents']]
+        self.assertEqual(files, ['test-document.pdf', 'complex.pdf', 'test-document (2).pdf', 'document.pdf'])
+        self.assertEqual(manifest['documents'][3]['status'], 'failed')
+        self.assertEqual(sorted(archive.namelist()), sorted(files[:3] + ['manifest.json']))
+
+        first = PdfReader(io.BytesIO(archive.read(files[0]))).pages[0].extract_text()
+        third = PdfReader(io.BytesIO(archive.read(files[2]))).pages[0].extract_text()
+        self.assertIn('Batch Test Inc', first)
+        self.assertIn('Other Company Ltd', third)
+
+    def test_invalid_batches_are_rejected(self):
+        for body in ({}, {'documents': []}, {'documents': ['# Hi']},
+                     {'documents': [{'markdown': '# Hi'}] * (BATCH_MAX_DOCUMENTS + 1)},
+                     {'documents': [{'markdown': '# Hi'}], 'logo_base64': 'not a logo'}):
+            self.assertEqual(self.client.post('/api/convert/batch', json=body).status_code, 400, body)
+
+
+if __name__ == '__main__':
+    unittest.main()
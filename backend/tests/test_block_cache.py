@@ -0,0 +1,126 @@
+"""
+Unit tests for the block-level flowable cache behind /api/preview
+"""
+import unittest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from renderer import render_html_story
+from block_cache import BlockCache, SessionBlockCaches
+from markdown_compiler import UnsupportedMarkdown, compare_stories, split_blocks
+from themes import get_theme
+from tests.fixtures import FIXTURES
+
+
+class TestSplitBlocks(unittest.TestCase):
+    """Test splitting markdown into independently compiled chunks"""
+
+    def test_splits_at_blank_lines(self):
+        chunks = split_blocks("# Title\n\nFirst paragraph\n\nSecond paragraph")
+        self.assertEqual([chunk.strip() for chunk in chunks],
+                         ['# Title', 'First paragraph', 'Second paragraph'])
+
+    def test_fence_with_blank_lines_stays_whole(self):
+        chunks = split_blocks("```\none\n\ntwo\n```\n\nafter")
+        self.assertEqual(chunks[0].strip(), "```\none\n\ntwo\n```")
+
+    def test_loose_list_stays_whole(self):
+        chunks = split_blocks("- one\n\n- two\n\ntext")
+        self.assertEqual(chunks[0].strip(), "- one\n\n- two")
+
+    def test_blockquote_stays_whole(self):
+        chunks = split_blocks("> one\n\n> two\n\ntext")
+        self.assertEqual(chunks[0].strip(), "> one\n\n> two")
+
+
+class TestBlockCache(unittest.TestCase):
+    """Test that cached compilation matches a full render"""
+
+    def setUp(self):
+        self.styles = get_theme()
+
+    def assertMatchesHTMLPath(self, story, markdown_text):
+        expected = render_html_story(markdown_text, self.styles)
+        self.assertEqual(compare_stories(expected, story), [])
+
+    def test_fixtures_match_html_path(self):
+        cache = BlockCache()
+        for name, markdown_text in FIXTURES.items():
+            with self.subTest(fixture=name):
+                self.assertMatchesHTMLPath(cache.compile(markdown_text, self.styles), markdown_text)
+
+    def test_only_edited_block_recompiles(self):
+        cache = BlockCache()
+        original = FIXTURES['complex']
+        cache.compile(original, self.styles)
+        misses = cache.misses
+
+        edited = original.replace('comprehensive test', 'thoroughly edited test', 1)
+        self.assertNotEqual(edited, original)
+        story = cache.compile(edited, self.styles)
+
+        self.assertEqual(cache.misses, misses + 1)
+        self.assertMatchesHTMLPath(story, edited)
+
+    def test_carried_state_is_part_of_the_key(self):
+        """An h4 leaves its text pending for the next block, so that block recompiles"""
+        cache = BlockCache()
+        plain = "Intro\n\n## Heading\n\nBody text"
+        pending = "Intro\n\n#### Heading\n\nBody text"
+
+        cache.compile(plain, self.styles)
+        story = cache.compile(pending, self.styles)
+        self.assertMatchesHTMLPath(story, pending)
+
+    def test_unsupported_markdown_raises(self):
+        with self.assertRaises(UnsupportedMarkdown):
+            BlockCache().compile("Intro\n\n<div>raw</div>", self.styles)
+
+    def test_bounded(self):
+        cache = BlockCache(max_blocks=2)
+        cache.compile("one\n\ntwo\n\nthree", self.styles)
+        self.assertEqual(cache.stats()['blocks'], 2)
+
+    def test_session_caches(self):
+        caches = SessionBlockCaches(max_sessions=2)
+        first = caches.get('a', 'doc')
+        self.assertIs(caches.get('a', 'doc'), first)
+        self.assertIsNot(caches.get('a', 'other'), first)
+        caches.get('b')
+        self.assertIsNot(caches.get('a', 'doc'), first)
+
+
+class TestPreviewEndpoint(unittest.TestCase):
+    """Test /api/preview"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.test_client()
+
+    def _preview(self, markdown_text):
+        return self.client.post('/api/preview', json={'markdown': markdown_text, 'documentId': 'test-doc'})
+
+    def test_preview_reuses_blocks(self):
+        from app import preview_caches
+
+        first = self._preview(FIXTURES['complex'])
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.data.startswith(b'%PDF'))
+        self.assertNotIn('attachment', first.headers.get('Content-Disposition', ''))
+
+        hits_before = preview_caches.stats()['hits']
+        second = self._preview(FIXTURES['complex'] + "\n\nOne more paragraph")
+        self.assertEqual(second.status_code, 200)
+        self.assertGreater(preview_caches.stats()['hits'], hits_before)
+
+    def test_preview_requires_markdown(self):
+        response = self._preview('   ')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Unit tests for the brand asset manager
+"""
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brand_assets import ASSET_ROOTS, BrandAssets
+
+LOGO_DIR = os.path.join(ASSET_ROOTS[0], 'logos')
+
+
+class TestBrandAssets(unittest.TestCase):
+    """Test resolving, caching and reloading logos"""
+
+    def setUp(self):
+        self.primary = tempfile.mkdtemp()
+        self.fallback = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.primary, 'logos'))
+        os.makedirs(os.path.join(self.fallback, 'logos'))
+
+    def tearDown(self):
+        shutil.rmtree(self.primary)
+        shutil.rmtree(self.fallback)
+
+    def _copy_logo(self, root, name, target=None):
+        path = os.path.join(root, 'logos', target or name)
+        shutil.copy(os.path.join(LOGO_DIR, name), path)
+        return path
+
+    def _assets(self, **kwargs):
+        logos = {
+            'logo': ('logos/davinci_logo.png',),
+            'title_logo': ('logos/davinci_logo_sidebyside.svg', 'logos/davinci_logo_sidebyside.png'),
+        }
+        kwargs.setdefault('check_interval', None)
+        return BrandAssets(roots=(self.primary, self.fallback), logos=logos, fonts={}, **kwargs).load()
+
+    def test_resolves_in_root_order(self):
+        self._copy_logo(self.fallback, 'davinci_logo.png')
+        primary = self._copy_logo(self.primary, 'davinci_logo.png')
+        self.assertEqual(self._assets().get('logo').path, primary)
+
+    def test_prefers_svg_in_any_root(self):
+        self._copy_logo(self.primary, 'davinci_logo_sidebyside.png')
+        self._copy_logo(self.fallback, 'davinci_logo_sidebyside.svg')
+        asset = self._assets().get('title_logo')
+        self.assertTrue(asset.is_svg)
+        self.assertIsNotNone(asset.drawing())
+
+    def test_missing_asset(self):
+        assets = self._assets()
+        self.assertIsNone(assets.get('logo'))
+        self.assertIsNone(assets.for_path('/nonexistent.png'))
+
+    def test_image_reader_is_shared(self):
+        path = self._copy_logo(self.primary, 'davinci_logo.png')
+        assets = self._assets()
+        asset = assets.for_path(path)
+        self.assertIs(asset.image_reader(), asset.image_reader())
+        self.assertGreater(asset.image_reader().getSize()[0], 0)
+
+    def test_drawing_copies_are_independent(self):
+        self._copy_logo(self.primary, 'davinci_logo_sidebyside.svg')
+        asset = self._assets().get('title_logo')
+        first = asset.drawing()
+        first.scale(0.5, 0.5)
+        self.assertIsNot(first, asset.drawing())
+        self.assertNotEqual(first.transform, asset.drawing().transform)
+
+    def test_reload_on_change(self):
+        path = self._copy_logo(self.primary, 'davinci_logo.png')
+        assets = self._assets()
+        digest = assets.get('logo').digest
+
+        self._copy_logo(self.primary, 'davinci_logo_sidebyside.png', 'davinci_logo.png')
+        # Nothing is re-read until a check runs
+        self.assertEqual(assets.get('logo').digest, digest)
+
+        self.assertEqual(assets.reload_changed(), ['logo'])
+        self.assertNotEqual(assets.get('logo').digest, digest)
+        self.assertEqual(assets.for_path(path).digest, assets.get('logo').digest)
+        self.assertEqual(assets.reload_changed(), [])
+
+    def test_get_checks_after_interval(self):
+        self._copy_logo(self.primary, 'davinci_logo.png')
+        assets = self._assets(check_interval=0)
+        digest = assets.get('logo').digest
+
+        self._copy_logo(self.primary, 'davinci_logo_sidebyside.png', 'davinci_logo.png')
+        self.assertNotEqual(assets.get('logo').digest, digest)
+        self.assertEqual(assets.stats()['reloads'], 1)
+
+    def test_new_and_removed_files(self):
+        assets = self._assets()
+        path = self._copy_logo(self.primary, 'davinci_logo.png')
+        self.assertEqual(assets.reload_changed(), ['logo'])
+        self.assertEqual(assets.get('logo').path, path)
+
+        os.unlink(path)
+        self.assertEqual(assets.reload_changed(), ['logo'])
+        self.assertIsNone(assets.get('logo'))
+
+    def test_app_fonts_registered(self):
+        from reportlab.pdfbase import pdfmetrics
+        import app  # noqa: F401 registers fonts at import
+
+        for name in ('NotoSans', 'NotoSans-Bold'):
+            self.assertEqual(pdfmetrics.getFont(name).fontName, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
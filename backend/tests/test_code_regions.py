@@ -0,0 +1,33 @@
+"""
+Unit tests for finding the code in markdown
+"""
+import unittest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_regions import CodeRegions
+
+
+class TestCodeRegions(unittest.TestCase):
+    """Test which positions are inside code blocks and code spans"""
+
+    def kinds(self, markdown_text):
+        regions = CodeRegions(markdown_text)
+        return [regions.kind(markdown_text.index(f'@{i}')) for i in range(markdown_text.count('@'))]
+
+    def test_blocks_and_spans(self):
+        markdown_text = ("# @0\n\nSee `a @1 b` and @2\n\n```python\ncode @3\n```\n\n    indented @4\n\n"
+                         "after ``tick ` @5`` then `@6\n\nunclosed` @7")
+        self.assertEqual(self.kinds(markdown_text), [None, 'span', None, 'block', 'block', 'span', None, None])
+
+    def test_indented_lines_that_are_not_code(self):
+        # A continuation line, list item content, and an unclosed fence
+        markdown_text = "text\n    more @0\n\n- item\n\n    para @1\n\n        code @2\n\n```\nopen @3"
+        self.assertEqual(self.kinds(markdown_text), [None, None, 'block', None])
+
+
+if __name__ == '__main__':
+    unittest.main()
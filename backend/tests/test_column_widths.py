@@ -0,0 +1,90 @@
+"""
+Unit tests for content-aware table column widths
+"""
+import unittest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from column_widths import MAX_COLUMN_SHARE, MIN_COLUMN_WIDTH, SAMPLE_ROWS, column_widths, text_width
+from markdown_compiler import table_flowables
+from themes import get_theme
+
+AVAIL_WIDTH = 6.5 * inch
+
+
+class TestTextWidth(unittest.TestCase):
+    """Test the glyph width table estimate"""
+
+    def test_close_to_string_width(self):
+        for text in ('REC-000123', 'Quarterly revenue by region', 'Ünïcödé façade'):
+            with self.subTest(text=text):
+                self.assertAlmostEqual(text_width(text, 'NotoSans', 9), stringWidth(text, 'NotoSans', 9),
+                                       delta=0.01 * stringWidth(text, 'NotoSans', 9))
+
+    def test_font_size_scales(self):
+        self.assertAlmostEqual(text_width('Total', 'NotoSans', 18), 2 * text_width('Total', 'NotoSans', 9))
+
+
+class TestColumnWidths(unittest.TestCase):
+    """Test sizing columns from their content"""
+
+    def setUp(self):
+        self.style = get_theme()['TableCell']
+
+    def widths(self, rows):
+        widths = column_widths(rows, self.style, AVAIL_WIDTH)
+        self.assertAlmostEqual(sum(widths), AVAIL_WIDTH)
+        return widths
+
+    def test_text_column_gets_the_space(self):
+        description = "a long free text description of the work that was carried out on site"
+        rows = [['ID', 'Status', 'Description']] + [[f'WO-{i}', 'Open', description] for i in range(20)]
+        id_width, status_width, description_width = self.widths(rows)
+        self.assertLess(id_width, AVAIL_WIDTH / 3)
+        self.assertLess(status_width, AVAIL_WIDTH / 3)
+        self.assertGreater(description_width, AVAIL_WIDTH / 2)
+
+    def test_short_columns_fill_width_in_proportion(self):
+        id_width, name_width = self.widths([['ID', 'Name'], ['1', 'Alexandra Smith-Jones']])
+        self.assertGreater(name_width, id_width)
+
+    def test_min_and_max_constraints(self):
+        rows = [['#', 'Notes'], ['1', 'word ' * 200]]
+        widths = self.widths(rows + [['2', 'x'] for _ in range(5)])
+        self.assertGreaterEqual(widths[0], MIN_COLUMN_WIDTH)
+        rows = [['A', 'B', 'C'], ['word ' * 200, 'word ' * 200, 'x']]
+        for width in self.widths(rows):
+            self.assertLessEqual(width, AVAIL_WIDTH * MAX_COLUMN_SHARE + 1e-6)
+
+    def test_long_words_are_not_squeezed(self):
+        rows = [['Path', 'Notes'], ['/var/lib/application/storage/archive', 'word ' * 100]]
+        path_width, _ = self.widths(rows)
+        self.assertGreaterEqual(path_width, text_width('/var/lib/application/storage/archive', 'NotoSans', 9))
+
+    def test_markup_is_not_measured(self):
+        plain = self.widths([['Name', 'Note'], ['Bold & bright', 'x']])
+        marked = self.widths([['Name', 'Note'], ['<b>Bold</b> &amp; bright', 'x']])
+        for left, right in zip(plain, marked):
+            self.assertAlmostEqual(left, right)
+
+    def test_large_tables_are_sampled(self):
+        rows = [['ID', 'Value']] + [[str(i), 'v'] for i in range(SAMPLE_ROWS * 50)]
+        self.assertEqual(len(self.widths(rows)), 2)
+
+    def test_empty_and_ragged_cells(self):
+        self.assertEqual(len(self.widths([['A', 'B', 'C'], ['', None, 'x'], ['only one']])), 3)
+
+    def test_table_flowables_use_content_widths(self):
+        rows = [['ID', 'Description']] + [['1', 'a much longer description than the identifier']]
+        table = table_flowables(rows, get_theme())[0]
+        self.assertLess(table._colWidths[0], table._colWidths[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
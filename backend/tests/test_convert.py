@@ -0,0 +1,132 @@
+"""
+Unit tests for the renderer library and the convert command
+"""
+import unittest
+import sys
+import os
+import io
+import json
+import shutil
+import subprocess
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+
+# Add parent directory to path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from PIL import Image
+from PyPDF2 import PdfReader
+
+import convert
+from tests.fixtures import FIXTURES
+
+
+class TestRendererImport(unittest.TestCase):
+    """Test that the rendering core comes without the web stack"""
+
+    def test_no_web_or_auth_modules(self):
+        modules = subprocess.run(
+            [sys.executable, '-c', 'import sys, renderer, convert; print(" ".join(sys.modules))'],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.split()
+        for name in ('flask', 'flask_cors', 'flask_limiter', 'jwt', 'auth', 'docusign_client', 'app'):
+            self.assertNotIn(name, modules)
+
+
+class TestConvert(unittest.TestCase):
+    """Test converting files and directories from the command line"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.docs = os.path.join(self.directory, 'docs')
+        self.output = os.path.join(self.directory, 'pdfs')
+        self.write('letter.md', FIXTURES['simple'])
+        self.write('reports/q1.md', FIXTURES['complex'])
+        self.write('reports/notes.txt', 'not markdown')
+
+    def write(self, name, text):
+        path = os.path.join(self.docs, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_convert(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            status = convert.main([self.docs, '-o', self.output, *args])
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def text(self, name):
+        return ''.join(page.extract_text() for page in PdfReader(os.path.join(self.output, name)).pages)
+
+    def test_directory_keeps_its_layout(self):
+        status, stdout, _ = self.run_convert('--workers', '2')
+        self.assertEqual(status, 0)
+        self.assertIn('2 converted, 0 unchanged, 0 failed', stdout)
+        self.assertEqual(sorted(os.listdir(self.output)), ['.convert-manifest.json', 'letter.pdf', 'reports'])
+        self.assertEqual(os.listdir(os.path.join(self.output, 'reports')), ['q1.pdf'])
+        self.assertIn('Davinci AI Solutions', self.text('letter.pdf'))
+
+    def test_config_file(self):
+        logo = os.path.join(self.directory, 'logo.png')
+        Image.new('RGB', (300, 90), (200, 30, 30)).save(logo)
+        config = os.path.join(self.directory, 'letterhead.json')
+        with open(config, 'w') as f:
+            json.dump({'company': 'Acme Widgets', 'includeTitlePage': True, 'logo': 'logo.png'}, f)
+
+        status, _, _ = self.run_convert('--config', config, '--workers', '0')
+        self.assertEqual(status, 0)
+        reader = PdfReader(os.path.join(self.output, 'letter.pdf'))
+        self.assertIn('Acme Widgets', reader.pages[0].extract_text())
+        with open(os.path.join(self.output, 'letter.pdf'), 'rb') as f:
+            self.assertIn(b'/Height 90', f.read())
+
+        with open(config, 'w') as f:
+            json.dump({'optimize': 'tiny'}, f)
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            convert.main([self.docs, '-o', self.output, '--config', config])
+
+    def test_incremental(self):
+        self.run_convert('--workers', '0')
+        letter = os.path.join(self.output, 'letter.pdf')
+        written = os.path.getmtime(letter)
+
+        status, stdout, _ = self.run_convert('--incremental', '--workers', '0')
+        self.assertEqual(status, 0)
+        self.assertIn('0 converted, 2 unchanged, 0 failed', stdout)
+
+        self.write('reports/q1.md', FIXTURES['complex'] + '\n\nRevised')
+        status, stdout, _ = self.run_convert('--incremental', '--workers', '0')
+        self.assertIn('1 converted, 1 unchanged, 0 failed', stdout)
+        self.assertIn('Revised', self.text('reports/q1.pdf'))
+        self.assertEqual(os.path.getmtime(letter), written)
+
+        # A deleted PDF, or a changed config, is rendered again
+        os.remove(letter)
+        status, stdout, _ = self.run_convert('--incremental', '--workers', '0')
+        self.assertIn('1 converted, 1 unchanged, 0 failed', stdout)
+        config = os.path.join(self.directory, 'letterhead.json')
+        with open(config, 'w') as f:
+            json.dump({'company': 'Acme Widgets'}, f)
+        status, stdout, _ = self.run_convert('--incremental', '--config', config, '--workers', '0')
+        self.assertIn('2 converted, 0 unchanged, 0 failed', stdout)
+
+    def test_failed_file(self):
+        with open(os.path.join(self.docs, 'broken.md'), 'wb') as f:
+            f.write(b'# Title\n\n\xff\xfe not utf-8')
+        status, stdout, stderr = self.run_convert('--workers', '0')
+        self.assertEqual(status, 1)
+        self.assertIn('broken.md', stderr)
+        self.assertIn('2 converted, 0 unchanged, 1 failed', stdout)
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'broken.pdf')))
+
+    def test_missing_input(self):
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            convert.main([os.path.join(self.directory, 'missing.md')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+Unit tests for the embedded image pipeline
+"""
+import unittest
+import sys
+import os
+import io
+import base64
+import random
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image as PILImage
+from PyPDF2 import PdfReader
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph
+
+from renderer import build_content_story, create_pdf
+from embedded_images import REFERENCE_PREFIX, DocumentImages, SourceImage
+from markdown_compiler import compare_stories, image_flowables
+from themes import get_theme
+from tests.fixtures import DEFAULT_CONFIG
+
+
+def encode_image(size, mode='RGB', fmt='PNG', noise=False):
+    if noise:
+        img = PILImage.frombytes(mode, size, random.Random(0).randbytes(size[0] * size[1] * len(mode)))
+    else:
+        img = PILImage.new(mode, size, (11, 152, 206, 128)[:len(mode)])
+    output = io.BytesIO()
+    img.save(output, fmt)
+    return output.getvalue()
+
+
+def data_uri(data, kind='png'):
+    return f"data:image/{kind};base64,{base64.b64encode(data).decode()}"
+
+
+def open_image(data):
+    return PILImage.open(io.BytesIO(data))
+
+
+class TestSourceImage(unittest.TestCase):
+    """Test scaling images to their print size"""
+
+    def test_downsampled_to_print_size(self):
+        images = DocumentImages(dpi=144)
+        image = images.flowable(SourceImage(encode_image((1920, 1080))), width=4 * inch)
+        self.assertEqual(image._img.getSize(), (576, 324))
+
+    def test_small_image_not_upscaled(self):
+        data = encode_image((100, 50))
+        image = DocumentImages(dpi=300).flowable(SourceImage(data), width=4 * inch)
+        self.assertEqual(image._img.getSize(), (100, 50))
+
+    def test_dpi_zero_keeps_source(self):
+        data = encode_image((1920, 1080))
+        source = SourceImage(data)
+        DocumentImages(dpi=0).flowable(source)
+        self.assertIs(source.variant(None).data, data)
+
+    def test_height_follows_aspect_ratio(self):
+        image = DocumentImages().flowable(SourceImage(encode_image((1600, 1000))), width=4 * inch)
+        self.assertAlmostEqual(image.drawHeight, 4 * inch * 1000 / 1600)
+
+    def test_photos_stored_as_jpeg(self):
+        variant = SourceImage(encode_image((800, 600), noise=True)).variant((400, 300))
+        self.assertEqual(open_image(variant.data).format, 'JPEG')
+
+    def test_screenshots_stay_lossless(self):
+        variant = SourceImage(encode_image((800, 600))).variant((400, 300))
+        self.assertEqual(open_image(variant.data).format, 'PNG')
+
+    def test_transparency_kept(self):
+        variant = SourceImage(encode_image((800, 600), mode='RGBA', noise=True)).variant((400, 300))
+        image = open_image(variant.data)
+        self.assertEqual(image.format, 'PNG')
+        self.assertEqual(image.mode, 'RGBA')
+
+
+class TestImageFlowables(unittest.TestCase):
+    """Test markdown image sources"""
+
+    def setUp(self):
+        self.styles = get_theme()
+
+    def test_repeated_image_decoded_once(self):
+        images = DocumentImages()
+        src = data_uri(encode_image((1920, 1080)))
+        first = image_flowables(src, 'a', self.styles, images=images)[0]
+        second = image_flowables(src, 'b', self.styles, images=images)[0]
+        self.assertIsNot(first, second)
+        self.assertIs(first._img, second._img)
+
+    def test_invalid_image_falls_back_to_alt(self):
+        src = data_uri(b'not an image')
+        flowables = image_flowables(src, 'diagram', self.styles, images=DocumentImages())
+        self.assertIsInstance(flowables[0], Paragraph)
+        self.assertIn('diagram', flowables[0].text)
+
+
+class TestExtractDataUris(unittest.TestCase):
+    """Test lifting data URIs out of the markdown before parsing"""
+
+    def setUp(self):
+        self.styles = get_theme()
+        self.uri = data_uri(encode_image((400, 300), noise=True))
+
+    def test_payload_replaced_by_reference(self):
+        images = DocumentImages()
+        text = images.extract(f"Intro\n\n![chart]({self.uri})\n\n<img src=\"{self.uri}\" alt=\"raw\">")
+        self.assertLess(len(text), 300)
+        self.assertEqual(text.count(REFERENCE_PREFIX), 2)
+        self.assertIn('![chart](' + REFERENCE_PREFIX, text)
+
+    def test_reference_is_stable(self):
+        first = DocumentImages().extract(f"![a]({self.uri})")
+        second = DocumentImages().extract(f"Edited\n\n![a]({self.uri})")
+        self.assertTrue(second.endswith(first))
+
+    def test_short_and_quoted_uris_left_alone(self):
+        markdown = "```\n![x](data:image/png;base64,iVBORw0KGgo...)\n```\n\nSee data:image/png;base64," + 'A' * 2000
+        self.assertEqual(DocumentImages().extract(markdown), markdown)
+
+    def test_uris_in_code_left_alone(self):
+        markdown = (f"```\n![logo]({self.uri})\n```\n\nQuote `![logo]({self.uri})` as is\n\n"
+                    f"    <img src=\"{self.uri}\">\n\n![chart]({self.uri})")
+        text = DocumentImages().extract(markdown)
+        self.assertEqual(text.count(REFERENCE_PREFIX), 1)
+        self.assertTrue(text.startswith(markdown[:markdown.rindex('![chart]')]))
+
+    def test_same_story_as_inline_uri(self):
+        markdown = f"# Report\n\nText\n\n![chart]({self.uri})\n\n![again]({self.uri})"
+        for frontend in ('html', 'ast'):
+            with self.subTest(frontend=frontend):
+                expected = build_content_story(markdown, self.styles, frontend)
+                images = DocumentImages()
+                actual = build_content_story(images.extract(markdown), self.styles, frontend, images=images)
+                self.assertEqual(compare_stories(expected, actual), [])
+
+    def test_decoded_lazily(self):
+        images = DocumentImages()
+        images.extract(f"![chart]({self.uri})")
+        self.assertEqual(images._sources, {})
+
+    def test_unknown_reference_falls_back_to_alt(self):
+        flowables = image_flowables(REFERENCE_PREFIX + 'missing', 'chart', self.styles, images=DocumentImages())
+        self.assertIn('chart', flowables[0].text)
+
+
+class TestEmbeddedImagesInPdf(unittest.TestCase):
+    """Test what ends up in the PDF"""
+
+    def _image_xobjects(self, pdf_buffer):
+        images = {}
+        for page in PdfReader(io.BytesIO(pdf_buffer.getvalue())).pages:
+            for name, xobject in page['/Resources'].get('/XObject', {}).items():
+                xobject = xobject.get_object()
+                if xobject['/Subtype'] == '/Image':
+                    images[name] = xobject
+        return images
+
+    def test_repeated_image_embedded_once(self):
+        uri = data_uri(encode_image((1920, 1080)))
+        markdown = f"# Report\n\n![one]({uri})\n\nText\n\n![two]({uri})"
+        for frontend in ('html', 'ast'):
+            with self.subTest(frontend=frontend):
+                pdf = create_pdf(markdown, dict(DEFAULT_CONFIG, markdown_frontend=frontend))
+                images = self._image_xobjects(pdf)
+                self.assertEqual(len(images), 1)
+                image = next(iter(images.values()))
+                self.assertLess(image['/Width'], 1920)
+
+    def test_tall_image_fits_page(self):
+        uri = data_uri(encode_image((1600, 1000)))
+        pdf = create_pdf(f"![tall]({uri})", DEFAULT_CONFIG)
+        self.assertEqual(len(self._image_xobjects(pdf)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
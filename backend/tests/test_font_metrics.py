@@ -0,0 +1,74 @@
+"""
+Unit tests for memoized font metrics
+"""
+import unittest
+import sys
+import os
+import io
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+import font_metrics
+from brand_assets import ASSET_ROOTS
+from font_metrics import MemoizedTTFont
+
+FONT_PATH = next(
+    path for path in (os.path.join(root, 'fonts', 'NotoSans-Regular.ttf') for root in ASSET_ROOTS)
+    if os.path.exists(path)
+)
+
+
+class TestMemoizedTTFont(unittest.TestCase):
+    """Test that memoized widths are TTFont's widths"""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FONT_PATH, 'rb') as f:
+            cls.data = f.read()
+        cls.plain = TTFont('TestNotoPlain', io.BytesIO(cls.data))
+
+    def font(self, **kwargs):
+        return MemoizedTTFont('TestNoto', io.BytesIO(self.data), **kwargs)
+
+    def test_widths_match_ttfont(self):
+        font = self.font()
+        for text in ('Executive Summary', 'façade – “quoted”', 'ﬁnance', '漢字', '😀', ''):
+            for size in (9, 10.5, 18):
+                with self.subTest(text=text, size=size):
+                    self.assertEqual(font.stringWidth(text, size), self.plain.stringWidth(text, size))
+
+    def test_bytes_are_decoded(self):
+        font = self.font()
+        self.assertEqual(font.stringWidth('café'.encode('utf8'), 10), self.plain.stringWidth('café', 10))
+
+    def test_repeated_words_hit_the_cache(self):
+        font = self.font()
+        for _ in range(3):
+            font.stringWidth('revenue', 10)
+        font.stringWidth('revenue', 11)
+        self.assertEqual(font.cache_stats(), {'hits': 2, 'misses': 2, 'entries': 2})
+
+    def test_cache_is_bounded(self):
+        font = self.font(cache_size=2)
+        for word in ('one', 'two', 'three'):
+            font.stringWidth(word, 10)
+        self.assertEqual(font.cache_stats()['entries'], 2)
+
+
+class TestRegisteredFonts(unittest.TestCase):
+    """Test that the app's fonts measure through the cache"""
+
+    def test_app_fonts_are_memoized(self):
+        import app  # noqa: F401 registers fonts at import
+        for name in ('NotoSans', 'NotoSans-Bold'):
+            self.assertIsInstance(pdfmetrics.getFont(name), MemoizedTTFont)
+        pdfmetrics.stringWidth('Summary', 'NotoSans', 10)
+        self.assertIn('NotoSans', font_metrics.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
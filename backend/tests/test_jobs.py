@@ -0,0 +1,270 @@
+"""
+Unit tests for the render job queue and the /api/jobs endpoints
+"""
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jobs
+from jobs import JobRunner, JobStore, JOB_MAX_ATTEMPTS, _PinnedPoolManager, check_callback_url, post_callback
+from render_pool import RENDER_TIMEOUT
+from tests.fixtures import FIXTURES
+
+
+class StoreTestCase(unittest.TestCase):
+
+    def store(self, **kwargs):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return JobStore(directory, **kwargs)
+
+
+class TestJobStore(StoreTestCase):
+    """Test queueing jobs in SQLite"""
+
+    def test_claim_and_complete(self):
+        store = self.store()
+        job_id = store.submit({'markdown': '# Hi'}, 'hi.pdf', result_url='http://host/jobs/{id}/result')
+        job = store.claim()
+        self.assertEqual((job['id'], job['status'], job['payload']), (job_id, 'running', {'markdown': '# Hi'}))
+        self.assertIsNone(store.claim())
+
+        store.complete(job_id, b'%PDF-1.4 test')
+        description = store.describe(store.get(job_id))
+        self.assertEqual(description['status'], 'done')
+        self.assertEqual(description['progress'], 1)
+        self.assertEqual(description['result_url'], f'http://host/jobs/{job_id}/result')
+        with open(store.result_path(store.get(job_id)), 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 test')
+
+    def test_jobs_survive_a_restart(self):
+        store = self.store()
+        interrupted = store.submit({'markdown': '# One'}, 'one.pdf')
+        store.claim()
+        queued = store.submit({'markdown': '# Two'}, 'two.pdf')
+
+        # A new store on the same directory, as after the server restarts
+        restarted = JobStore(store.directory)
+        self.assertEqual(restarted.claim()['id'], queued)
+        self.assertIsNone(restarted.claim())
+
+        # The interrupted job runs again once it is stale
+        time.sleep(0.01)
+        job = JobStore(store.directory, stale_after=0).claim()
+        self.assertEqual((job['id'], job['attempts']), (interrupted, 2))
+
+    def test_job_fails_after_max_attempts(self):
+        store = self.store(stale_after=0)
+        job_id = store.submit({'markdown': '# One'}, 'one.pdf')
+        for _ in range(JOB_MAX_ATTEMPTS):
+            time.sleep(0.01)
+            self.assertEqual(store.claim()['id'], job_id)
+        time.sleep(0.01)
+        self.assertIsNone(store.claim())
+        store.expire()
+        self.assertEqual(store.get(job_id)['status'], 'failed')
+
+    def test_finished_jobs_expire(self):
+        store = self.store(ttl=0)
+        job_id = store.submit({'markdown': '# Hi'}, 'hi.pdf')
+        store.claim()
+        store.complete(job_id, b'%PDF')
+        path = store.result_path({'id': job_id})
+        time.sleep(0.01)
+        self.assertIsNone(store.get(job_id))
+        self.assertEqual(store.expire(), 1)
+        self.assertFalse(os.path.exists(path))
+
+
+class TestCheckCallbackUrl(unittest.TestCase):
+    """Test which hosts completion callbacks may be sent to"""
+
+    def test_empty_allowlist_refuses_internal_addresses(self):
+        with patch.object(jobs, 'JOB_CALLBACK_HOSTS', []):
+            for url in ('http://127.0.0.1:8080/done', 'http://localhost/done', 'http://10.0.0.5/done',
+                        'http://192.168.1.1/done', 'http://169.254.169.254/latest/meta-data/',
+                        'http://[::1]/done', 'http://0.0.0.0/done', 'file:///etc/passwd'):
+                with self.assertRaises(ValueError, msg=url):
+                    check_callback_url(url)
+            self.assertEqual(check_callback_url('https://93.184.216.34/hooks/pdf'), '93.184.216.34')
+
+    def test_allowlist(self):
+        with patch.object(jobs, 'JOB_CALLBACK_HOSTS', ['127.0.0.1']):
+            self.assertIsNone(check_callback_url('http://127.0.0.1:8080/done'))
+            with self.assertRaises(ValueError):
+                check_callback_url('https://93.184.216.34/hooks/pdf')
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    received = []
+    hosts = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.hosts.append(self.headers['Host'])
+        self.received.append(json.loads(body))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPinnedCallbacks(unittest.TestCase):
+    """Test that callbacks go to the address that was checked, not a fresh lookup"""
+
+    def test_sent_to_checked_address(self):
+        server = HTTPServer(('127.0.0.1', 0), CallbackHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        CallbackHandler.received, CallbackHandler.hosts = [], []
+
+        # callback.invalid never resolves, so only the pinned address reaches the server
+        host = f'callback.invalid:{server.server_port}'
+        response = post_callback(f'http://{host}/done', '127.0.0.1', {'id': 'x'})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual((CallbackHandler.received, CallbackHandler.hosts), ([{'id': 'x'}], [host]))
+
+    def test_tls_is_checked_against_the_host(self):
+        pool = _PinnedPoolManager('93.184.216.34').connection_from_host('hooks.example.com', 443, 'https')
+        self.assertEqual(pool.host, '93.184.216.34')
+        self.assertEqual(pool.conn_kw['server_hostname'], 'hooks.example.com')
+        self.assertEqual(pool.assert_hostname, 'hooks.example.com')
+
+
+class TestJobRunner(StoreTestCase):
+    """Test rendering queued jobs in background threads"""
+
+    def run_job(self, store, render, **submit):
+        runner = JobRunner(store, render, poll_interval=0.05).start()
+        self.addCleanup(runner.stop)
+        job_id = store.submit({'markdown': '# Hi'}, 'hi.pdf', **submit)
+        while store.get(job_id)['status'] not in ('done', 'failed'):
+            time.sleep(0.01)
+        return store.get(job_id)
+
+    def test_render_errors_fail_the_job(self):
+        def render(job, progress):
+            raise ValueError("bad markdown")
+        job = self.run_job(self.store(), render)
+        self.assertEqual((job['status'], job['error']), ('failed', 'bad markdown'))
+
+    def test_progress_and_callback(self):
+        server = HTTPServer(('127.0.0.1', 0), CallbackHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        CallbackHandler.received = []
+        store = self.store()
+        progress_seen = []
+
+        def render(job, progress):
+            progress(0.5)
+            progress_seen.append(store.get(job['id'])['progress'])
+            return b'%PDF'
+
+        with patch.object(jobs, 'JOB_CALLBACK_HOSTS', ['127.0.0.1']):
+            job = self.run_job(store, render, callback_url=f'http://127.0.0.1:{server.server_port}/done')
+            self.assertEqual(job['status'], 'done')
+            self.assertEqual(progress_seen, [0.5])
+            deadline = time.monotonic() + 5
+            while not CallbackHandler.received and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(CallbackHandler.received, [store.describe(job)])
+
+    def test_callback_to_internal_address_is_not_sent(self):
+        server = HTTPServer(('127.0.0.1', 0), CallbackHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        CallbackHandler.received = []
+        store = self.store()
+
+        # A job queued before the host was refused is not sent either
+        with patch.object(jobs, 'JOB_CALLBACK_HOSTS', []):
+            job = self.run_job(store, lambda job, progress: b'%PDF',
+                               callback_url=f'http://127.0.0.1:{server.server_port}/done')
+            self.assertEqual(job['status'], 'done')
+            time.sleep(0.2)
+        self.assertEqual(CallbackHandler.received, [])
+
+
+class TestJobsAPI(unittest.TestCase):
+    """Test submitting and polling jobs over HTTP"""
+
+    def setUp(self):
+        import app
+        self.app = app
+        self.client = app.app.test_client()
+
+    def test_submit_poll_and_download(self):
+        response = self.client.post('/api/jobs', json={'markdown': FIXTURES['complex']})
+        self.assertEqual(response.status_code, 202)
+        status_url = response.headers['Location']
+
+        deadline = time.monotonic() + 60
+        while response.json['status'] not in ('done', 'failed') and time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = self.client.get(status_url)
+        self.assertEqual(response.json['status'], 'done')
+
+        result = self.client.get(response.json['result_url'])
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.mimetype, 'application/pdf')
+        self.assertTrue(result.data.startswith(b'%PDF'))
+        self.assertEqual(len(result.data), response.json['size_bytes'])
+
+    def test_running_job_is_not_stale_while_waiting_for_a_worker(self):
+        # A job may wait RENDER_TIMEOUT for a worker, then render for as long
+        self.assertGreater(self.app.job_store.stale_after, 2 * RENDER_TIMEOUT)
+
+    def test_result_of_unfinished_job_is_409(self):
+        store = JobStore(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, store.directory)
+        saved = self.app.job_store
+        self.app.job_store = store
+        self.addCleanup(setattr, self.app, 'job_store', saved)
+
+        # Nothing runs this store's jobs, so this one stays queued
+        job_id = store.submit({'markdown': '# Hi'}, 'hi.pdf')
+        response = self.client.get(f'/api/jobs/{job_id}/result')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json['status'], 'queued')
+        self.assertEqual(self.client.get('/api/jobs/unknown').status_code, 404)
+
+    def test_result_expired_while_requested_is_404(self):
+        store = JobStore(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, store.directory)
+        saved = self.app.job_store
+        self.app.job_store = store
+        self.addCleanup(setattr, self.app, 'job_store', saved)
+
+        # As if expire() removed the PDF after the job was looked up
+        job_id = store.submit({'markdown': '# Hi'}, 'hi.pdf')
+        store.claim()
+        store.complete(job_id, b'%PDF')
+        os.remove(store.result_path(store.get(job_id)))
+        response = self.client.get(f'/api/jobs/{job_id}/result')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['error'], 'Job not found or expired')
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.client.post('/api/jobs', json={'markdown': ''}).status_code, 400)
+        response = self.client.post('/api/jobs', json={'markdown': '# Hi', 'callbackUrl': 'file:///etc/passwd'})
+        self.assertEqual(response.status_code, 400)
+        with patch.object(jobs, 'JOB_CALLBACK_HOSTS', []):
+            response = self.client.post('/api/jobs', json={'markdown': '# Hi',
+                                                           'callbackUrl': 'http://169.254.169.254/latest/meta-data/'})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Unit tests for laying out large tables a page at a time
+"""
+import unittest
+import sys
+import os
+import io
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+from reportlab.pdfgen import canvas
+from reportlab.platypus import LongTable, Paragraph, Table
+
+from renderer import build_content_story, create_pdf
+from large_tables import LARGE_TABLE_ROWS, LargeTable, cell_factory
+from markdown_compiler import compare_stories, table_flowables
+from themes import get_theme
+from tests.fixtures import DEFAULT_CONFIG
+
+
+def table_data(rows, cols=4):
+    header = [f"Column {c}" for c in range(cols)]
+    body = [[f"Row {r} cell {c}" + " with more words" * (r % 3) for c in range(cols)] for r in range(rows)]
+    return [header] + body
+
+
+def table_markdown(rows, cols=4):
+    data = table_data(rows, cols)
+    lines = ["| " + " | ".join(data[0]) + " |", "|" + "---|" * cols]
+    lines += ["| " + " | ".join(row) + " |" for row in data[1:]]
+    return "# Appendix\n\n" + "\n".join(lines) + "\n"
+
+
+class TestCellFactory(unittest.TestCase):
+    """Test that plain text cells skip the markup parser without changing output"""
+
+    def setUp(self):
+        self.style = get_theme()['TableCell']
+        self.make_cell = cell_factory(self.style)
+
+    def _render(self, paragraph):
+        output = canvas.Canvas(io.BytesIO())
+        size = paragraph.wrap(90, 1000)
+        paragraph.drawOn(output, 0, 0)
+        return size, output._code
+
+    def test_plain_text_matches_parsed_paragraph(self):
+        for text in ('Total', 'A longer cell that wraps over several lines of the column', '  spaced   out  '):
+            with self.subTest(text=text):
+                self.assertEqual(self._render(self.make_cell(text)), self._render(Paragraph(text, self.style)))
+
+    def test_markup_is_parsed(self):
+        cell = self.make_cell('<b>Bold</b> &amp; more')
+        self.assertEqual(cell.frags[0].text, 'Bold')
+        self.assertEqual(self._render(cell), self._render(Paragraph('<b>Bold</b> &amp; more', self.style)))
+
+
+class TestLargeTable(unittest.TestCase):
+    """Test the large table layout"""
+
+    def setUp(self):
+        self.styles = get_theme()
+
+    def test_switches_above_threshold(self):
+        small = table_flowables(table_data(LARGE_TABLE_ROWS - 1), self.styles)[0]
+        large = table_flowables(table_data(LARGE_TABLE_ROWS), self.styles)[0]
+        self.assertIsInstance(small, Table)
+        self.assertIsInstance(large, LargeTable)
+
+    def test_row_heights_match_table(self):
+        data = table_data(LARGE_TABLE_ROWS)
+        large = table_flowables(data, self.styles)[0]
+        large._fit(100000)
+
+        table = table_flowables(data[:30], self.styles)[0]
+        table.wrap(468, 100000)
+        measured = [large._header[1]] + [height for _, height in large.measured[:29]]
+        self.assertEqual(measured, table._rowHeights)
+
+    def test_split_pages(self):
+        large = table_flowables(table_data(LARGE_TABLE_ROWS), self.styles)[0]
+        width, height = large.wrap(468, 500)
+        self.assertGreater(height, 500)
+
+        page, rest = large.split(468, 500)
+        self.assertIsInstance(page, LongTable)
+        self.assertEqual(page.repeatRows, 1)
+        self.assertLessEqual(page.wrap(468, 500)[1], 500)
+        fitted = len(page._cellvalues) - 1
+        self.assertEqual(rest.start, fitted)
+        self.assertEqual(rest.header, large.header)
+
+    def test_no_room_for_a_row(self):
+        large = table_flowables(table_data(LARGE_TABLE_ROWS), self.styles)[0]
+        self.assertEqual(large.split(468, 30), [])
+
+    def test_front_ends_agree(self):
+        markdown_text = table_markdown(LARGE_TABLE_ROWS + 50)
+        expected = build_content_story(markdown_text, self.styles, 'html')
+        actual = build_content_story(markdown_text, self.styles, 'ast')
+        self.assertIsInstance(actual[1], LargeTable)
+        self.assertEqual(compare_stories(expected, actual), [])
+
+
+class TestLargeTablePdf(unittest.TestCase):
+    """Test a rendered large table"""
+
+    def test_every_row_once_and_header_on_every_page(self):
+        rows = LARGE_TABLE_ROWS * 2
+        pdf = create_pdf(table_markdown(rows), dict(DEFAULT_CONFIG, markdown_frontend='ast'))
+        pages = [page.extract_text() for page in PdfReader(io.BytesIO(pdf.getvalue())).pages]
+        self.assertGreater(len(pages), 2)
+
+        text = '\n'.join(pages)
+        for r in (0, 1, rows // 2, rows - 1):
+            self.assertEqual(text.count(f"Row {r} cell 0"), 1)
+        for page in pages:
+            self.assertIn('Column 0', page)
+
+
+if __name__ == '__main__':
+    unittest.main()
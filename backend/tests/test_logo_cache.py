@@ -0,0 +1,153 @@
+"""
+Unit tests for uploaded logo normalization and caching
+"""
+import unittest
+import sys
+import os
+import io
+import base64
+import hashlib
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image as PILImage
+
+from logo_cache import InvalidLogo, LogoCache, MAX_LOGO_BYTES, decode_logo, normalize_logo
+
+# 3.5cm x 1.05cm at 300 dpi
+MAX_SIZE = (413, 124)
+
+
+def encode_image(size, mode='RGB', fmt='PNG', exif=None):
+    img = PILImage.new(mode, size, (11, 152, 206, 128)[:len(mode)])
+    output = io.BytesIO()
+    if exif is not None:
+        img.save(output, fmt, exif=exif)
+    else:
+        img.save(output, fmt)
+    return output.getvalue()
+
+
+def open_image(data):
+    return PILImage.open(io.BytesIO(data))
+
+
+class TestNormalizeLogo(unittest.TestCase):
+    """Test fitting logos to the header box"""
+
+    def test_large_logo_downscaled_to_box(self):
+        data, size = normalize_logo(encode_image((4000, 1000)))
+        self.assertEqual(size, (413, 103))
+        self.assertEqual(open_image(data).size, size)
+
+    def test_tall_logo_limited_by_height(self):
+        _, size = normalize_logo(encode_image((1000, 1000)))
+        self.assertEqual(size, (124, 124))
+
+    def test_small_logo_not_upscaled(self):
+        _, size = normalize_logo(encode_image((200, 60)))
+        self.assertEqual(size, (200, 60))
+
+    def test_photo_stays_jpeg(self):
+        data, _ = normalize_logo(encode_image((3000, 2000), fmt='JPEG'))
+        self.assertEqual(open_image(data).format, 'JPEG')
+
+    def test_transparency_kept_as_png(self):
+        image = open_image(normalize_logo(encode_image((800, 200), mode='RGBA'))[0])
+        self.assertEqual(image.format, 'PNG')
+        self.assertEqual(image.mode, 'RGBA')
+
+    def test_exif_orientation_applied(self):
+        exif = PILImage.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees, as phones store portrait photos
+        _, size = normalize_logo(encode_image((200, 100), fmt='JPEG', exif=exif))
+        self.assertEqual(size, (62, 124))
+
+    def test_not_an_image(self):
+        with self.assertRaises(InvalidLogo):
+            normalize_logo(b'not an image')
+
+
+class TestDecodeLogo(unittest.TestCase):
+    """Test validating base64 uploads"""
+
+    def test_digest_is_of_uploaded_bytes(self):
+        data = encode_image((800, 200))
+        logo = decode_logo(base64.b64encode(data).decode())
+        self.assertEqual(logo.digest, hashlib.sha256(data).hexdigest())
+        self.assertEqual(logo.reader().getSize(), logo.size)
+
+    def test_invalid_base64(self):
+        with self.assertRaisesRegex(InvalidLogo, 'Invalid base64'):
+            decode_logo('abc')
+
+    def test_too_large(self):
+        data = b'\0' * (MAX_LOGO_BYTES + 1)
+        with self.assertRaisesRegex(InvalidLogo, '5MB'):
+            decode_logo(base64.b64encode(data))
+
+
+class TestLogoCache(unittest.TestCase):
+    """Test sharing normalized logos across requests"""
+
+    def test_repeat_upload_is_a_hit(self):
+        cache = LogoCache()
+        logo_b64 = base64.b64encode(encode_image((800, 200))).decode()
+        first = cache.get(logo_b64)
+        self.assertIs(cache.get(logo_b64), first)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_readers_are_per_document(self):
+        logo = LogoCache().get(base64.b64encode(encode_image((800, 200))).decode())
+        self.assertIsNot(logo.reader(), logo.reader())
+
+    def test_bounded(self):
+        cache = LogoCache(max_entries=1)
+        cache.get(base64.b64encode(encode_image((10, 10))).decode())
+        cache.get(base64.b64encode(encode_image((20, 10))).decode())
+        self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_errors_not_cached(self):
+        cache = LogoCache()
+        for _ in range(2):
+            with self.assertRaises(InvalidLogo):
+                cache.get(base64.b64encode(b'not an image').decode())
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_non_ascii_rejected(self):
+        with self.assertRaisesRegex(InvalidLogo, 'Invalid base64'):
+            LogoCache().get('logoé')
+
+
+class TestLogoUploadEndpoint(unittest.TestCase):
+    """Test that uploaded logos are embedded at header resolution"""
+
+    @classmethod
+    def setUpClass(cls):
+        from app import app
+        cls.client = app.test_client()
+
+    def test_large_logo_embedded_small(self):
+        from PyPDF2 import PdfReader
+
+        logo_b64 = base64.b64encode(encode_image((3000, 900), fmt='JPEG')).decode()
+        response = self.client.post('/api/convert', json={'markdown': '# Logo', 'logoBase64': logo_b64})
+        self.assertEqual(response.status_code, 200)
+
+        page = PdfReader(io.BytesIO(response.data)).pages[0]
+        form = page['/Resources']['/XObject']['/FormXob.pageChrome'].get_object()
+        images = [xobject.get_object() for xobject in form['/Resources']['/XObject'].values()]
+        self.assertEqual(len(images), 1)
+        self.assertLessEqual(images[0]['/Width'], MAX_SIZE[0])
+        self.assertLessEqual(images[0]['/Height'], MAX_SIZE[1])
+
+    def test_invalid_logo_rejected(self):
+        response = self.client.post('/api/convert', json={'markdown': '# Logo', 'logoBase64': 'bm90IGFuIGltYWdl'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not a valid image', response.get_json()['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Unit tests for mail merge templates and /api/convert/merge
+"""
+import unittest
+import sys
+import os
+import io
+import json
+import zipfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+
+import app
+from mail_merge import MergeTemplate, render_merge, render_records
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+def page_text(pdf_bytes):
+    return PdfReader(io.BytesIO(pdf_bytes)).pages[0].extract_text().split('Page 1 of')[0]
+
+
+class TestMergeTemplate(unittest.TestCase):
+    """Test filling placeholders"""
+
+    def test_fields_and_fill(self):
+        template = MergeTemplate("# Proposal for {{ client }}\n\nDear {{contact}}, {{client}} owes {{{amount}}}.")
+        self.assertEqual(template.fields, ['amount', 'client', 'contact'])
+        filled = template.fill({'client': 'Acme', 'contact': 'Jo', 'amount': '**$5**'})
+        self.assertEqual(filled, "# Proposal for Acme\n\nDear Jo, Acme owes **$5**.")
+
+    def test_missing_values_are_named(self):
+        with self.assertRaises(ValueError) as raised:
+            MergeTemplate("{{a}} {{b}} {{c}}").fill({'b': None})
+        self.assertIn('a, c', str(raised.exception))
+
+    def test_values_render_as_plain_text(self):
+        value = "R&D <Sons> a>b *x* ~~y~~ | [x](y) #1 &lt;"
+        template = MergeTemplate(
+            "# For {{v}}\n\nDear {{v}}\n\n- item {{v}}\n\n| Client |\n|---|\n| {{v}} |\n\n> {{v}}"
+        )
+        for frontend in ('ast', 'html'):
+            config = dict(DEFAULT_CONFIG, markdown_frontend=frontend)
+            text = page_text(app.create_pdf(template.fill({'v': value}), config).getvalue())
+            lines = text.strip().split('\n')
+            self.assertEqual(lines, [f'For {value}', f'Dear {value}', f'• item {value}', 'Client', value,
+                                     value], frontend)
+
+    def test_values_in_code_render_as_written(self):
+        value = "Smith & Sons <b>Inc. A_B *c* &lt;"
+        template = MergeTemplate("# Code\n\n```\nclient = {{v}}\n```\n\nSee `{{v}}` here\n\n    id {{v}}")
+        for frontend in ('ast', 'html'):
+            config = dict(DEFAULT_CONFIG, markdown_frontend=frontend)
+            text = page_text(app.create_pdf(template.fill({'v': value}), config).getvalue())
+            lines = text.strip().split('\n')
+            self.assertEqual(lines, ['Code', f'client = {value}', f'See {value} here', f'id {value}'], frontend)
+
+
+class TestRenderMerge(unittest.TestCase):
+    """Test rendering records with a shared block cache"""
+
+    def test_matches_independent_renders(self):
+        template = "# Proposal for {{client}}\n\nDear {{contact}},\n\n" + FIXTURES['complex']
+        records = [{'client': f'Client {i}', 'contact': f'Person {i}'} for i in range(3)] + [{'client': 'X'}]
+        results = render_merge(template, records, DEFAULT_CONFIG)
+
+        for record, (pdf_bytes, error) in zip(records[:3], results):
+            self.assertIsNone(error)
+            expected = app.create_pdf(MergeTemplate(template).fill(record), DEFAULT_CONFIG).getvalue()
+            self.assertEqual(
+                [page.extract_text() for page in PdfReader(io.BytesIO(pdf_bytes)).pages],
+                [page.extract_text() for page in PdfReader(io.BytesIO(expected)).pages]
+            )
+        self.assertEqual(results[3], (None, 'Missing values for: contact'))
+
+    def test_records_are_rendered_in_chunks(self):
+        chunks = []
+
+        def render_chunk(chunk):
+            chunks.append(len(chunk))
+            if chunk[0] == 4:
+                raise RuntimeError("worker died")
+            return [(str(n).encode(), None) for n in chunk]
+
+        results = sorted(render_records(list(range(7)), render_chunk, workers=2, chunk_size=2))
+        self.assertEqual(sorted(chunks), [1, 2, 2, 2])
+        self.assertEqual(results[3], (3, b'3', None))
+        self.assertEqual(results[4], (4, None, 'worker died'))
+        self.assertEqual(results[5], (5, None, 'worker died'))
+
+
+class TestMergeEndpoint(unittest.TestCase):
+    """Test /api/convert/merge"""
+
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_zip_of_merged_pdfs(self):
+        response = self.client.post('/api/convert/merge', json={
+            'markdown': "# Proposal for {{client}}\n\nFee: {{fee}}",
+            'records': [{'client': 'Acme', 'fee': '$1'}, {'client': 'Beta', 'fee': '$2'}, {'client': 'Gamma'}],
+            'nameTemplate': 'proposal-{{client}}',
+        })
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual([entry['file'] for entry in manifest['documents']],
+                         ['proposal-Acme.pdf', 'proposal-Beta.pdf', 'proposal-Gamma.pdf'])
+        self.assertEqual(manifest['failed'], 1)
+        self.assertIn('Fee: $2', page_text(archive.read('proposal-Beta.pdf')))
+
+    def test_invalid_merges_are_rejected(self):
+        for body in ({'records': [{}]}, {'markdown': '# {{x}}'}, {'markdown': '# {{x}}', 'records': [1]}):
+            self.assertEqual(self.client.post('/api/convert/merge', json=body).status_code, 400, body)
+
+
+class TestSignatureVariables(unittest.TestCase):
+    """Test filling variables into a document sent for signature"""
+
+    def test_document_name_is_not_escaped(self):
+        sent = {}
+
+        def send_envelope_for_signature(pdf_buffer, **kwargs):
+            sent.update(kwargs, pdf=pdf_buffer.getvalue())
+            return {'envelope_id': 'e1', 'status': 'sent', 'recipient': {}, 'counter_signer': {}}
+
+        with patch.object(app.docusign_client, 'send_envelope_for_signature', send_envelope_for_signature):
+            response = app.app.test_client().post('/api/docusign/send-for-signature', json={
+                'markdown': "# Proposal for {{client}}\n\nFee: {{fee}}",
+                'variables': {'client': 'Smith & Sons Inc.', 'fee': '$5'},
+                'recipient_name': 'Jo Smith',
+                'recipient_email': 'jo@example.com',
+            })
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertEqual(sent['document_name'], 'Proposal for Smith & Sons Inc.')
+        self.assertIn('Proposal for Smith & Sons Inc.', page_text(sent['pdf']))
+
+
+if __name__ == '__main__':
+    unittest.main()
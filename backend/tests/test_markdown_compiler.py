@@ -0,0 +1,162 @@
+"""
+Unit tests for the markdown compiler front end
+Checks that compiled stories match the markdown2 + HTMLToReportLab path
+"""
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import renderer
+from renderer import create_pdf, build_content_story, render_html_story
+from themes import get_theme
+import markdown_compiler
+from markdown_compiler import (
+    BlockParser, UnsupportedMarkdown, compile_markdown, compare_stories,
+    story_signature, register_backend, get_backend, DEFAULT_BACKEND
+)
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+# Markdown the compiler must reproduce exactly, beyond the shared fixtures
+CONFORMANCE_CASES = {
+    'nested_lists': "- one\n    - two\n        - three\n- four\n\n1. a\n2. b\n",
+    'loose_list': "- first\n\n- second\n\n  more text\n",
+    'task_list': "- [ ] todo\n- [x] done\n",
+    'blockquote': "> quoted *text*\n> with **bold**\n\nafter\n",
+    'fenced_code': "```\nline one\n  indented <tag> & more\n```\n",
+    'indented_code': "para\n\n    code block\n    second\n\ntext\n",
+    'table': "| A | **B** |\n|---|---|\n| `x` | [l](http://x.y) |\n",
+    'strike': "keep ~~gone~~ keep\n",
+    'headings': "# H1\n## H2\n### H3\n#### H4\ntext under h4\n\nSetext\n======\n",
+    'separators': "a\n\n***\n\n___\n\n==========\n",
+    'entities': "AT&T &copy; 1 < 2 > 0 &amp; done\n",
+    'escapes': "\\*not em\\* and \\_not\\_ \\# hash\n",
+    'breaks': "line one\nline two  \nline three\n",
+    'autolink': "see <https://example.com/path> now\n",
+    'image_alt': "![missing](no/such/file.png)\n",
+    'ordered_start': "3. three\n4. four\n",
+}
+
+# Markdown the compiler hands back to the HTML path
+UNSUPPORTED_CASES = [
+    "- item\n\n    ```\n    code\n    ```\n",
+    "<div>raw html</div>\n",
+    "[ref][1]\n\n[1]: http://example.com\n",
+    "text[^1]\n",
+    "- item\n    # heading in list\n",
+]
+
+
+class TestMarkdownCompiler(unittest.TestCase):
+    """Compare the compiler with the HTML front end"""
+
+    def setUp(self):
+        self.styles = get_theme()
+
+    def assertSameStory(self, markdown_text):
+        expected = render_html_story(markdown_text, self.styles)
+        actual = compile_markdown(markdown_text, self.styles)
+        self.assertEqual(compare_stories(expected, actual), [])
+
+    def test_fixtures_match_html_path(self):
+        for name, markdown_text in FIXTURES.items():
+            with self.subTest(fixture=name):
+                self.assertSameStory(markdown_text)
+
+    def test_conformance_cases(self):
+        for name, markdown_text in CONFORMANCE_CASES.items():
+            with self.subTest(case=name):
+                self.assertSameStory(markdown_text)
+
+    def test_unsupported_markdown_raises(self):
+        for markdown_text in UNSUPPORTED_CASES:
+            with self.subTest(markdown=markdown_text):
+                with self.assertRaises(UnsupportedMarkdown):
+                    compile_markdown(markdown_text, self.styles)
+
+    def test_ast_front_end_falls_back(self):
+        """Unsupported markdown still renders, through the HTML path"""
+        for markdown_text in UNSUPPORTED_CASES:
+            with self.subTest(markdown=markdown_text):
+                expected = render_html_story(markdown_text, self.styles)
+                actual = build_content_story(markdown_text, self.styles, 'ast')
+                self.assertEqual(compare_stories(expected, actual), [])
+
+    def test_block_tree(self):
+        blocks = BlockParser().parse("# Title\n\n- a\n- b\n")
+        self.assertEqual(blocks[0][0], 'heading')
+        self.assertEqual(blocks[0][1], 1)
+        self.assertEqual(blocks[1][0], 'list')
+        self.assertEqual(len(blocks[1][3]), 2)
+
+    def test_story_signature(self):
+        story = compile_markdown("# Title\n\nSome   *text*\n", self.styles)
+        signature = story_signature(story)
+        self.assertEqual(signature[0], ('Paragraph', 'CustomHeading1', 'Title'))
+        self.assertEqual(signature[1], ('Paragraph', 'CustomBody', 'Some <i>text</i>'))
+
+    def test_unknown_front_end(self):
+        with self.assertRaises(ValueError):
+            build_content_story("text", self.styles, 'no-such-front-end')
+
+
+class TestParserBackends(unittest.TestCase):
+    """Test the pluggable parser backend registry"""
+
+    def test_default_backend(self):
+        self.assertIsInstance(get_backend(), BlockParser)
+        self.assertIsInstance(get_backend(DEFAULT_BACKEND), BlockParser)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_backend('no-such-backend')
+
+    def test_register_backend(self):
+        class HeadingOnly:
+            def parse(self, markdown_text):
+                return [('heading', 1, [('text', markdown_text.strip())])]
+
+        # Registered for this test only; the registry is shared by the whole process
+        with patch.dict(markdown_compiler._backends):
+            register_backend('heading-only', HeadingOnly)
+            story = compile_markdown("Plain", get_theme(), backend='heading-only')
+        self.assertEqual(story_signature(story), [('Paragraph', 'CustomHeading1', 'Plain')])
+        with self.assertRaises(ValueError):
+            get_backend('heading-only')
+
+
+class TestFrontEndSelection(unittest.TestCase):
+    """Test the markdown_frontend option of create_pdf"""
+
+    def test_each_front_end_renders(self):
+        for frontend in ('ast', 'html', 'conformance'):
+            with self.subTest(frontend=frontend):
+                config = dict(DEFAULT_CONFIG, markdown_frontend=frontend)
+                pdf_buffer = create_pdf(FIXTURES['complex'], config)
+                self.assertTrue(pdf_buffer.getvalue().startswith(b'%PDF'))
+
+    def test_conformance_mode_logs_nothing_for_fixtures(self):
+        config = dict(DEFAULT_CONFIG, markdown_frontend='conformance')
+        with self.assertNoLogs(renderer.logger, level='WARNING'):
+            for markdown_text in FIXTURES.values():
+                create_pdf(markdown_text, config)
+
+    def test_conformance_mode_reports_mismatch(self):
+        class Shouting:
+            def parse(self, markdown_text):
+                return [('paragraph', [('text', markdown_text.upper())])]
+
+        with patch.dict(markdown_compiler._backends), patch.object(markdown_compiler, 'DEFAULT_BACKEND', 'shouting'):
+            register_backend('shouting', Shouting)
+            with self.assertLogs(renderer.logger, level='WARNING'):
+                story = build_content_story("quiet", get_theme(), 'conformance')
+        # The HTML story is still the one that gets rendered
+        self.assertEqual(story_signature(story), [('Paragraph', 'CustomBody', 'quiet')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Unit tests for page stream compression in the thread pool
+"""
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab import rl_config
+
+import page_compression
+import renderer
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+LONG = "\n\n".join([FIXTURES['complex']] * 20)
+
+
+class TestCompressPages(unittest.TestCase):
+    """Test that compressed pages are the bytes ReportLab writes itself"""
+
+    def setUp(self):
+        # Fixed dates and IDs, so two renders can be compared
+        patcher = patch.object(rl_config, 'invariant', 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def render(self, markdown_text, config=DEFAULT_CONFIG):
+        return renderer.create_pdf(markdown_text, config).getvalue()
+
+    def render_serially(self, markdown_text, config=DEFAULT_CONFIG):
+        with patch.object(renderer, 'compress_pages', lambda canvas: None):
+            return self.render(markdown_text, config)
+
+    def test_pool_matches_reportlab(self):
+        with patch.object(page_compression, 'PAGES_PER_TASK', 4):
+            pdf = self.render(LONG)
+        self.assertEqual(pdf, self.render_serially(LONG))
+        self.assertIn(b'/Filter [ /ASCII85Decode /FlateDecode ]', pdf)
+
+    def test_saving_thread_matches_reportlab(self):
+        config = dict(DEFAULT_CONFIG, include_title_page=True, include_signature_page=True)
+        with patch.object(page_compression, 'COMPRESS_THREADS', 0):
+            pdf = self.render(LONG, config)
+        self.assertEqual(pdf, self.render_serially(LONG, config))
+        self.assertEqual(self.render(FIXTURES['simple']), self.render_serially(FIXTURES['simple']))
+
+    def test_without_ascii85(self):
+        with patch.object(rl_config, 'useA85', 0), patch.object(page_compression, 'PAGES_PER_TASK', 4):
+            pdf = self.render(LONG)
+            self.assertEqual(pdf, self.render_serially(LONG))
+        self.assertNotIn(b'ASCII85Decode', pdf)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Unit tests for the precompiled title and signature page templates
+"""
+import unittest
+import sys
+import os
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+from reportlab import rl_config
+from reportlab.graphics.shapes import Drawing, Rect, String
+from reportlab.graphics import renderPDF
+from reportlab.pdfgen import canvas
+
+from renderer import create_pdf, create_signature_page
+from page_templates import PrerenderedDrawing, TemplateCache, templates
+from themes import get_theme
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+def page_streams(pdf_buffer):
+    reader = PdfReader(io.BytesIO(pdf_buffer.getvalue()))
+    return [page.get_contents().get_data() for page in reader.pages]
+
+
+class TestPrerenderedDrawing(unittest.TestCase):
+    """Test replaying a drawing's operators into other documents"""
+
+    def _render(self, draw):
+        output = canvas.Canvas(io.BytesIO())
+        # Use up a font name so the replay has to map it
+        output.setFont('Courier', 10)
+        draw(output)
+        return '\n'.join(output._code)
+
+    def test_replay_matches_direct_render(self):
+        drawing = Drawing(100, 50)
+        drawing.add(Rect(10, 10, 80, 30, fillColor=None))
+        prerendered = PrerenderedDrawing(drawing, 100, 50)
+        self.assertTrue(prerendered.replayable)
+
+        direct = self._render(lambda canv: renderPDF.draw(drawing, canv, 0, 0))
+        replayed = self._render(prerendered.draw)
+        self.assertEqual(direct.split(), replayed.split())
+
+    def test_text_is_drawn_per_document(self):
+        """Text registers glyphs with the document, so it cannot be replayed"""
+        drawing = Drawing(100, 50)
+        drawing.add(String(10, 10, 'Logo'))
+        prerendered = PrerenderedDrawing(drawing, 100, 50)
+        self.assertFalse(prerendered.replayable)
+
+        direct = self._render(lambda canv: renderPDF.draw(drawing, canv, 0, 0))
+        self.assertEqual(self._render(prerendered.draw), direct)
+
+
+class TestTemplateCache(unittest.TestCase):
+    """Test building templates once per name and version"""
+
+    def test_builds_once_per_version(self):
+        cache = TemplateCache()
+        builds = []
+
+        def build():
+            builds.append(1)
+            return object()
+
+        first = cache.get('logo', build, version='a')
+        self.assertIs(cache.get('logo', build, version='a'), first)
+        self.assertIsNot(cache.get('logo', build, version='b'), first)
+        self.assertEqual(len(builds), 2)
+
+
+class TestTemplatePages(unittest.TestCase):
+    """Test that shared template pages render like freshly built ones"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.invariant = rl_config.invariant
+        rl_config.invariant = 1
+
+    @classmethod
+    def tearDownClass(cls):
+        rl_config.invariant = cls.invariant
+
+    def setUp(self):
+        self.config = dict(DEFAULT_CONFIG, include_title_page=True, include_signature_page=True)
+
+    def test_signature_page_is_shared(self):
+        styles = get_theme()
+        first = create_signature_page(self.config, styles)
+        second = create_signature_page(self.config, styles)
+        self.assertIsNot(first[-1], second[-1])
+        self.assertIs(first[-1].prebuilt, second[-1].prebuilt)
+
+    def test_shared_pages_match_fresh_build(self):
+        templates.clear()
+        fresh = page_streams(create_pdf(FIXTURES['simple'], self.config))
+        shared = page_streams(create_pdf(FIXTURES['simple'], self.config))
+        self.assertEqual(fresh, shared)
+
+    def test_concurrent_builds(self):
+        expected = page_streams(create_pdf(FIXTURES['table'], self.config))
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(
+                lambda _: page_streams(create_pdf(FIXTURES['table'], self.config)), range(8)
+            ))
+        for streams in results:
+            self.assertEqual(streams, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
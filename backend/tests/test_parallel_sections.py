@@ -0,0 +1,123 @@
+"""
+Unit tests for parallel section rendering
+"""
+import unittest
+import sys
+import os
+import io
+import base64
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from PyPDF2 import PdfReader
+
+import app
+import parallel_sections
+from parallel_sections import split_sections
+from pdf_spool import PDFSpool
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+def chapters(count):
+    return "\n\n".join(
+        f"# Chapter {i}\n\n" + "\n\n".join(FIXTURES['complex'].split('\n\n')[1:]) for i in range(count)
+    )
+
+
+class TestSplitSections(unittest.TestCase):
+    """Test splitting markdown at H1 headings"""
+
+    def test_splits_at_h1(self):
+        sections = split_sections("# One\n\nBody\n\n## Sub\n\nMore\n\n# Two\n\nBody", parts=8)
+        self.assertEqual(sections, ["# One\n\nBody\n\n## Sub\n\nMore\n", "# Two\n\nBody"])
+
+    def test_preamble_is_its_own_section(self):
+        self.assertEqual(split_sections("Intro\n\n# One\n\nBody", parts=8), ["Intro\n", "# One\n\nBody"])
+
+    def test_code_comments_are_not_headings(self):
+        markdown_text = "# One\n\n```\n\n# not a heading\n```\n\n# Two"
+        self.assertEqual(len(split_sections(markdown_text, parts=8)), 2)
+
+    def test_sections_are_grouped_into_parts(self):
+        markdown_text = "\n\n".join(f"# Section {i}\n\nBody" for i in range(10))
+        sections = split_sections(markdown_text, parts=3)
+        self.assertEqual(len(sections), 3)
+        self.assertEqual("\n".join(sections), markdown_text)
+
+
+class TestSectionPageBreaks(unittest.TestCase):
+    """Test that section page breaks start every H1 on a new page"""
+
+    def test_each_chapter_starts_a_page(self):
+        config = dict(DEFAULT_CONFIG, section_page_breaks=True)
+        reader = PdfReader(app.create_pdf("# One\n\nBody\n\n# Two\n\nBody\n\n# Three", config))
+        self.assertEqual(len(reader.pages), 3)
+        self.assertEqual(len(PdfReader(app.create_pdf("# One\n\nBody\n\n# Two\n\nBody", DEFAULT_CONFIG)).pages), 1)
+
+
+class TestParallelRender(unittest.TestCase):
+    """Test that sections rendered in workers match the serial path page for page"""
+
+    def setUp(self):
+        self.saved = parallel_sections.SECTION_WORKERS, parallel_sections.SECTION_MIN_CHARS
+        parallel_sections.SECTION_MIN_CHARS = 0
+
+    def tearDown(self):
+        parallel_sections.SECTION_WORKERS, parallel_sections.SECTION_MIN_CHARS = self.saved
+        parallel_sections.shutdown()
+
+    def render(self, markdown_text, config, workers):
+        parallel_sections.SECTION_WORKERS = workers
+        return PdfReader(app.create_pdf(markdown_text, config))
+
+    def assertSamePages(self, markdown_text, config):
+        serial = self.render(markdown_text, config, 0)
+        parallel = self.render(markdown_text, config, 2)
+        self.assertEqual(len(parallel.pages), len(serial.pages))
+        for number, (left, right) in enumerate(zip(serial.pages, parallel.pages), 1):
+            self.assertEqual(left.extract_text(), right.extract_text(), f"page {number}")
+        return parallel
+
+    def test_matches_serial(self):
+        config = dict(DEFAULT_CONFIG, section_page_breaks=True)
+        reader = self.assertSamePages(chapters(4), config)
+        self.assertIn(f"Page 1 of {len(reader.pages)}", reader.pages[0].extract_text())
+
+    def test_title_and_signature_pages(self):
+        config = dict(DEFAULT_CONFIG, section_page_breaks=True,
+                      include_title_page=True, include_signature_page=True)
+        reader = self.assertSamePages(chapters(4), config)
+        self.assertNotIn("Page", reader.pages[0].extract_text())
+        self.assertIn("Approval & Signatures", reader.pages[-1].extract_text())
+
+    def test_pages_with_images(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 100), (11, 152, 206)).save(buffer, 'PNG')
+        image = f"![chart](data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()})"
+        markdown_text = "\n\n".join(f"# Chapter {i}\n\nText\n\n{image}" for i in range(4))
+        reader = self.assertSamePages(markdown_text, dict(DEFAULT_CONFIG, section_page_breaks=True))
+        for page in reader.pages:
+            self.assertEqual(len(page['/Resources']['/XObject']), 2)
+
+    def test_merges_into_output(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        config = dict(DEFAULT_CONFIG, section_page_breaks=True)
+        parallel_sections.SECTION_WORKERS = 2
+        pdf = app.create_pdf(chapters(4), config, output=PDFSpool(threshold=0, directory=directory)).finish()
+        serial = self.render(chapters(4), config, 0)
+        self.assertEqual([page.extract_text() for page in PdfReader(pdf.path).pages],
+                         [page.extract_text() for page in serial.pages])
+
+    def test_needs_section_page_breaks(self):
+        parallel_sections.SECTION_WORKERS = 2
+        self.assertFalse(parallel_sections.enabled(chapters(4), DEFAULT_CONFIG))
+        self.assertTrue(parallel_sections.enabled(chapters(4), dict(DEFAULT_CONFIG, section_page_breaks=True)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Tests for the rendered-PDF cache and ETag handling on /api/convert
+"""
+import unittest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_cache import PDFCache
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+
+class TestPDFCache(unittest.TestCase):
+    """Test the LRU cache in isolation"""
+
+    def test_key_ignores_line_endings(self):
+        """CRLF and LF versions of a document share a key"""
+        key1 = PDFCache.make_key("# Title\n\nBody\n", DEFAULT_CONFIG)
+        key2 = PDFCache.make_key("# Title\r\n\r\nBody\r\n", DEFAULT_CONFIG)
+        self.assertEqual(key1, key2)
+
+    def test_key_covers_config(self):
+        """Letterhead, disclaimer, page flags and logo all change the key"""
+        base = PDFCache.make_key(FIXTURES['simple'], DEFAULT_CONFIG)
+
+        variants = [
+            dict(DEFAULT_CONFIG, disclaimer='Other disclaimer'),
+            dict(DEFAULT_CONFIG, letterhead=dict(DEFAULT_CONFIG['letterhead'], company='Other Co')),
+            dict(DEFAULT_CONFIG, include_title_page=True),
+            dict(DEFAULT_CONFIG, include_signature_page=True),
+        ]
+        for config in variants:
+            self.assertNotEqual(base, PDFCache.make_key(FIXTURES['simple'], config))
+
+        self.assertNotEqual(base, PDFCache.make_key(FIXTURES['simple'], DEFAULT_CONFIG, logo_digest='abc'))
+
+    def test_key_ignores_logo_path(self):
+        """Temp file names for uploaded logos must not defeat the cache"""
+        key1 = PDFCache.make_key("x", dict(DEFAULT_CONFIG, logo_path='/tmp/a.png'), logo_digest='abc')
+        key2 = PDFCache.make_key("x", dict(DEFAULT_CONFIG, logo_path='/tmp/b.png'), logo_digest='abc')
+        self.assertEqual(key1, key2)
+
+    def test_hit_and_miss_counters(self):
+        cache = PDFCache(max_bytes=1000)
+        self.assertIsNone(cache.get('a'))
+        etag = cache.put('a', b'%PDF-data')
+        self.assertEqual(cache.get('a'), (b'%PDF-data', etag))
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size_bytes'], len(b'%PDF-data'))
+
+    def test_evicts_least_recently_used(self):
+        cache = PDFCache(max_bytes=250, max_entry_bytes=250)
+        cache.put('a', b'a' * 100)
+        cache.put('b', b'b' * 100)
+        cache.get('a')  # 'b' is now least recently used
+        cache.put('c', b'c' * 100)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_oversized_entries_not_cached(self):
+        cache = PDFCache(max_bytes=1000, max_entry_bytes=100)
+        cache.put('big', b'x' * 101)
+        self.assertIsNone(cache.get('big'))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+class TestConvertEndpointCaching(unittest.TestCase):
+    """Test ETag / If-None-Match behaviour of /api/convert"""
+
+    @classmethod
+    def setUpClass(cls):
+        from app import app, pdf_cache
+        cls.client = app.test_client()
+        cls.pdf_cache = pdf_cache
+
+    def setUp(self):
+        self.pdf_cache.clear()
+
+    def _convert(self, headers=None):
+        return self.client.post('/api/convert', json={'markdown': FIXTURES['simple']}, headers=headers or {})
+
+    def test_repeat_request_served_from_cache(self):
+        first = self._convert()
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers.get('ETag')
+        self.assertTrue(etag)
+
+        hits_before = self.pdf_cache.stats()['hits']
+        second = self._convert()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.headers.get('ETag'), etag)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.pdf_cache.stats()['hits'], hits_before + 1)
+
+    def test_if_none_match_returns_304(self):
+        first = self._convert()
+        etag = first.headers['ETag']
+
+        response = self._convert(headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
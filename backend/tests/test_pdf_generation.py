@@ -11,7 +11,7 @@ from PyPDF2 import PdfReader
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import create_pdf
+from renderer import create_pdf
 from tests.fixtures import FIXTURES, DEFAULT_CONFIG
 
 
@@ -163,6 +163,43 @@ class TestPDFGeneration(unittest.TestCase):
         # Page numbers are drawn on canvas, not as text objects
         # We can at least verify the PDF is valid and has correct page count
 
+    def test_page_number_slot_in_body_text(self):
+        """Test that text matching the page number placeholder is left alone"""
+        markdown = "# Budget\n\nA line reading % page number in prose.\n\n```\n% page number\n```\n"
+        reader = self._verify_pdf_valid(self._generate_pdf(markdown))
+        text = reader.pages[0].extract_text()
+        self.assertEqual(text.count('% page number'), 2)
+        self.assertIn('Page 1 of 1', text)
+
+    def test_page_numbering_with_title_page(self):
+        """Test that the title page is unnumbered and not counted"""
+        long_markdown = FIXTURES['complex'] + "\n\n" + FIXTURES['complex']
+        config = DEFAULT_CONFIG.copy()
+        config['include_title_page'] = True
+        pdf_buffer = self._generate_pdf(long_markdown, config)
+
+        reader = self._verify_pdf_valid(pdf_buffer)
+        numbered_pages = len(reader.pages) - 1
+        self.assertGreater(numbered_pages, 1)
+
+        self.assertNotIn('Page ', reader.pages[0].extract_text())
+        for page_number, page in enumerate(reader.pages[1:], 1):
+            self.assertIn(f'Page {page_number} of {numbered_pages}', page.extract_text())
+
+    def test_letterhead_drawn_once(self):
+        """Test that every page shares one letterhead and footer form"""
+        long_markdown = FIXTURES['complex'] + "\n\n" + FIXTURES['complex']
+        pdf_buffer = self._generate_pdf(long_markdown)
+        reader = self._verify_pdf_valid(pdf_buffer)
+        self.assertGreater(len(reader.pages), 1)
+
+        forms = set()
+        for page in reader.pages:
+            xobjects = page['/Resources']['/XObject']
+            forms.add(xobjects.raw_get('/FormXob.pageChrome').idnum)
+            self.assertIn('Test Company', page.extract_text())
+        self.assertEqual(len(forms), 1)
+
     def test_custom_config(self):
         """Test PDF generation with custom configuration"""
         custom_config = {
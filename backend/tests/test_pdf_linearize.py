@@ -0,0 +1,135 @@
+"""
+Unit tests for linearized ("fast web view") PDF output
+"""
+import unittest
+import sys
+import os
+import io
+import re
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject
+
+import app
+import parallel_sections
+from pdf_linearize import linearize
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+LONG = "\n\n".join(f"# Chapter {i}\n\n" + FIXTURES['complex'] for i in range(4))
+
+
+def linearization(pdf):
+    """The linearization dictionary's values, which must be in the first object"""
+    match = re.match(rb'%PDF-1\.\d\n[^\n]*\n\d+ 0 obj\n<< /Linearized 1 (.*?)>>', pdf, re.S)
+    values = {key.decode(): [int(number) for number in numbers.split()]
+              for key, numbers in re.findall(rb'/(\w+) \[?([\d ]+)', match.group(1))}
+    values = {key: numbers if key == 'H' else numbers[0] for key, numbers in values.items()}
+    values['end'] = match.end()
+    return values
+
+
+def first_page_objects(reader):
+    """Numbers of the objects page 1 draws with, the page itself included"""
+    page = reader.pages[0]
+    found = {page.indirect_reference.idnum}
+    stack = [page[key] for key in page if key != '/Parent']
+    while stack:
+        value = stack.pop()
+        if isinstance(value, IndirectObject):
+            if value.idnum in found:
+                continue
+            found.add(value.idnum)
+            value = value.get_object()
+        if isinstance(value, DictionaryObject):
+            stack.extend(value.values())
+        elif isinstance(value, ArrayObject):
+            stack.extend(value)
+    return found
+
+
+class TestLinearize(unittest.TestCase):
+    """Test the layout of linearized PDFs"""
+
+    @classmethod
+    def setUpClass(cls):
+        config = dict(DEFAULT_CONFIG, include_title_page=True, include_signature_page=True)
+        cls.original = app.create_pdf(LONG, config).getvalue()
+        cls.pdf = linearize(cls.original).getvalue()
+        cls.reader = PdfReader(io.BytesIO(cls.pdf))
+
+    def test_linearization_dictionary(self):
+        values = linearization(self.pdf)
+        self.assertLess(values['end'], 1024)
+        self.assertEqual(values['L'], len(self.pdf))
+        self.assertEqual(values['N'], len(self.reader.pages))
+        self.assertEqual(values['O'], self.reader.pages[0].indirect_reference.idnum)
+        self.assertLess(values['E'], len(self.pdf))
+
+        hint_offset, hint_length = values['H']
+        hint = self.pdf[hint_offset:hint_offset + hint_length]
+        self.assertRegex(hint, rb'^\d+ 0 obj\n<< /Filter /FlateDecode /Length \d+ /S \d+ >>\nstream\n')
+        self.assertTrue(hint.endswith(b'endobj\n'))
+
+        # /T is the end of the main xref's header line; the file's startxref is the first-page xref
+        self.assertRegex(self.pdf[:values['T'] + 1], rb'\nxref\n0 \d+\n$')
+        startxref = int(self.pdf[self.pdf.rindex(b'startxref') + 9:].split()[0])
+        self.assertEqual(self.pdf[values['end']:startxref], b'\nendobj\n')
+        self.assertTrue(self.pdf[startxref:].startswith(b'xref\n'))
+
+    def test_first_page_is_before_its_end(self):
+        end = linearization(self.pdf)['E']
+        offsets = self.reader.xref[0]
+        for number in first_page_objects(self.reader):
+            self.assertLess(offsets[number], end)
+        later = self.reader.pages[1].indirect_reference.idnum
+        self.assertGreaterEqual(offsets[later], end)
+
+    def test_same_pages(self):
+        original = PdfReader(io.BytesIO(self.original))
+        self.assertEqual(len(self.reader.pages), len(original.pages))
+        for page, original_page in zip(self.reader.pages, original.pages):
+            self.assertEqual(page.extract_text(), original_page.extract_text())
+        self.assertEqual(self.reader.metadata.title, original.metadata.title)
+
+    def test_single_page(self):
+        pdf = linearize(app.create_pdf(FIXTURES['simple'], DEFAULT_CONFIG).getvalue()).getvalue()
+        values = linearization(pdf)
+        self.assertEqual((values['N'], values['L']), (1, len(pdf)))
+        self.assertEqual(len(PdfReader(io.BytesIO(pdf)).pages), 1)
+
+    def test_sectioned_output(self):
+        saved = parallel_sections.SECTION_WORKERS, parallel_sections.SECTION_MIN_CHARS
+        parallel_sections.SECTION_WORKERS, parallel_sections.SECTION_MIN_CHARS = 2, 0
+        try:
+            config = dict(DEFAULT_CONFIG, section_page_breaks=True, linearize=True)
+            pdf = app.create_pdf(LONG, config).getvalue()
+        finally:
+            parallel_sections.SECTION_WORKERS, parallel_sections.SECTION_MIN_CHARS = saved
+        values = linearization(pdf)
+        self.assertEqual(values['N'], len(PdfReader(io.BytesIO(pdf)).pages))
+        self.assertEqual(values['L'], len(pdf))
+
+
+class TestConvertLinearized(unittest.TestCase):
+    """Test the linearize option of /api/convert"""
+
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_option(self):
+        markdown_text = FIXTURES['complex'] + "\n\nLinearized"
+        response = self.client.post('/api/convert', json={'markdown': markdown_text, 'linearize': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(linearization(response.data)['L'], len(response.data))
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+
+        plain = self.client.post('/api/convert', json={'markdown': markdown_text})
+        self.assertNotIn(b'/Linearized', plain.data[:1024])
+        self.assertNotEqual(plain.headers['ETag'], response.headers['ETag'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Unit tests for the PDF size optimizer
+"""
+import unittest
+import sys
+import os
+import io
+import re
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+
+import app
+from pdf_linearize import linearize
+from pdf_optimize import minimize_content, optimize
+from tests.fixtures import FIXTURES, DEFAULT_CONFIG
+
+LONG = "\n\n".join(f"# Chapter {i}\n\n" + FIXTURES['complex'] for i in range(4))
+
+
+class TestMinimizeContent(unittest.TestCase):
+    """Test dropping operators that change nothing drawn"""
+
+    def test_repeated_state(self):
+        content = b"BT /F1 12 Tf 14 TL (a) Tj T* ET\n.5 g BT /F1 12 Tf 14 TL (b) Tj T* ET .5 g 0 0 10 10 re f\n"
+        self.assertEqual(minimize_content(content),
+                         b"BT\n/F1 12 Tf\n14 TL\n(a) Tj\nT*\nET\n.5 g\nBT\n(b) Tj\nT*\nET\n0 0 10 10 re\nf\n")
+
+    def test_state_restored_by_q_is_set_again(self):
+        content = b"1 0 0 RG 0 0 m 1 1 l S q 0 1 0 RG 0 0 m 5 5 l S Q 0 1 0 RG 0 0 m 9 9 l S\n"
+        self.assertEqual(minimize_content(content).count(b' RG'), 3)
+        content = b"1 0 0 RG q 0 0 m 5 5 l S Q 1 0 0 RG 0 0 m 9 9 l S\n"
+        self.assertEqual(minimize_content(content).count(b' RG'), 1)
+
+    def test_unused_state(self):
+        content = b"1 0 0 1 0 0 cm BT /F1 12 Tf 14.4 TL ET q .2 g BT /F2 9 Tf 10 TL (a) Tj ET Q\n"
+        self.assertEqual(minimize_content(content), b"q\n.2 g\nBT\n/F2 9 Tf\n(a) Tj\nET\nQ\n")
+
+    def test_blocks_that_draw_nothing(self):
+        content = b"q 1 0 0 1 78 490 cm q 0 0 0 RG 1 w Q Q q 1 0 0 1 5 5 cm /Im0 Do Q\n"
+        self.assertEqual(minimize_content(content), b"q\n1 0 0 1 5 5 cm\n/Im0 Do\nQ\n")
+
+    def test_state_is_kept_for_a_following_stream(self):
+        content = b"BT /F1 12 Tf ET\n"
+        self.assertEqual(minimize_content(content), b"")
+        self.assertEqual(minimize_content(content, followed=True), b"BT\n/F1 12 Tf\nET\n")
+
+    def test_strings_and_arrays(self):
+        content = b"BT /F1 9 Tf (q Q \\) Tf \\(x) Tj [(a) -250 (b)] TJ <48 69> Tj ET\n"
+        self.assertEqual(minimize_content(content),
+                         b"BT\n/F1 9 Tf\n(q Q \\) Tf \\(x) Tj\n[ (a) -250 (b) ] TJ\n<48 69> Tj\nET\n")
+
+    def test_inline_images_are_left_alone(self):
+        content = b"q 10 0 0 10 0 0 cm BI /W 1 /H 1 /BPC 8 /CS /G ID \xff EI Q\n"
+        self.assertEqual(minimize_content(content), content)
+
+
+class TestOptimize(unittest.TestCase):
+    """Test optimized PDFs against ReportLab's own"""
+
+    @classmethod
+    def setUpClass(cls):
+        config = dict(DEFAULT_CONFIG, include_title_page=True, include_signature_page=True)
+        cls.original = app.create_pdf(LONG, config).getvalue()
+        cls.text = [page.extract_text() for page in PdfReader(io.BytesIO(cls.original)).pages]
+
+    def assertSamePages(self, pdf):
+        self.assertEqual([page.extract_text() for page in PdfReader(io.BytesIO(pdf)).pages], self.text)
+
+    def test_profiles(self):
+        sizes = {}
+        for profile in ('fast', 'small'):
+            with self.assertLogs('pdf_optimize', 'INFO') as logs:
+                pdf = optimize(self.original, profile).getvalue()
+            self.assertSamePages(pdf)
+            self.assertTrue(pdf.startswith(b'%PDF-1.5'))
+            self.assertIn(b'/Type /ObjStm', pdf)
+            self.assertIn(b'/Type /XRef', pdf)
+            self.assertNotIn(b'ASCII85Decode', pdf)
+            self.assertNotRegex(pdf, rb'\nxref\n')
+            self.assertIn(f'saved_bytes={len(self.original) - len(pdf)}', logs.output[0])
+            sizes[profile] = len(pdf)
+        self.assertLess(sizes['fast'], len(self.original) * 0.9)
+        self.assertLessEqual(sizes['small'], sizes['fast'])
+
+    def test_into_file(self):
+        output = io.BytesIO()
+        self.assertIs(optimize(self.original, 'fast', output), output)
+        self.assertEqual(output.getvalue(), optimize(self.original, 'fast').getvalue())
+
+    def test_plain_xref_for_linearizing(self):
+        pdf = optimize(self.original, 'small', object_streams=False).getvalue()
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertNotIn(b'/ObjStm', pdf)
+        self.assertSamePages(pdf)
+        linearized = linearize(pdf).getvalue()
+        self.assertSamePages(linearized)
+        self.assertLess(len(linearized), len(linearize(self.original).getvalue()))
+
+
+class TestConvertOptimized(unittest.TestCase):
+    """Test the optimize option of /api/convert"""
+
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_option(self):
+        markdown_text = FIXTURES['complex'] + "\n\nOptimized"
+        plain = self.client.post('/api/convert', json={'markdown': markdown_text})
+        small = self.client.post('/api/convert', json={'markdown': markdown_text, 'optimize': 'small'})
+        self.assertEqual(small.status_code, 200)
+        self.assertLess(len(small.data), len(plain.data))
+        self.assertNotEqual(small.headers['ETag'], plain.headers['ETag'])
+
+        both = self.client.post('/api/convert', json={'markdown': markdown_text, 'optimize': 'small',
+                                                      'linearize': True})
+        length = int(re.search(rb'/L (\d+)', both.data[:1024]).group(1))
+        self.assertEqual(length, len(both.data))
+
+    def test_unknown_profile(self):
+        response = self.client.post('/api/convert', json={'markdown': '# Title', 'optimize': 'tiny'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fast, small', response.json['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Unit tests for spooled PDF output and how spooled PDFs are served
+"""
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdf_spool
+from pdf_cache import PDFCache
+from pdf_spool import PDFSpool, remove_stale
+from tests.fixtures import FIXTURES
+
+
+class SpoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+class TestPDFSpool(SpoolTestCase):
+    """Test moving large PDFs to temp files as they are written"""
+
+    def test_small_pdfs_stay_in_memory(self):
+        spool = PDFSpool(threshold=100, directory=self.directory)
+        spool.write(b'%PDF-1.4 small')
+        pdf = spool.finish()
+        self.assertEqual((pdf.data, pdf.path, pdf.size), (b'%PDF-1.4 small', None, 14))
+        self.assertEqual(pdf.etag, PDFCache().put('key', b'%PDF-1.4 small'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_large_pdfs_go_to_a_temp_file(self):
+        spool = PDFSpool(threshold=100, directory=self.directory)
+        parts = [b'%PDF-1.4\n', b'x' * 95, b'y' * 500]
+        for part in parts:
+            spool.write(part)
+        self.assertEqual(spool.tell(), 604)
+        pdf = spool.finish()
+
+        self.assertIsNone(pdf.data)
+        self.assertEqual(os.path.dirname(pdf.path), self.directory)
+        self.assertEqual(pdf.read(), b''.join(parts))
+        self.assertEqual(pdf.etag, PDFCache().put('key', b''.join(parts)))
+        pdf.discard()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_stale_files_are_removed(self):
+        spool = PDFSpool(threshold=0, directory=self.directory)
+        spool.write(b'%PDF')
+        stale = spool.finish().path
+        os.utime(stale, (time.time() - 600, time.time() - 600))
+        spool = PDFSpool(threshold=0, directory=self.directory)
+        spool.write(b'%PDF')
+        fresh = spool.finish().path
+
+        remove_stale(300, self.directory)
+        self.assertEqual(os.listdir(self.directory), [os.path.basename(fresh)])
+
+
+class TestServingSpooledPDFs(SpoolTestCase):
+    """Test /api/convert and job results with every PDF spooled"""
+
+    def setUp(self):
+        super().setUp()
+        import app
+        self.app = app
+        self.client = app.app.test_client()
+        for name, value in (('PDF_SPOOL_BYTES', 1024), ('PDF_SPOOL_DIR', self.directory)):
+            patcher = patch.object(pdf_spool, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_convert_sends_the_file_with_its_length(self):
+        markdown_text = FIXTURES['complex'] + "\n\nSpooled"
+        response = self.client.post('/api/convert', json={'markdown': markdown_text})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertTrue(response.data.startswith(b'%PDF') and response.data.rstrip().endswith(b'%%EOF'))
+        self.assertEqual(response.headers['ETag'], f'"{PDFCache().put("key", response.data)}"')
+        response.close()
+
+        # Deleted once opened, and too big to cache
+        self.assertEqual(os.listdir(self.directory), [])
+        config = dict(self.app.convert_config({}), logo_path=self.app.default_logo()[0])
+        self.assertIsNone(self.app.pdf_cache.get(
+            self.app.pdf_cache.make_key(markdown_text, config, self.app.default_logo()[1])
+        ))
+
+    def test_job_results_serve_byte_ranges(self):
+        response = self.client.post('/api/jobs', json={'markdown': FIXTURES['complex'] + "\n\nRanges"})
+        status_url = response.headers['Location']
+        deadline = time.monotonic() + 60
+        while response.json['status'] not in ('done', 'failed') and time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = self.client.get(status_url)
+        self.assertEqual(response.json['status'], 'done')
+        self.assertEqual(os.listdir(self.directory), [])
+
+        size = response.json['size_bytes']
+        whole = self.client.get(response.json['result_url']).data
+        part = self.client.get(response.json['result_url'], headers={'Range': 'bytes=100-199'})
+        self.assertEqual(part.status_code, 206)
+        self.assertEqual(part.headers['Content-Range'], f'bytes 100-199/{size}')
+        self.assertEqual(part.data, whole[100:200])
+
+
+if __name__ == '__main__':
+    unittest.main()
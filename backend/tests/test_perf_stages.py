@@ -0,0 +1,88 @@
+"""
+Unit tests for the rendering performance suite
+"""
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.fixtures import FIXTURES
+from tests.perf_stages import (
+    StageTimer, best_of, compare, documents, load_baseline, measure, save_baseline, time_stages
+)
+
+
+class TestStageTimer(unittest.TestCase):
+    """Test that nested stages are not counted twice"""
+
+    def test_exclusive_times(self):
+        timer = StageTimer()
+        inner = timer.wrap('inner', lambda: time.sleep(0.02))
+
+        def outer():
+            time.sleep(0.01)
+            inner()
+        timer.wrap('outer', outer)()
+        self.assertGreaterEqual(timer.times['inner'], 0.02)
+        self.assertGreaterEqual(timer.times['outer'], 0.01)
+        self.assertLess(timer.times['outer'], 0.02)
+
+
+class TestMeasure(unittest.TestCase):
+    """Test the stages timed for each front end"""
+
+    def test_stages(self):
+        html = time_stages(FIXTURES['complex'], 'html', runs=1)
+        self.assertEqual(set(html), {'preprocess', 'markdown2', 'html_parse', 'layout', 'save', 'total'})
+        ast = time_stages(FIXTURES['complex'], 'ast', runs=1)
+        self.assertEqual(set(ast), {'preprocess', 'compile', 'layout', 'save', 'total'})
+        self.assertLessEqual(sum(ms for stage, ms in ast.items() if stage != 'total'), ast['total'])
+
+    def test_scaled_documents(self):
+        named = documents(scales=(3,))
+        self.assertEqual(len(named), 2 * len(FIXTURES))
+        self.assertEqual(named['simple_x3'].count('# Test Document'), 3)
+
+    def test_baseline_round_trip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        result = measure(FIXTURES['simple'], runs=1)
+        self.assertIsNone(load_baseline('simple', directory))
+        save_baseline('simple', result, directory)
+        self.assertEqual(load_baseline('simple', directory), result)
+        self.assertGreater(result['ast']['peak_kb'], 0)
+
+
+class TestCompare(unittest.TestCase):
+    """Test which changes count as regressions"""
+
+    baseline = {'ast': {'layout': 40.0, 'save': 5.0, 'peak_kb': 2000}, 'html': {'markdown2': 30.0}}
+
+    def test_within_threshold(self):
+        result = {'ast': {'layout': 48.0, 'save': 5.5, 'peak_kb': 2400}, 'html': {'markdown2': 20.0}}
+        self.assertEqual(compare(result, self.baseline), [])
+
+    def test_regressions(self):
+        # save is 38% slower, but by under 2 ms, which is timer noise
+        result = {'ast': {'layout': 60.0, 'save': 6.9, 'peak_kb': 3000}, 'html': {'markdown2': 45.0}}
+        self.assertEqual(compare(result, self.baseline), [
+            ('ast', 'layout', 40.0, 60.0),
+            ('ast', 'peak_kb', 2000, 3000),
+            ('html', 'markdown2', 30.0, 45.0),
+        ])
+        self.assertEqual(compare(result, self.baseline, threshold=1.0), [])
+
+    def test_best_of(self):
+        result = {'chars': 10, 'ast': {'layout': 60.0, 'save': 4.0}, 'html': {'markdown2': 45.0}}
+        other = {'chars': 10, 'ast': {'layout': 41.0, 'save': 7.0}, 'html': {'markdown2': 50.0}}
+        self.assertEqual(best_of(result, other),
+                         {'chars': 10, 'ast': {'layout': 41.0, 'save': 4.0}, 'html': {'markdown2': 45.0}})
+
+
+if __name__ == '__main__':
+    unittest.main()
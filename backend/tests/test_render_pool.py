@@ -0,0 +1,149 @@
+"""
+Unit tests for the render worker pool and /api/convert backpressure
+"""
+import unittest
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_pool import RENDER_INLINE_CHARS, RenderPool, RenderPoolFull, RenderTimeout
+from tests.fixtures import FIXTURES
+
+
+def nap(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def fail():
+    raise ValueError("bad markdown")
+
+
+def die(seconds):
+    time.sleep(seconds)
+    os._exit(1)
+
+
+# Held by a test thread while a worker starts
+HELD = threading.Lock()
+
+
+def held():
+    return HELD.locked()
+
+
+class PoolTestCase(unittest.TestCase):
+
+    def pool(self, **kwargs):
+        pool = RenderPool(**dict({'workers': 1, 'queue_size': 0, 'timeout': 10}, **kwargs))
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def occupy(self, pool, seconds):
+        """Run a job for seconds in the background; returns once it is running"""
+        thread = threading.Thread(target=pool.run, args=(nap, seconds))
+        thread.start()
+        self.addCleanup(thread.join)
+        while pool.stats()['running'] == 0:
+            time.sleep(0.01)
+
+
+class TestRenderPool(PoolTestCase):
+    """Test running renders in worker processes"""
+
+    def test_runs_in_a_worker_process(self):
+        pool = self.pool()
+        pid = pool.run(nap, 0)
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(pool.run(nap, 0), pid)
+        self.assertEqual(pool.stats()['completed'], 2)
+
+    def test_exceptions_are_raised_in_caller(self):
+        pool = self.pool()
+        with self.assertRaises(ValueError):
+            pool.run(fail)
+        self.assertEqual(pool.stats()['failed'], 1)
+
+    def test_full_queue_is_rejected_at_once(self):
+        pool = self.pool()
+        self.occupy(pool, 1)
+        start = time.monotonic()
+        with self.assertRaises(RenderPoolFull) as raised:
+            pool.run(nap, 0)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_queued_job_waits_for_a_worker(self):
+        pool = self.pool(queue_size=1)
+        self.occupy(pool, 0.3)
+        pool.run(nap, 0)
+        self.assertGreaterEqual(pool.stats()['max_wait_ms'], 100)
+
+    def test_timeout_replaces_the_worker(self):
+        pool = self.pool(timeout=0.5)
+        pid = pool.run(nap, 0)
+        with self.assertRaises(RenderTimeout):
+            pool.run(nap, 30)
+        self.assertNotEqual(pool.run(nap, 0), pid)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiting_job_gets_a_replacement_worker(self):
+        pool = self.pool(queue_size=1)
+        errors = []
+
+        def run_dying():
+            try:
+                pool.run(die, 0.3)
+            except RuntimeError as e:
+                errors.append(e)
+        thread = threading.Thread(target=run_dying)
+        thread.start()
+        self.addCleanup(thread.join)
+        while pool.stats()['running'] == 0:
+            time.sleep(0.01)
+
+        # Waits for the only worker, which dies; its replacement takes this job
+        start = time.monotonic()
+        pool.run(nap, 0)
+        self.assertLess(time.monotonic() - start, 5)
+        thread.join()
+        self.assertEqual(len(errors), 1)
+
+    def test_workers_do_not_inherit_held_locks(self):
+        pool = self.pool()
+        with HELD:
+            self.assertFalse(pool.run(held))
+
+    def test_no_workers_runs_inline(self):
+        self.assertEqual(RenderPool(workers=0).run(nap, 0), os.getpid())
+
+
+class TestConvertBackpressure(PoolTestCase):
+    """Test /api/convert when the render queue is full"""
+
+    def test_busy_returns_503_with_retry_after(self):
+        import app
+        pool = self.pool()
+        saved = app.render_pool
+        app.render_pool = pool
+        self.addCleanup(setattr, app, 'render_pool', saved)
+        app.pdf_cache.clear()
+
+        self.occupy(pool, 1)
+        client = app.app.test_client()
+        long_document = "\n\n".join([FIXTURES['complex']] * (RENDER_INLINE_CHARS // len(FIXTURES['complex']) + 1))
+        response = client.post('/api/convert', json={'markdown': long_document})
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+        # Short documents render in the request thread and are not held up
+        self.assertEqual(client.post('/api/convert', json={'markdown': FIXTURES['simple']}).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
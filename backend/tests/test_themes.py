@@ -0,0 +1,61 @@
+"""
+Unit tests for the compiled theme registry
+"""
+import unittest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renderer import HTMLToReportLab
+from themes import get_theme, compile_theme, DEFAULT_THEME, MAX_BULLET_DEPTH
+
+
+class TestThemeRegistry(unittest.TestCase):
+    """Test theme compilation and sharing"""
+
+    def test_theme_is_shared(self):
+        """Repeated lookups return the same compiled theme"""
+        self.assertIs(get_theme(), get_theme(DEFAULT_THEME))
+
+    def test_theme_is_read_only(self):
+        theme = get_theme()
+        with self.assertRaises(TypeError):
+            theme['CustomBody'] = None
+        self.assertFalse(hasattr(theme, 'add'))
+
+    def test_theme_contains_document_styles(self):
+        theme = get_theme()
+        for name in ['CustomHeading1', 'CustomHeading2', 'CustomHeading3', 'CustomBody',
+                     'BulletText', 'MetadataText', 'BlockQuote', 'CodeBlock', 'TableCell']:
+            self.assertIn(name, theme)
+
+    def test_bullet_levels_precompiled(self):
+        theme = get_theme()
+        self.assertEqual(theme['BulletLevel1'].leftIndent, 24)
+        self.assertEqual(theme['BulletLevel3'].leftIndent, 48)
+        self.assertIn(f'BulletLevel{MAX_BULLET_DEPTH}', theme)
+
+    def test_unknown_theme(self):
+        with self.assertRaises(ValueError):
+            compile_theme('no-such-theme')
+
+    def test_parser_uses_shared_styles(self):
+        """List items and table cells reuse the theme's styles instead of building new ones"""
+        theme = get_theme()
+        parser = HTMLToReportLab(theme)
+        parser.feed('<ul><li>One<ul><li>Two</li></ul></li></ul>'
+                    '<table><tr><td>A</td></tr></table>')
+        story = parser.get_story()
+
+        styles = [flowable.style for flowable in story if hasattr(flowable, 'style')]
+        self.assertIs(styles[0], theme['BulletLevel1'])
+        self.assertIs(styles[1], theme['BulletLevel2'])
+
+        table = [flowable for flowable in story if flowable.__class__.__name__ == 'Table'][0]
+        self.assertIs(table._cellvalues[0][0].style, theme['TableCell'])
+
+
+if __name__ == '__main__':
+    unittest.main()
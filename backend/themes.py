@@ -0,0 +1,269 @@
+"""
+Theme registry for Davinci Document Creator
+Compiles each theme's ReportLab styles once per process and shares them across requests
+"""
+
+import threading
+from collections.abc import Mapping
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
+from reportlab.lib import colors
+
+DEFAULT_THEME = 'davinci'
+
+# Bullet styles are precompiled for this many nesting levels; deeper lists
+# fall back to building a style on the fly
+MAX_BULLET_DEPTH = 10
+
+
+class Theme(Mapping):
+    """Read-only, process-wide set of paragraph styles for one theme"""
+
+    def __init__(self, theme_id, styles):
+        self.theme_id = theme_id
+        self._styles = dict(styles)
+
+    def __getitem__(self, name):
+        return self._styles[name]
+
+    def __iter__(self):
+        return iter(self._styles)
+
+    def __len__(self):
+        return len(self._styles)
+
+    def __contains__(self, name):
+        return name in self._styles
+
+
+def _davinci_styles(styles):
+    """Document styles for the default Davinci branding"""
+    styles.add(ParagraphStyle(
+        name='CustomHeading1',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor('#0B98CE'),
+        spaceAfter=14,
+        spaceBefore=16,
+        fontName='NotoSans-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomHeading2',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor('#316EA8'),
+        spaceAfter=14,
+        spaceBefore=10,
+        fontName='NotoSans-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomHeading3',
+        parent=styles['Heading3'],
+        fontSize=12,
+        textColor=colors.HexColor('#494949'),
+        spaceAfter=8,
+        spaceBefore=10,
+        fontName='NotoSans-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomBody',
+        parent=styles['BodyText'],
+        fontSize=11,
+        textColor=colors.HexColor('#494949'),
+        alignment=TA_JUSTIFY,
+        leading=15,
+        spaceBefore=2,
+        spaceAfter=6,
+        fontName='NotoSans'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='BulletText',
+        parent=styles['BodyText'],
+        fontSize=11,
+        textColor=colors.HexColor('#494949'),
+        leftIndent=24,
+        bulletIndent=10,
+        leading=15,
+        spaceBefore=5,
+        spaceAfter=4,
+        fontName='NotoSans'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='MetadataText',
+        parent=styles['BodyText'],
+        fontSize=11,
+        textColor=colors.HexColor('#494949'),
+        leading=13,
+        spaceBefore=0,
+        spaceAfter=4,
+        fontName='NotoSans'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='BlockQuote',
+        parent=styles['BodyText'],
+        fontSize=11,
+        textColor=colors.HexColor('#666666'),
+        leftIndent=24,
+        rightIndent=24,
+        leading=15,
+        spaceBefore=12,
+        spaceAfter=12,
+        fontName='NotoSans', # Regular, but could be Italic if we had it
+        borderColor=colors.HexColor('#CCCCCC'),
+        borderWidth=0,
+        borderPadding=8,
+        backColor=colors.HexColor('#FAFAFA')
+    ))
+
+    # Code Blocks
+    styles.add(ParagraphStyle(
+        name='CodeBlock',
+        parent=styles['BodyText'],
+        fontSize=9,
+        textColor=colors.HexColor('#333333'),
+        fontName='Courier',
+        leading=11,
+        leftIndent=12,
+        rightIndent=12,
+        spaceBefore=12,
+        spaceAfter=12,
+        backColor=colors.HexColor('#F5F5F5'),
+        borderPadding=8,
+    ))
+
+    # Title page
+    styles.add(ParagraphStyle(
+        name='TitlePageTitle',
+        parent=styles['Heading1'],
+        fontSize=28,
+        textColor=colors.HexColor('#0B98CE'),
+        alignment=TA_CENTER,
+        spaceAfter=24,
+        fontName='NotoSans-Bold',
+        leading=34
+    ))
+
+    styles.add(ParagraphStyle(
+        name='TitlePageCompany',
+        parent=styles['Heading2'],
+        fontSize=18,
+        textColor=colors.HexColor('#316EA8'),
+        alignment=TA_CENTER,
+        spaceAfter=12,
+        fontName='NotoSans-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='TitlePageDate',
+        parent=styles['Normal'],
+        fontSize=12,
+        textColor=colors.HexColor('#494949'),
+        alignment=TA_CENTER,
+        fontName='NotoSans'
+    ))
+
+    # Signature page
+    styles.add(ParagraphStyle(
+        name='SignatureTitle',
+        parent=styles['Heading2'],
+        fontSize=16,
+        textColor=colors.HexColor('#0B98CE'),
+        alignment=TA_LEFT,
+        spaceAfter=12,
+        spaceBefore=0,
+        fontName='NotoSans-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='SignaturePreamble',
+        parent=styles['BodyText'],
+        fontSize=11,
+        textColor=colors.HexColor('#494949'),
+        alignment=TA_LEFT,
+        leading=16,
+        spaceBefore=8,
+        spaceAfter=24,
+        fontName='NotoSans'
+    ))
+
+    # DocuSign anchor strings: present in the text layer but invisible
+    styles.add(ParagraphStyle(
+        name='SignatureAnchor',
+        parent=styles['BodyText'],
+        fontSize=1,
+        textColor=colors.white,
+        fontName='NotoSans'
+    ))
+
+
+def bullet_style(bullet_text_style, depth):
+    """Indented list item style: base indent 24, plus 12 for each extra level"""
+    indent = 24 + (max(0, depth - 1) * 12)
+    return ParagraphStyle(
+        f'BulletLevel{depth}',
+        parent=bullet_text_style,
+        leftIndent=indent,
+        firstLineIndent=0
+    )
+
+
+def table_cell_style(body_style):
+    """Compact style used for every table cell"""
+    return ParagraphStyle(
+        'TableCell',
+        parent=body_style,
+        fontSize=9,
+        leading=11,
+        fontName='NotoSans'
+    )
+
+
+def compile_theme(theme_id):
+    """Build the full style set for a theme, including derived list and table styles"""
+    builder = _theme_builders.get(theme_id)
+    if builder is None:
+        raise ValueError(f"Unknown theme: {theme_id}")
+
+    styles = getSampleStyleSheet()
+    builder(styles)
+
+    compiled = {name: styles[name] for name in styles.byName}
+    for depth in range(MAX_BULLET_DEPTH + 1):
+        style = bullet_style(styles['BulletText'], depth)
+        compiled[style.name] = style
+    compiled['TableCell'] = table_cell_style(styles['CustomBody'])
+
+    return Theme(theme_id, compiled)
+
+
+_theme_builders = {
+    DEFAULT_THEME: _davinci_styles,
+}
+_compiled_themes = {}
+_lock = threading.Lock()
+
+
+def register_theme(theme_id, builder):
+    """Register a theme builder; builder(styles) adds styles to a sample stylesheet"""
+    with _lock:
+        _theme_builders[theme_id] = builder
+        _compiled_themes.pop(theme_id, None)
+
+
+def get_theme(theme_id=None):
+    """Return the shared compiled theme, compiling it on first use"""
+    theme_id = theme_id or DEFAULT_THEME
+    theme = _compiled_themes.get(theme_id)
+    if theme is None:
+        with _lock:
+            theme = _compiled_themes.get(theme_id)
+            if theme is None:
+                theme = compile_theme(theme_id)
+                _compiled_themes[theme_id] = theme
+    return theme